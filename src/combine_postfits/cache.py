@@ -0,0 +1,203 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from collections.abc import Callable
+from dataclasses import astuple
+from pathlib import Path
+
+import numpy as np
+
+from .chi2 import OverallCovariance
+from .fitresult import FitParam, FitResultTable
+from .shapes import FitDiagIndex, ShapeStore
+
+CACHE_VERSION = 3
+
+
+def file_digest(path: str | Path, chunk_size: int = 1 << 20) -> str:
+    """Content digest of a file (blake2b). Reads raw bytes only, no ROOT decompression."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ShapeCache:
+    """On-disk cache of decoded fitDiagnostics contents.
+
+    Each input is stored as one entry directory named after its content digest, holding a
+    ``layout.json`` (with the ``FitDiagIndex`` and the fit parameters) and a single flat ``data.npy``
+    buffer (see ``ShapeStore.pack``) which is memory-mapped on load, as are the ``overall_total_covar``
+    matrices and the fit correlation matrices (one ``.npy`` each). A hit therefore doesn't open the
+    ROOT file at all. A ``lookup.json`` maps ``(path, size, mtime)`` to the digest so that
+    unchanged files are not re-hashed on every run. Total size is bounded by evicting the least
+    recently used entries.
+    """
+
+    def __init__(self, cache_dir: str | Path, max_size_mb: float = 4096):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = int(max_size_mb * 1024**2)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def _lookup_path(self) -> Path:
+        return self.cache_dir / "lookup.json"
+
+    def _read_lookup(self) -> dict:
+        try:
+            with open(self._lookup_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_lookup(self, lookup: dict) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump(lookup, f)
+        os.replace(tmp, self._lookup_path)
+
+    @staticmethod
+    def _stat_key(path: Path) -> str:
+        st = path.stat()
+        return f"{path.resolve()}:{st.st_size}:{st.st_mtime_ns}"
+
+    def digest(self, path: str | Path) -> str:
+        """Content digest of ``path``, reusing the stored one when size and mtime are unchanged."""
+        path = Path(path)
+        stat_key = self._stat_key(path)
+        lookup = self._read_lookup()
+        digest = lookup.get(stat_key)
+        if digest is None or not (self.cache_dir / digest).is_dir():
+            digest = file_digest(path)
+            # Drop stale keys of the same path (file was rewritten) before recording the new one
+            prefix = f"{path.resolve()}:"
+            lookup = {k: v for k, v in lookup.items() if not k.startswith(prefix)}
+            lookup[stat_key] = digest
+            self._write_lookup(lookup)
+        return digest
+
+    def load(self, digest: str) -> tuple[ShapeStore, FitResultTable | None] | None:
+        """The store (with its ``overall_covar``) and fit results of an entry, None if missing or outdated."""
+        entry = self.cache_dir / digest
+        try:
+            with open(entry / "layout.json") as f:
+                meta = json.load(f)
+            if meta.get("version") != CACHE_VERSION:
+                return None
+            buffer = np.load(entry / "data.npy", mmap_mode="r")
+            overall = {
+                fit_type: np.load(entry / f"overall_{fit_type}.npy", mmap_mode="r")
+                for fit_type in meta["overall_covar"]
+            }
+            fit_results = meta["fit_results"]
+            correlations = (
+                {}
+                if fit_results is None
+                else {
+                    fit_type: np.load(entry / f"correlation_{fit_type}.npy") for fit_type in fit_results["correlations"]
+                }
+            )
+        except (OSError, ValueError, KeyError) as e:
+            logging.debug(f"Cache entry '{entry}' unreadable: {e}")
+            return None
+        os.utime(entry)  # Mark as recently used
+        index = FitDiagIndex.from_dict(meta["index"]) if meta.get("index") is not None else None
+        store = ShapeStore.unpack(meta["shapes"], buffer, index=index)
+        for fit_type, rows in meta["overall_covar"].items():
+            store.overall_covar[fit_type] = OverallCovariance(
+                overall[fit_type], {ch: np.array(r, dtype=int) for ch, r in rows.items()}
+            )
+        if fit_results is not None:
+            params = {
+                fit_type: {name: FitParam(*values) for name, values in fit_params.items()}
+                for fit_type, fit_params in fit_results["params"].items()
+            }
+            fit_results = FitResultTable(params, correlations)
+        return store, fit_results
+
+    def save(self, digest: str, store: ShapeStore, fit_results: FitResultTable | None = None) -> None:
+        layout, buffer = store.pack()
+        tmp = Path(tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp-"))
+        try:
+            np.save(tmp / "data.npy", buffer)
+            for fit_type, overall in store.overall_covar.items():
+                np.save(tmp / f"overall_{fit_type}.npy", overall.matrix)
+            if fit_results is not None:
+                for fit_type, correlation in fit_results.correlations.items():
+                    np.save(tmp / f"correlation_{fit_type}.npy", correlation)
+            with open(tmp / "layout.json", "w") as f:
+                index = store.index.to_dict() if store.index is not None else None
+                json.dump(
+                    {
+                        "version": CACHE_VERSION,
+                        "shapes": layout,
+                        "index": index,
+                        "overall_covar": {
+                            fit_type: {ch: rows.tolist() for ch, rows in overall.rows.items()}
+                            for fit_type, overall in store.overall_covar.items()
+                        },
+                        "fit_results": None
+                        if fit_results is None
+                        else {
+                            "params": {
+                                fit_type: {name: astuple(param) for name, param in fit_params.items()}
+                                for fit_type, fit_params in fit_results.params.items()
+                            },
+                            "correlations": list(fit_results.correlations),
+                        },
+                    },
+                    f,
+                )
+            entry = self.cache_dir / digest
+            if entry.exists():
+                # An outdated or unreadable entry (``load`` missed it): moved aside, as ``os.replace`` can't
+                # overwrite a non-empty directory
+                stale = Path(tempfile.mkdtemp(dir=self.cache_dir, prefix=".stale-")) / digest
+                os.replace(entry, stale)
+                shutil.rmtree(stale.parent, ignore_errors=True)
+            os.replace(tmp, entry)
+        except OSError as e:
+            # e.g. a concurrent run wrote the same entry in between
+            logging.warning(f"Could not write cache entry '{digest}': {e}")
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict(keep=digest)
+
+    def evict(self, keep: str | None = None) -> None:
+        """Remove least recently used entries until the cache fits in ``max_bytes``, and their lookup keys."""
+        entries = []
+        for entry in self.cache_dir.iterdir():
+            if not entry.is_dir() or entry.name.startswith("."):
+                continue
+            size = sum(f.stat().st_size for f in entry.iterdir())
+            entries.append((entry.stat().st_mtime, size, entry))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if entry.name == keep:
+                continue
+            logging.info(f"Evicting cache entry '{entry.name}' ({size / 1024**2:.1f} MB).")
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+        # Keys of evicted (or otherwise removed) entries would pile up in the lookup across runs
+        lookup = self._read_lookup()
+        kept = {k: digest for k, digest in lookup.items() if (self.cache_dir / digest).is_dir()}
+        if len(kept) < len(lookup):
+            self._write_lookup(kept)
+
+    def get_or_build(
+        self, path: str | Path, build: Callable[[], tuple[ShapeStore, FitResultTable | None]]
+    ) -> tuple[ShapeStore, FitResultTable | None]:
+        """Return the cached store and fit results of ``path``, or ``build()`` and store them."""
+        digest = self.digest(path)
+        cached = self.load(digest)
+        if cached is not None:
+            logging.info(f"Loaded shapes and fit results of '{path}' from cache ({self.cache_dir / digest}).")
+            return cached
+        store, fit_results = build()
+        self.save(digest, store, fit_results)
+        return store, fit_results
@@ -0,0 +1,427 @@
+import logging
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+import numpy as np
+import uproot
+from scipy.linalg import eigvalsh, solve_triangular
+
+from .shapes import FitDiagIndex, ShapeStore
+
+OVERALL_COVAR = "overall_total_covar"
+# Toy data are drawn from a Poisson below this many expected events per bin, from its Gaussian limit above
+POISSON_MAX_MEAN = 50
+TOY_BATCH = 2048  # Toys drawn and evaluated at once
+
+
+@dataclass(frozen=True)
+class ChannelChi2:
+    """Goodness-of-fit terms of one channel (bins with no data, or blinded, are excluded)."""
+
+    chi2: float  # with the ``total_covar`` correlations
+    chi2_naive: float  # data uncertainties only
+    nbins: int
+    clipped: bool = False  # covariance wasn't positive definite, its negative eigenvalues were dropped
+
+
+def _blind_key(blind_slice: slice | None) -> tuple | None:
+    return None if blind_slice is None else (blind_slice.start, blind_slice.stop, blind_slice.step)
+
+
+def _residuals(
+    store: ShapeStore, fit_type: str, channel: str, restoreNorm: bool, blind_slice: slice | None
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Bin mask (bins with data, not blinded), data - total and data variances of the masked bins."""
+    data = store.get_summed_shape(fit_type, [channel], "data", restoreNorm=restoreNorm)
+    tot = store.get_summed_shape(fit_type, [channel], "total", restoreNorm=restoreNorm)
+    mask = ~np.isclose(data.values(), 0, atol=1e-4)
+    if blind_slice is not None:  # Exclude partially-blinded bins from the goodness-of-fit.
+        mask[blind_slice] = False
+    return mask, data.values()[mask] - tot.values()[mask], data.variances()[mask]
+
+
+def _naive(diff: np.ndarray, variances: np.ndarray) -> float:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.sum(np.nan_to_num(diff**2 / variances, posinf=0, neginf=0))
+
+
+def _eigen_chi2(matrix: np.ndarray, diff: np.ndarray, rtol: float = 1e-10) -> float:
+    """``diff @ pinv(matrix) @ diff``, dropping eigenvalues of ``matrix`` below ``rtol * max``."""
+    eigvals, eigvecs = np.linalg.eigh(matrix)
+    floor = rtol * np.max(np.abs(eigvals), initial=0)
+    if floor == 0:
+        return np.nan
+    inv = np.zeros_like(eigvals)
+    np.divide(1, eigvals, out=inv, where=eigvals > floor)
+    return float(np.sum((eigvecs.T @ diff) ** 2 * inv))
+
+
+def solve_chi2(matrices: np.ndarray, diffs: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """``diff @ inv(matrix) @ diff`` for a stack of ``(k, n, n)`` matrices and ``(k, n)`` diffs.
+
+    Uses a stacked Cholesky factorization (``matrix = L L^T``, so chi2 = ``|L^-1 diff|^2``, by forward substitution).
+    Matrices that aren't positive definite fall back to an eigendecomposition with the
+    non-positive eigenvalues clipped away; returns the chi2 values and which were clipped.
+    """
+    try:
+        chol = np.linalg.cholesky(matrices)
+        whitened = [solve_triangular(c, d, lower=True, check_finite=False) for c, d in zip(chol, diffs)]
+        return np.sum(np.square(whitened), axis=-1), np.zeros(len(diffs), bool)
+    except np.linalg.LinAlgError:
+        if len(matrices) > 1:  # Only redo the failing ones
+            results = [solve_chi2(m[None], d[None]) for m, d in zip(matrices, diffs)]
+            return np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results])
+        return np.array([_eigen_chi2(matrices[0], diffs[0])]), np.ones(1, bool)
+
+
+def channel_chi2(
+    store: ShapeStore,
+    fit_type: str,
+    channels: list[str],
+    restoreNorm: bool = True,
+    blind_slice: slice | None = None,
+) -> list[ChannelChi2]:
+    """Goodness-of-fit terms of each of ``channels``, cached in ``store.chi2`` across plots.
+
+    Channels not computed yet are solved together, one stacked Cholesky per number of bins.
+    """
+    pending = defaultdict(list)  # nbins -> [(key, matrix, diff, chi2_naive)]
+    for channel in dict.fromkeys(channels):
+        key = (fit_type, channel, restoreNorm, _blind_key(blind_slice))
+        if key in store.chi2:
+            continue
+        mask, diff, variances = _residuals(store, fit_type, channel, restoreNorm, blind_slice)
+        cov = store.record(fit_type, channel, "total_covar").values
+        pending[len(diff)].append((key, cov[np.ix_(mask, mask)] + np.diag(variances), diff, _naive(diff, variances)))
+    for nbins, entries in pending.items():
+        keys, matrices, diffs, naive = zip(*entries)
+        if nbins == 0:
+            chi2s, clipped = np.zeros(len(keys)), np.zeros(len(keys), bool)
+        else:
+            chi2s, clipped = solve_chi2(np.stack(matrices), np.stack(diffs))
+        for key, chi2, chi2_naive, _clipped in zip(keys, chi2s, naive, clipped):
+            if _clipped:
+                logging.warning(
+                    f"  Covariance matrix of '{key[1]}' is not positive definite, clipping its negative eigenvalues."
+                )
+            store.chi2[key] = ChannelChi2(float(chi2), float(chi2_naive), nbins, bool(_clipped))
+    return [store.chi2[fit_type, channel, restoreNorm, _blind_key(blind_slice)] for channel in channels]
+
+
+@dataclass
+class OverallCovariance:
+    """``overall_total_covar`` of one fit type: the bin covariance across all channels.
+
+    ``rows[channel]`` are the matrix rows of the channel's bins, in bin order. Cholesky factors
+    of the group submatrices (with the data variances added on the diagonal) are cached, and a
+    group containing an already factorized one (e.g. ``pass`` and ``pass16``) extends that factor
+    by its additional rows instead of factorizing from scratch.
+    """
+
+    matrix: np.ndarray
+    rows: dict[str, np.ndarray]
+    _diag: dict[bool, np.ndarray] = field(default_factory=dict, repr=False)  # restoreNorm -> data variances
+    _factors: dict[tuple[bool, frozenset[int]], tuple[np.ndarray, np.ndarray]] = field(
+        default_factory=dict, repr=False
+    )  # (restoreNorm, rows) -> (row order, Cholesky factor)
+
+    @classmethod
+    def from_labels(cls, matrix: np.ndarray, labels: list[str]) -> "OverallCovariance":
+        """Index the rows by their ``<channel>_<bin>`` axis labels."""
+        rows = defaultdict(list)
+        for i, label in enumerate(labels):
+            channel, _, b = label.rpartition("_")
+            rows[channel].append((int(b), i))
+        return cls(np.asarray(matrix, dtype=float), {ch: np.array([i for _, i in sorted(r)]) for ch, r in rows.items()})
+
+    @classmethod
+    def from_file(
+        cls, fitDiag: uproot.ReadOnlyDirectory, fit_type: str, store: ShapeStore | None = None
+    ) -> "OverallCovariance | None":
+        """Read ``shapes_{fit_type}/overall_total_covar`` (None if not in the file).
+
+        Without bin labels the rows are assumed to follow the order of all the channels in the file,
+        sized by their ``total`` shapes (taken from ``store`` for the channels it holds).
+        """
+        path = f"shapes_{fit_type}/{OVERALL_COVAR}"
+        try:
+            h = fitDiag[path]
+        except KeyError:
+            return None
+        matrix, labels = h.values(), h.axis(0).labels()
+        if labels:
+            return cls.from_labels(matrix, labels)
+        held = set(store.channels(fit_type)) if store is not None else set()
+        nbins = {}
+        channels = FitDiagIndex.from_file(fitDiag, fit_types=[fit_type]).channels(fit_type)
+        for ch in channels:
+            if ch in held:
+                nbins[ch] = store.record(fit_type, ch, "total").values.size
+            elif "total" in fitDiag[f"shapes_{fit_type}/{ch}"]:
+                nbins[ch] = fitDiag[f"shapes_{fit_type}/{ch}/total"].values().size
+        if len(nbins) < len(channels) or sum(nbins.values()) != len(matrix):
+            raise ValueError(f"Cannot map the rows of '{path}' to channels, it has no bin labels.")
+        offsets = np.cumsum([0, *nbins.values()])
+        return cls(
+            np.asarray(matrix, dtype=float), {ch: np.arange(lo, hi) for ch, lo, hi in zip(nbins, offsets, offsets[1:])}
+        )
+
+    def _factor(self, rows: np.ndarray, restoreNorm: bool) -> tuple[np.ndarray, np.ndarray]:
+        key = (restoreNorm, frozenset(rows.tolist()))
+        if key in self._factors:
+            return self._factors[key]
+        diag = self._diag[restoreNorm]
+        bases = [k for k in self._factors if k[0] == restoreNorm and k[1] < key[1]]
+        if bases:
+            # Block Cholesky: [[A11, A21^T], [A21, A22]] = [[L11, 0], [L21, L22]] @ (...)^T
+            order11, chol11 = self._factors[max(bases, key=lambda k: len(k[1]))]
+            known = set(order11.tolist())
+            rest = np.array([r for r in rows.tolist() if r not in known])
+            chol21 = solve_triangular(chol11, self.matrix[np.ix_(rest, order11)].T, lower=True).T
+            a22 = self.matrix[np.ix_(rest, rest)] + np.diag(diag[rest])
+            chol22 = np.linalg.cholesky(a22 - chol21 @ chol21.T)
+            order = np.concatenate([order11, rest])
+            chol = np.block([[chol11, np.zeros((len(order11), len(rest)))], [chol21, chol22]])
+        else:
+            order = rows
+            chol = np.linalg.cholesky(self.matrix[np.ix_(rows, rows)] + np.diag(diag[rows]))
+        self._factors[key] = (order, chol)
+        return order, chol
+
+    def factor(
+        self, rows: np.ndarray, variances: np.ndarray, restoreNorm: bool = True
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Cholesky factor of ``matrix[rows, rows] + diag(variances)`` and the row order it is in.
+
+        Factors are cached per ``restoreNorm`` and extended blockwise from the largest cached subset
+        of ``rows``. Raises ``np.linalg.LinAlgError`` if the matrix is not positive definite.
+        """
+        self._diag.setdefault(restoreNorm, np.zeros(len(self.matrix)))[rows] = variances
+        return self._factor(rows, restoreNorm)
+
+    def solve(
+        self, rows: np.ndarray, diff: np.ndarray, variances: np.ndarray, restoreNorm: bool = True
+    ) -> tuple[float, bool]:
+        """``diff @ inv(matrix[rows, rows] + diag(variances)) @ diff`` and whether eigenvalues were clipped."""
+        if len(rows) == 0:
+            return 0.0, False
+        try:
+            order, chol = self.factor(rows, variances, restoreNorm)
+        except np.linalg.LinAlgError:
+            return _eigen_chi2(self.matrix[np.ix_(rows, rows)] + np.diag(variances), diff), True
+        position = dict(zip(rows.tolist(), range(len(rows))))
+        y = solve_triangular(chol, diff[[position[r] for r in order.tolist()]], lower=True)
+        return float(y @ y), False
+
+
+def group_chi2(
+    store: ShapeStore,
+    fit_type: str,
+    channels: list[str],
+    restoreNorm: bool = True,
+    blind_slice: slice | None = None,
+) -> ChannelChi2:
+    """Goodness-of-fit of ``channels`` together, including the correlations between them.
+
+    Uses ``store.overall_covar[fit_type]``; results are cached in ``store.chi2`` like the
+    per-channel terms of ``channel_chi2``.
+    """
+    key = (OVERALL_COVAR, fit_type, frozenset(channels), restoreNorm, _blind_key(blind_slice))
+    if key in store.chi2:
+        return store.chi2[key]
+    cov = store.overall_covar[fit_type]
+    rows, diffs, variances = [], [], []
+    for channel in channels:
+        mask, diff, _variances = _residuals(store, fit_type, channel, restoreNorm, blind_slice)
+        if channel not in cov.rows or len(cov.rows[channel]) != len(mask):
+            raise ValueError(f"Channel '{channel}' doesn't match the rows of '{OVERALL_COVAR}'.")
+        rows.append(cov.rows[channel][mask])
+        diffs.append(diff)
+        variances.append(_variances)
+    rows, diff, variances = np.concatenate(rows), np.concatenate(diffs), np.concatenate(variances)
+    chi2, clipped = cov.solve(rows, diff, variances, restoreNorm=restoreNorm)
+    if clipped:
+        logging.warning(
+            f"  Covariance matrix of {channels} is not positive definite, clipping its negative eigenvalues."
+        )
+    store.chi2[key] = ChannelChi2(chi2, float(_naive(diff, variances)), len(rows), clipped)
+    return store.chi2[key]
+
+
+def _sqrt_cov(cov: np.ndarray) -> np.ndarray:
+    """``S`` with ``S @ S.T == cov`` (Cholesky, or eigendecomposition for singular covariances)."""
+    try:
+        return np.linalg.cholesky(cov)
+    except np.linalg.LinAlgError:
+        eigvals, eigvecs = np.linalg.eigh(cov)
+        return eigvecs * np.sqrt(np.clip(eigvals, 0, None))
+
+
+def toy_chi2(
+    chol: np.ndarray,
+    expected: np.ndarray,
+    cov: np.ndarray,
+    variances: np.ndarray,
+    ntoys: int,
+    rng: np.random.Generator,
+    poisson: bool = True,
+) -> np.ndarray:
+    """Chi2 of ``ntoys`` pseudo-datasets, with the statistic ``r @ inv(chol @ chol.T) @ r``, ``r = toy - expected``.
+
+    The expectation is fluctuated by ``cov`` (Gaussian), then the data by Poisson in bins expecting
+    fewer than ``POISSON_MAX_MEAN`` events and by its Gaussian limit above (or Gaussian with
+    ``variances`` when the shapes aren't event counts). The statistic of Gaussian toys is
+    ``sum(eigvals * z**2)`` with ``z ~ N(0, 1)``, from the eigenvalues of the whitened covariance
+    ``inv(chol) @ (cov + diag(noise)) @ inv(chol).T``, so each toy costs one draw per bin. With
+    Poisson bins, toys are whitened by a precomputed matrix in ``TOY_BATCH`` batches of float32
+    ``(n_toys, n_bins)`` arrays, the Poisson bins entering as a ``(n_toys, n_poisson)`` sub-block.
+    """
+    n = len(expected)
+    if n == 0:
+        return np.zeros(ntoys)
+    # Gaussian noise of the data on top of the fluctuations, none in the bins drawn from a Poisson
+    low = np.flatnonzero(expected < POISSON_MAX_MEAN) if poisson else np.zeros(0, dtype=int)
+    noise = np.clip(expected, 0, None) if poisson else np.array(variances, dtype=float)
+    noise[low] = 0
+    fluct = cov + np.diag(noise)
+    sizes = np.diff(np.r_[0:ntoys:TOY_BATCH, ntoys])
+    if not low.size:
+        half = solve_triangular(chol, fluct, lower=True, check_finite=False)
+        whitened = solve_triangular(chol, half.T, lower=True, check_finite=False)
+        eigvals = np.clip(eigvalsh(whitened.astype(np.float32), check_finite=False), 0, None)
+        chi2 = []
+        for size in sizes:
+            z = rng.standard_normal((size, n), dtype=np.float32)
+            chi2.append(np.square(z, out=z) @ eigvals)
+        return np.concatenate(chi2).astype(float)
+    inv_chol = solve_triangular(chol, np.eye(n), lower=True, check_finite=False)
+    sqrt_fluct = _sqrt_cov(fluct)
+    high = np.setdiff1d(np.arange(n), low)
+    whiten = (inv_chol[:, high] @ sqrt_fluct[high]).T.astype(np.float32) if high.size else None
+    to_low = sqrt_fluct[low].T.astype(np.float32)
+    from_low = inv_chol[:, low].T.astype(np.float32)
+    chi2 = []
+    for size in sizes:
+        z = rng.standard_normal((size, n), dtype=np.float32)
+        counts = rng.poisson(np.clip(expected[low] + z @ to_low, 0, None))
+        y = (counts - expected[low]).astype(np.float32) @ from_low
+        if whiten is not None:
+            y += z @ whiten
+        chi2.append(np.einsum("ij,ij->i", y, y))
+    return np.concatenate(chi2).astype(float)
+
+
+def _rng(seed: int, *keys: str) -> np.random.Generator:
+    """Generator seeded per channel/group, so toys don't depend on the order (or process) they're made in."""
+    return np.random.default_rng([seed, *(zlib.crc32(key.encode()) for key in keys)])
+
+
+def _expected(
+    store: ShapeStore, fit_type: str, channel: str, restoreNorm: bool, mask: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Postfit ``total`` and the bin widths (for scaling ``total_covar``) of the masked bins."""
+    tot = store.get_summed_shape(fit_type, [channel], "total", restoreNorm=restoreNorm)
+    widths = tot.widths if restoreNorm else np.ones(len(tot.values()))
+    return tot.values()[mask], widths[mask]
+
+
+def channel_toys(
+    store: ShapeStore,
+    fit_type: str,
+    channels: list[str],
+    ntoys: int,
+    restoreNorm: bool = True,
+    blind_slice: slice | None = None,
+    nocorr: bool = False,
+    seed: int = 0,
+) -> list[np.ndarray | None]:
+    """Toy distributions of the per-channel chi2 of ``channel_chi2`` (None if the covariance is clipped).
+
+    Cached in ``store.chi2``; toys of different channels are independent, so the distribution
+    of a merged category is the sum of its channels' arrays.
+    """
+    results = []
+    for channel in channels:
+        key = ("toys", fit_type, channel, restoreNorm, _blind_key(blind_slice), ntoys, nocorr, seed)
+        if key not in store.chi2:
+            mask, diff, variances = _residuals(store, fit_type, channel, restoreNorm, blind_slice)
+            expected, widths = _expected(store, fit_type, channel, restoreNorm, mask)
+            cov = store.record(fit_type, channel, "total_covar").values[np.ix_(mask, mask)]
+            matrix = np.diag(variances) if nocorr else cov + np.diag(variances)
+            try:
+                chol = np.linalg.cholesky(matrix)
+            except np.linalg.LinAlgError:
+                store.chi2[key] = None
+            else:
+                rng = _rng(seed, fit_type, channel)
+                store.chi2[key] = toy_chi2(
+                    chol, expected, cov * np.outer(widths, widths), variances, ntoys, rng, restoreNorm
+                )
+        results.append(store.chi2[key])
+    return results
+
+
+def group_toys(
+    store: ShapeStore,
+    fit_type: str,
+    channels: list[str],
+    ntoys: int,
+    restoreNorm: bool = True,
+    blind_slice: slice | None = None,
+    seed: int = 0,
+) -> np.ndarray | None:
+    """Toy distribution of ``group_chi2``, with the channels fluctuated together by ``overall_total_covar``."""
+    key = ("toys", OVERALL_COVAR, fit_type, frozenset(channels), restoreNorm, _blind_key(blind_slice), ntoys, seed)
+    if key in store.chi2:
+        return store.chi2[key]
+    cov = store.overall_covar[fit_type]
+    rows, variances, expected, widths = [], [], [], []
+    for channel in channels:
+        mask, _, _variances = _residuals(store, fit_type, channel, restoreNorm, blind_slice)
+        _expected_, _widths = _expected(store, fit_type, channel, restoreNorm, mask)
+        rows.append(cov.rows[channel][mask])
+        variances.append(_variances)
+        expected.append(_expected_)
+        widths.append(_widths)
+    rows = np.concatenate(rows)
+    if len(rows) == 0:
+        store.chi2[key] = np.zeros(ntoys)
+        return store.chi2[key]
+    try:
+        order, chol = cov.factor(rows, np.concatenate(variances), restoreNorm)
+    except np.linalg.LinAlgError:
+        store.chi2[key] = None
+        return None
+    # Everything in the row order of the cached factor
+    position = dict(zip(rows.tolist(), range(len(rows))))
+    perm = [position[r] for r in order.tolist()]
+    variances, expected, widths = (np.concatenate(a)[perm] for a in (variances, expected, widths))
+    fluct = cov.matrix[np.ix_(order, order)] * np.outer(widths, widths)
+    rng = _rng(seed, OVERALL_COVAR, fit_type, *sorted(channels))
+    store.chi2[key] = toy_chi2(chol, expected, fluct, variances, ntoys, rng, restoreNorm)
+    return store.chi2[key]
+
+
+def toy_pvalue(
+    store: ShapeStore,
+    fit_type: str,
+    channels: list[str],
+    observed: float,
+    ntoys: int,
+    restoreNorm: bool = True,
+    blind_slice: slice | None = None,
+    nocorr: bool = False,
+    overall: bool = False,
+) -> float | None:
+    """Fraction of toys with a chi2 at least as large as ``observed`` (None if toys aren't available)."""
+    if overall and not nocorr and fit_type in store.overall_covar:
+        toys = group_toys(store, fit_type, channels, ntoys, restoreNorm=restoreNorm, blind_slice=blind_slice)
+    else:
+        per_channel = channel_toys(
+            store, fit_type, channels, ntoys, restoreNorm=restoreNorm, blind_slice=blind_slice, nocorr=nocorr
+        )
+        toys = None if any(t is None for t in per_channel) else np.sum(per_channel, axis=0)
+    if toys is None:
+        return None
+    return float(np.mean(toys >= observed))
@@ -0,0 +1,184 @@
+import heapq
+import json
+import logging
+import os
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+from scipy.optimize import nnls
+
+from .shapes import ShapeStore
+
+# Per-task features, the estimated cost is linear in them
+FEATURES = ["base", "channels", "samples", "mbytes", "chi2", "residuals", "png_mpix", "pdf"]
+# Seconds per unit of each feature, used until enough timings were recorded (fitted to the test
+# inputs on a single core; ``--timings`` calibrates them to the actual machine and analysis)
+DEFAULT_WEIGHTS = {
+    "base": 0.5,
+    "channels": 0.01,
+    "samples": 0.07,
+    "mbytes": 1.0,
+    "chi2": 0.4,
+    "residuals": 0.4,
+    "png_mpix": 0.1,
+    "pdf": 0.6,
+}
+FIGURE_INCHES = 10  # Side of the (square) CMS style figure
+MAX_TIMINGS = 5000  # Recorded timings kept, newest last
+# Private memory of a forked worker once it has rendered: matplotlib/font caches and touched pages,
+# plus the Agg canvas (RGBA) and the copy made while saving it as png
+WORKER_BASE_BYTES = 70e6
+BYTES_PER_PIXEL = 8
+
+
+def task_features(
+    store: ShapeStore,
+    fit_type: str,
+    channels: list[str],
+    blind: bool = False,
+    chi2: bool = False,
+    residuals: bool = False,
+    formats: list[str] = ("png",),
+    dpi: int = 300,
+) -> np.ndarray:
+    """Feature vector (see ``FEATURES``) of a plot, from the store's listing only (nothing is read)."""
+    pixels = (FIGURE_INCHES * dpi) ** 2 / 1e6
+    return np.array(
+        [
+            1.0,
+            len(channels),
+            len(store.samples(fit_type, channels)),
+            sum(store.estimate_nbytes(fit_type, channel) for channel in channels) / 1e6,
+            float(chi2 and not blind),
+            float(residuals and not blind),
+            pixels * sum(fmt == "png" for fmt in formats),
+            float(sum(fmt == "pdf" for fmt in formats)),
+        ]
+    )
+
+
+@dataclass
+class CostModel:
+    """Linear estimate of a plot's rendering time (in seconds) from its features."""
+
+    weights: np.ndarray = field(default_factory=lambda: np.array([DEFAULT_WEIGHTS[f] for f in FEATURES]))
+    n_timings: int = 0  # Number of recorded timings it was calibrated on
+
+    @classmethod
+    def calibrate(cls, features: np.ndarray, seconds: np.ndarray) -> "CostModel":
+        """Fit the weights to recorded timings (non-negative least squares).
+
+        With fewer timings than twice the number of features, or features that don't vary enough
+        to constrain every weight, the default weights are only rescaled to the observed times.
+        """
+        model = cls()
+        if len(seconds) == 0:
+            return model
+        model.n_timings = len(seconds)
+        if len(seconds) >= 2 * len(FEATURES) and np.linalg.matrix_rank(features) == len(FEATURES):
+            weights, _ = nnls(features, seconds)
+            if np.all(features @ weights > 0):
+                model.weights = weights
+                return model
+        model.weights = model.weights * np.median(seconds / model.estimate(features))
+        return model
+
+    def estimate(self, features: np.ndarray) -> np.ndarray:
+        return features @ self.weights
+
+
+def lpt_order(costs: np.ndarray) -> list[int]:
+    """Longest-processing-time-first order of the tasks (stable for equal costs)."""
+    return sorted(range(len(costs)), key=lambda i: -costs[i])
+
+
+def locality_batches(
+    groups: list[tuple[str, frozenset[str]]], costs: np.ndarray, max_cost: float = np.inf
+) -> list[list[int]]:
+    """Batch the tasks whose channels overlap, so one worker plots them with the arrays at hand.
+
+    ``groups`` are the tasks' ``(source, channels)``: the fit types of a category, and merged
+    categories sharing channels, land in one batch. Batches are cut at ``max_cost`` (so that there
+    are enough of them to keep the workers busy), the tasks of the same channels kept adjacent.
+    Batches are returned longest first (``lpt_order``).
+    """
+    # Union-find over the channels of each source
+    parent = {}
+
+    def find(key):
+        while parent.setdefault(key, key) != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    for source, channels in groups:
+        first, *others = [(source, channel) for channel in channels] or [(source, None)]
+        for other in others:
+            parent[find(other)] = find(first)
+    components: dict[tuple, dict[frozenset[str], list[int]]] = {}
+    for i, (source, channels) in enumerate(groups):
+        root = find((source, next(iter(channels), None)))
+        components.setdefault(root, {}).setdefault(channels, []).append(i)
+
+    batches = []
+    for categories in components.values():
+        batch, cost = [], 0.0
+        for i in (i for tasks in categories.values() for i in tasks):
+            if batch and cost + costs[i] > max_cost:
+                batches.append(batch)
+                batch, cost = [], 0.0
+            batch, cost = batch + [i], cost + costs[i]
+        batches.append(batch)
+    return [batches[i] for i in lpt_order(np.array([costs[batch].sum() for batch in batches]))]
+
+
+def makespan(costs: np.ndarray, n_workers: int) -> float:
+    """Wall time of running ``costs`` (in ``lpt_order``) on ``n_workers``, each taking the next task when idle."""
+    finish = [0.0] * max(n_workers, 1)
+    for i in lpt_order(costs):
+        heapq.heappush(finish, heapq.heappop(finish) + costs[i])
+    return max(finish)
+
+
+def peak_memory(parent_bytes: float, features: np.ndarray, n_workers: int) -> float:
+    """Peak memory of a run: the parent (with the loaded shapes) and ``n_workers`` rendering the largest canvas."""
+    if n_workers == 0 or len(features) == 0:
+        return parent_bytes
+    pixels = 1e6 * features[:, FEATURES.index("png_mpix")].max()
+    return parent_bytes + n_workers * (WORKER_BASE_BYTES + BYTES_PER_PIXEL * pixels)
+
+
+class TimingLog:
+    """Plot timings of previous runs (features and seconds), kept in a JSON file."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+
+    def load(self) -> tuple[np.ndarray, np.ndarray]:
+        try:
+            with open(self.path) as f:
+                log = json.load(f)
+        except FileNotFoundError:
+            log = {}
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable timings file '{self.path}': {e}")
+            log = {}
+        if log.get("features") != FEATURES or not log.get("timings"):
+            return np.zeros((0, len(FEATURES))), np.zeros(0)
+        timings = np.array(log["timings"], dtype=float)
+        return timings[:, :-1], timings[:, -1]
+
+    def model(self) -> CostModel:
+        return CostModel.calibrate(*self.load())
+
+    def record(self, features: np.ndarray, seconds: np.ndarray) -> None:
+        """Append timings, keeping the newest ``MAX_TIMINGS``."""
+        old_features, old_seconds = self.load()
+        timings = np.column_stack([np.vstack([old_features, features]), np.concatenate([old_seconds, seconds])])
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"features": FEATURES, "timings": timings[-MAX_TIMINGS:].round(4).tolist()}, f)
+        os.replace(tmp, self.path)
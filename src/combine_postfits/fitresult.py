@@ -0,0 +1,313 @@
+import importlib.util
+import logging
+import struct
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import uproot
+
+FIT_RESULTS = ["fit_s", "fit_b"]
+
+_int16 = struct.Struct(">h")
+_uint16 = struct.Struct(">H")
+_int32 = struct.Struct(">i")
+_uint32 = struct.Struct(">I")
+_float64 = struct.Struct(">d")
+_matrix_header = struct.Struct(">iiiiiid")
+
+# TBufferFile constants
+_kByteCountMask = 0x40000000
+_kNewClassTag = 0xFFFFFFFF
+_kClassMask = 0x80000000
+_kMapOffset = 2
+_kIsReferenced = 1 << 4
+
+
+@dataclass(frozen=True)
+class FitParam:
+    """Value and errors of a floating parameter, stored as in ``RooRealVar``.
+
+    ``asym_lo``/``asym_hi`` are the (Minos) asymmetric errors; RooFit marks them as unset
+    with ``asym_lo > 0`` or ``asym_hi < 0``.
+    """
+
+    value: float
+    error: float
+    asym_lo: float = 1.0
+    asym_hi: float = -1.0
+
+    @property
+    def has_asym_error(self) -> bool:
+        return self.asym_hi >= 0 and self.asym_lo <= 0
+
+    @property
+    def error_lo(self) -> float:
+        """Equivalent of ``RooRealVar::getErrorLo``."""
+        return self.asym_lo if self.asym_lo <= 0 else -self.error
+
+    @property
+    def error_hi(self) -> float:
+        """Equivalent of ``RooRealVar::getErrorHi``."""
+        return self.asym_hi if self.asym_hi >= 0 else self.error
+
+    @property
+    def unc(self) -> tuple[float, float]:
+        """(lo, hi) uncertainty as reported by ``utils.get_fit_unc``."""
+        if self.has_asym_error:
+            return (abs(self.asym_lo), self.asym_hi)
+        return (self.error_lo, self.error_hi)
+
+
+class _RooFitResultReader:
+    """Decoder for the parts of a streamed ``RooFitResult`` needed here.
+
+    uproot can't deserialize RooFit classes (``RooRealVar`` and ``RooLinkedList`` have custom
+    streamers that aren't stored in the file), so this walks the buffer directly: floating
+    parameters are read from ``_finalPars`` and the correlation matrix from ``_CM``. Everything
+    else is skipped using the byte counts ROOT writes in front of each (versioned) object.
+    """
+
+    def __init__(self, chunk: uproot.source.chunk.Chunk, cursor: uproot.source.cursor.Cursor):
+        self.chunk = chunk
+        self.cursor = cursor
+        self.context: dict = {}
+        self.refs: dict[int, Any] = {}
+        self.readers = {
+            "RooArgList": self.read_arg_list,
+            "RooRealVar": self.read_real_var,
+            "TMatrixTSym<double>": self.read_matrix_sym,
+        }
+
+    def field(self, fmt: struct.Struct):
+        return self.cursor.field(self.chunk, fmt, self.context)
+
+    def error(self, message: str) -> uproot.DeserializationError:
+        return uproot.DeserializationError(message, self.chunk, self.cursor, self.context, None)
+
+    def version(self) -> tuple[int, int | None]:
+        """Read a version header. Returns the version and end position (None if there's no byte count)."""
+        start = self.cursor.index
+        bcnt = self.field(_uint32)
+        if bcnt & _kByteCountMask:
+            return self.field(_int16), start + 4 + (bcnt & ~_kByteCountMask)
+        self.cursor.move_to(start)
+        return self.field(_int16), None
+
+    def skip_versioned(self) -> None:
+        _, end = self.version()
+        if end is None:
+            raise self.error("cannot skip an object without a byte count")
+        self.cursor.move_to(end)
+
+    def skip_tobject(self) -> None:
+        self.field(_int16)
+        self.field(_uint32)  # fUniqueID
+        if self.field(_uint32) & _kIsReferenced:  # fBits
+            self.field(_uint16)
+
+    def read_pointer(self) -> Any:
+        """Read an object pointer, following ``TBufferFile::ReadObjectAny``.
+
+        Objects of classes without a reader are skipped and returned as None.
+        """
+        beg = self.cursor.displacement()
+        beg_index = self.cursor.index
+        bcnt = self.field(_uint32)
+        if (bcnt & _kByteCountMask) == 0 or bcnt == _kNewClassTag:
+            has_bcnt, start, tag, end = False, 0, bcnt, None
+        else:
+            has_bcnt, start = True, self.cursor.displacement()
+            tag, end = self.field(_uint32), beg_index + 4 + (bcnt & ~_kByteCountMask)
+
+        if tag & _kClassMask == 0:  # Reference to an already read object (or null)
+            if tag != 0 and tag not in self.refs and end is not None:
+                self.cursor.move_to(end)
+            return self.refs.get(tag)
+        if tag == _kNewClassTag:
+            classname = self.cursor.classname(self.chunk, self.context)
+            self.refs[start + _kMapOffset if has_bcnt else len(self.refs) + 1] = classname
+        else:
+            classname = self.refs.get(tag & ~_kClassMask)
+            if not isinstance(classname, str):
+                raise self.error(f"invalid class reference {tag & ~_kClassMask}")
+
+        reader = self.readers.get(classname)
+        if reader is not None:
+            obj = reader()
+        elif end is not None:
+            obj = None
+        else:
+            raise self.error(f"cannot skip object of class '{classname}' without a byte count")
+        if end is not None:
+            self.cursor.move_to(end)
+        self.refs[beg + _kMapOffset if has_bcnt else len(self.refs) + 1] = obj
+        return obj
+
+    def read_arg_list(self) -> list:
+        _, end = self.version()  # RooArgList
+        collection_version, _ = self.version()  # RooAbsCollection
+        self.skip_tobject()
+        self.skip_versioned()  # RooPrintable
+        # RooAbsCollection::_list is a std::vector<RooAbsArg*> (v3+, ROOT >= 6.22) or a
+        # RooLinkedList (custom streamer: TObject, size, elements)
+        self.version()
+        if collection_version < 3:
+            self.skip_tobject()
+        items = [self.read_pointer() for _ in range(self.field(_int32))]
+        if end is not None:
+            self.cursor.move_to(end)
+        return items
+
+    def read_real_var(self) -> tuple[str, FitParam]:
+        version, end = self.version()  # RooRealVar (custom streamer)
+        _, end_lvalue = self.version()  # RooAbsRealLValue
+        self.version()  # RooAbsReal
+        _, end_arg = self.version()  # RooAbsArg
+        self.version()  # TNamed
+        self.skip_tobject()
+        name = self.cursor.string(self.chunk, self.context)
+        if end_arg is None or end_lvalue is None:
+            raise self.error("RooRealVar base classes without byte counts")
+        self.cursor.move_to(end_arg)
+        self.field(_float64)  # _plotMin
+        self.field(_float64)  # _plotMax
+        self.field(_int32)  # _plotBins
+        value = self.field(_float64)
+        self.cursor.move_to(end_lvalue)
+        if version == 1:  # Old format still carrying the fit range
+            self.field(_float64)
+            self.field(_float64)
+            self.field(_int32)
+        error, asym_lo, asym_hi = self.field(_float64), self.field(_float64), self.field(_float64)
+        if end is not None:
+            self.cursor.move_to(end)
+        return name, FitParam(value, error, asym_lo, asym_hi)
+
+    def read_matrix_sym(self) -> np.ndarray:
+        # TMatrixTSym::Streamer: TMatrixTBase members, then the upper triangle row by row
+        _, end = self.version()
+        self.skip_tobject()
+        nrows, ncols, _, _, _, _, _ = self.cursor.fields(self.chunk, _matrix_header, self.context)
+        matrix = np.zeros((nrows, ncols))
+        for i in range(nrows):
+            matrix[i, i:] = self.cursor.array(self.chunk, ncols - i, np.dtype(">f8"), self.context)
+        matrix += np.triu(matrix, 1).T
+        if end is not None:
+            self.cursor.move_to(end)
+        return matrix
+
+    def read_fit_result(self) -> tuple[dict[str, FitParam], np.ndarray | None]:
+        version, _ = self.version()
+        if version < 5:
+            raise self.error(f"unsupported RooFitResult version {version}")
+        self.skip_versioned()  # TNamed
+        self.skip_versioned()  # RooPrintable
+        self.skip_versioned()  # RooDirItem
+        self.cursor.skip(3 * _int32.size + 2 * _float64.size)  # _status, _covQual, _numBadNLL, _minNLL, _edm
+        self.read_pointer()  # _constPars
+        self.read_pointer()  # _initPars
+        final_pars = self.read_pointer()
+        correlation = self.read_pointer()  # _CM
+        if final_pars is None or not all(isinstance(p, tuple) for p in final_pars):
+            raise self.error("could not decode RooFitResult::_finalPars")
+        return dict(final_pars), correlation
+
+
+@dataclass
+class FitResultTable:
+    """Floating parameters of the ``fit_s``/``fit_b`` RooFitResults of a fitDiagnostics file.
+
+    Extracted once per run and passed around (it is picklable) instead of walking the
+    RooFitResult on every lookup. Layout: ``params[fit_type][name] -> FitParam``.
+    """
+
+    params: dict[str, dict[str, FitParam]] = field(default_factory=dict)
+    correlations: dict[str, np.ndarray] = field(default_factory=dict)  # Ordered as ``params[fit_type]``
+
+    @classmethod
+    def from_uproot(cls, fitDiag: uproot.ReadOnlyDirectory, fit_types: list[str] | None = None) -> "FitResultTable":
+        """Extract from an open uproot file, without ROOT. Raises ``uproot.DeserializationError`` on failure."""
+        params, correlations = {}, {}
+        for fit_type in fit_types if fit_types is not None else FIT_RESULTS:
+            if fit_type not in fitDiag:
+                logging.debug(f"  No RooFitResult '{fit_type}' in fitDiag.")
+                continue
+            key = fitDiag.key(fit_type)
+            if key.fClassName != "RooFitResult":
+                raise uproot.KeyInFileError(fit_type, because=f"'{fit_type}' is a {key.fClassName}")
+            chunk, cursor = key.get_uncompressed_chunk_cursor()
+            params[fit_type], correlation = _RooFitResultReader(chunk, cursor).read_fit_result()
+            if correlation is not None:
+                correlations[fit_type] = correlation
+        return cls(params, correlations)
+
+    @classmethod
+    def from_file(
+        cls, fitDiag: uproot.ReadOnlyDirectory, fit_types: list[str] | None = None, use_root: bool = True
+    ) -> "FitResultTable | None":
+        """Extract with ``from_uproot``, falling back to ``from_root`` (if ``use_root`` and ROOT is available)."""
+        try:
+            return cls.from_uproot(fitDiag, fit_types=fit_types)
+        except (uproot.DeserializationError, uproot.KeyInFileError, ValueError) as e:
+            if use_root and importlib.util.find_spec("ROOT") is not None:
+                logging.info(f"Could not read fit results with uproot ({e}), falling back to ROOT.")
+                return cls.from_root(fitDiag.file.file_path, fit_types=fit_types)
+            logging.warning(f"Could not read fit results with uproot ({e}). Signal strengths will be unavailable.")
+            return None
+
+    @classmethod
+    def from_root(cls, fitDiag: Any, fit_types: list[str] | None = None) -> "FitResultTable":
+        """Extract from an open ROOT ``TFile`` (or a path to one)."""
+        if isinstance(fitDiag, (str, Path)):
+            import ROOT as r
+
+            rf = r.TFile.Open(str(fitDiag))
+            try:
+                return cls.from_root(rf, fit_types=fit_types)
+            finally:
+                rf.Close()
+        params = {}
+        for fit_type in fit_types if fit_types is not None else FIT_RESULTS:
+            fit_result = fitDiag.Get(fit_type)
+            if not fit_result:
+                logging.debug(f"  No RooFitResult '{fit_type}' in fitDiag.")
+                continue
+            float_pars = fit_result.floatParsFinal()
+            params[fit_type] = {
+                par.GetName(): FitParam(par.getVal(), par.getError(), par.getAsymErrorLo(), par.getAsymErrorHi())
+                for par in (float_pars.at(i) for i in range(float_pars.getSize()))
+            }
+        return cls(params)
+
+    @property
+    def fit_types(self) -> list[str]:
+        return list(self.params)
+
+    def correlation_matrix(self, fittype: str = "fit_s") -> tuple[list[str], np.ndarray]:
+        """Parameter names and their correlation matrix."""
+        if fittype not in self.correlations:
+            raise KeyError(f"No correlation matrix available for '{fittype}'.")
+        return list(self.params[fittype]), self.correlations[fittype]
+
+    def get(self, name: str, fittype: str = "fit_s") -> FitParam | None:
+        return self.params.get(fittype, {}).get(name)
+
+    def value(self, name: str, fittype: str = "fit_s", substitute: float | None = 1.0) -> float | None:
+        """Parameter value, or ``substitute`` if it is not available."""
+        par = self.get(name, fittype)
+        if par is None:
+            logging.warning(f"Parameter {name} not found in fitDiag. Returning {substitute}")
+            return substitute
+        return par.value
+
+    def unc(
+        self, name: str, fittype: str = "fit_s", substitute: tuple[float, float] = (0.0, 0.0)
+    ) -> tuple[float, float]:
+        """Parameter (lo, hi) uncertainty, or ``substitute`` if it is not available."""
+        par = self.get(name, fittype)
+        if par is None:
+            logging.warning(f"Parameter {name} not found in fitDiag. Returning {substitute}")
+            return substitute
+        return par.unc
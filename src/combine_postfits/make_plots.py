@@ -1,14 +1,23 @@
 import argparse
 import fnmatch
-import importlib.util
+import glob
 import logging
+import multiprocessing
+import os
+import queue
+import resource
+import signal
 import sys
+import threading
 import time
-from collections.abc import Iterator
-from dataclasses import dataclass
-from multiprocessing import Process, Semaphore
+import traceback
+from collections import Counter, defaultdict
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager, suppress
+from dataclasses import dataclass, replace
+from functools import partial
 from pathlib import Path
-from typing import Any
 
 import matplotlib
 import matplotlib.pyplot as plt
@@ -32,31 +41,29 @@ from rich.progress import (
 from rich.traceback import install
 
 from combine_postfits import plot_postfits, utils
+from combine_postfits.cache import ShapeCache
+from combine_postfits.chi2 import OVERALL_COVAR, OverallCovariance, channel_chi2, channel_toys, group_chi2, group_toys
+from combine_postfits.costmodel import (
+    FEATURES,
+    CostModel,
+    TimingLog,
+    locality_batches,
+    makespan,
+    peak_memory,
+    task_features,
+)
+from combine_postfits.fitresult import FitResultTable
+from combine_postfits.merge_plan import MergePlan
+from combine_postfits.shapes import FitDiagIndex, ShapeStore
+from combine_postfits.shared import SharedShapes
+from combine_postfits.summary import CategorySummary, GofSummary, summarize_category
 from combine_postfits.utils import str2bool
 
 install(show_locals=False)
 
-ROOT_spec = importlib.util.find_spec("ROOT")
-ROOT_AVAILABLE = ROOT_spec is not None
-if ROOT_AVAILABLE:
-    import ROOT as r
-
 hep.style.use("CMS")
 
 
-def time_check(progress: Progress, procs: list[Process], limit: int = 5) -> None:
-    """Monitor plotting processes and terminate if they exceed the time limit."""
-    if progress.tasks[0].elapsed // 60 >= limit:
-        logging.error(
-            f"Plotting taking longer than {limit} minutes. Likely and issue with file opening or too many figures. Try rerunning or running with `--p 0`."
-        )
-        remaining_procs = [p for p in procs if p.is_alive()]
-        logging.error(f"Terminating remaining plot processes: {[p.name for p in remaining_procs]}")
-        for p in remaining_procs:
-            p.terminate()
-        sys.exit()
-
-
 def sci_notation(number: float, sig_fig: int = 1, no_zero: bool = False) -> str:
     """Format a number in scientific notation for LaTeX (e.g. 1.2 x 10^{3})."""
     ret_string = f"{number:.{sig_fig}e}"
@@ -88,12 +95,364 @@ class PlotTask:
     savename: str
     label: str | None
     blind_range: str | None
+    source: str | None = None  # Input file the task belongs to (batch mode)
+
+
+@dataclass
+class TaskResult:
+    """Outcome of a plot task, reported back by the worker that ran it."""
+
+    task: PlotTask
+    ok: bool
+    seconds: float
+    worker: int  # pid
+    error: str | None = None  # traceback
+    lost: bool = False  # No result came back (the worker was stopped by the ``Watchdog`` or crashed), or timed out
+    summary: CategorySummary | None = None  # ``--summary`` row of a streamed category, see ``plot_task``
+
+
+@dataclass
+class PlotInput:
+    """A loaded input file: its shapes, fit results and where its plots go."""
+
+    path: Path
+    out_dir: Path
+    store: ShapeStore | SharedShapes  # Shared on the way to ``spawn``/``forkserver`` workers
+    fit_results: FitResultTable | None
+    fitDiag: uproot.ReadOnlyDirectory | None = None  # Kept open for streaming stores
+
+
+class ChannelScheduler:
+    """Ties channel residency to the plot tasks still pending.
+
+    A task's channels are pinned in its store while it runs and, for streaming stores
+    (``--max-memory``), evicted as soon as no pending task needs them anymore.
+    """
+
+    def __init__(self, plot_inputs: dict[str, PlotInput], tasks: list[PlotTask]):
+        self.plot_inputs = plot_inputs
+        self.pending = Counter((task.source, task.fittype, ch) for task in tasks for ch in task.channels)
+
+    def fits(self, task: PlotTask) -> bool:
+        """Whether ``task`` can start without exceeding the memory budget."""
+        return self.plot_inputs[task.source].store.fits(task.fittype, task.channels)
+
+    def acquire(self, task: PlotTask) -> None:
+        self.plot_inputs[task.source].store.pin(task.fittype, task.channels)
+
+    def release(self, task: PlotTask) -> None:
+        store = self.plot_inputs[task.source].store
+        store.unpin(task.fittype, task.channels)
+        for ch in task.channels:
+            self.pending[task.source, task.fittype, ch] -= 1
+            if self.pending[task.source, task.fittype, ch] == 0:
+                store.evict(task.fittype, ch)
+
+
+def print_plan(
+    tasks: list[PlotTask],
+    names: list[str],
+    features: np.ndarray,
+    batches: list[list[int]],
+    model: CostModel,
+    n_workers: int,
+    parent_bytes: float,
+) -> None:
+    """``--plan``: estimated cost of every plot (in dispatch order), total wall time and peak memory."""
+    from rich.console import Console
+    from rich.table import Table
+
+    costs = model.estimate(features)
+    table = Table(title="[bold]Plotting plan[/bold]", show_header=True, header_style="bold magenta")
+    table.add_column("Batch", justify="right")
+    table.add_column("Category", style="green")
+    table.add_column("Fit Type", style="cyan")
+    table.add_column("Channels", justify="right")
+    table.add_column("Samples", justify="right")
+    table.add_column("Shapes [MB]", justify="right")
+    table.add_column("Est. time [s]", justify="right")
+    for b, batch in enumerate(batches):
+        for i in batch:
+            table.add_row(
+                str(b),
+                names[i],
+                tasks[i].fittype,
+                str(len(tasks[i].channels)),
+                str(int(features[i, FEATURES.index("samples")])),
+                f"{features[i, FEATURES.index('mbytes')]:.2f}",
+                f"{costs[i]:.2f}",
+            )
+    console = Console()
+    console.print(table)
+    calibration = f"calibrated on {model.n_timings} recorded timings" if model.n_timings else "default estimates"
+    console.print(f"{len(tasks)} plots, {costs.sum():.1f}s of plotting ({calibration}).")
+    workers = f"with {n_workers} workers, longest batch first" if n_workers > 0 else "serial"
+    wall = makespan(np.array([costs[batch].sum() for batch in batches]), n_workers)
+    console.print(f"Estimated wall time: {wall:.1f}s ({workers}).")
+    console.print(f"Estimated peak memory: {peak_memory(parent_bytes, features, n_workers) / 1024**2:.0f} MB.")
+
+
+def print_retries(retried: list[tuple[str, list[TaskResult], TaskResult]]) -> None:
+    """Run summary of the retried plots: ``(name, failed attempts, final result)`` of each."""
+    from rich.console import Console
+    from rich.table import Table
+
+    table = Table(title="[bold yellow]Retried plots[/bold yellow]", show_header=True, header_style="bold magenta")
+    table.add_column("Category", style="green")
+    table.add_column("Fit Type", style="cyan")
+    table.add_column("Attempts", justify="right")
+    table.add_column("Failures")
+    table.add_column("Outcome")
+    for name, failures, result in retried:
+        reasons = dict.fromkeys(failure.error.strip().splitlines()[-1] for failure in failures)
+        outcome = "[green]ok[/green]" if result.ok else "[bold red]failed[/bold red]"
+        table.add_row(name, result.task.fittype, str(len(failures) + 1), "; ".join(reasons), outcome)
+    Console().print(table)
+    recovered = sum(result.ok for _, _, result in retried)
+    logging.warning(f"Retried {len(retried)} plot(s): {recovered} recovered, {len(retried) - recovered} still failing.")
+
+
+class Prefetcher:
+    """Producer stage of the plotting pipeline, reading the channels of upcoming tasks in a background thread.
+
+    Batches of tasks (of one input, see ``costmodel.locality_batches``) are handed out in order
+    with their channels pinned (read beforehand, for streaming stores), so that reading the next
+    categories overlaps with rendering the current ones. At most ``depth`` batches wait in the
+    queue and a batch is only read once its channels fit in the ``--max-memory`` budget next to
+    the pinned ones (or nothing else is pinned). ``release`` must be called for every batch once
+    it is rendered.
+    """
+
+    def __init__(self, scheduler: ChannelScheduler, batches: list[list[PlotTask]], depth: int = 1) -> None:
+        self.scheduler = scheduler
+        self._queue: queue.Queue = queue.Queue(maxsize=max(depth, 1))
+        self._released = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._produce, args=(batches,), name="prefetch", daemon=True)
+        self._thread.start()
+
+    def _produce(self, batches: list[list[PlotTask]]) -> None:
+        try:
+            for batch in batches:
+                store = self.scheduler.plot_inputs[batch[0].source].store
+                channels = defaultdict(list)
+                for task in batch:
+                    channels[task.fittype].extend(ch for ch in task.channels if ch not in channels[task.fittype])
+                with self._released:
+                    self._released.wait_for(
+                        lambda: self._stop.is_set() or store.fits_all(channels.items()) or store.pinned_nbytes == 0
+                    )
+                if self._stop.is_set():
+                    return
+                for task in batch:
+                    self.scheduler.acquire(task)
+                self._put(batch)
+        except Exception as e:
+            self._put(e)
+        self._put(None)
+
+    def _put(self, item) -> None:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def get(self, block: bool = True) -> list[PlotTask] | None:
+        """Next batch, ``None`` once all were handed out (``queue.Empty`` if not ``block``)."""
+        item = self._queue.get(block=block)
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def __iter__(self) -> Iterator[list[PlotTask]]:
+        while (item := self.get()) is not None:
+            yield item
+
+    def release(self, batch: list[PlotTask]) -> None:
+        for task in batch:
+            self.scheduler.release(task)
+        with self._released:
+            self._released.notify_all()
+
+    def close(self) -> None:
+        self._stop.set()
+        with self._released:
+            self._released.notify_all()
+        self._thread.join()
+
+    def __enter__(self) -> "Prefetcher":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+TIMEOUT_FLOOR = 60.0  # Seconds any plot is given before its worker is stopped, however cheap its estimate
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+class Watchdog:
+    """Follows the tasks running in a worker pool and stops the workers of those overrunning their deadline.
+
+    Workers report the start and the result of every task on ``events`` (see ``run_batch``), a
+    ``SimpleQueue`` as its writes aren't buffered in a thread that dies with a crashing worker. A
+    started task is given ``timeout(task)`` seconds, after which its worker is killed. The tasks of
+    a worker that died (stopped, or crashed: a segfault, the OOM killer) come back as ``lost``
+    results, as do the remaining tasks of its batch; the pool replaces the worker by a fresh one.
+    """
+
+    def __init__(self, events: multiprocessing.SimpleQueue, timeout: Callable[[PlotTask], float]) -> None:
+        self.events = events
+        self.timeout = timeout
+        self.batches: dict[int, list[PlotTask]] = {}
+        self.results: dict[int, list[TaskResult]] = {}
+        self.running: dict[int, tuple[int, float, float]] = {}  # Batch id: pid, start and deadline of its task
+        self.killed: set[int] = set()
+        self._errors: queue.SimpleQueue = queue.SimpleQueue()
+
+    def submit(self, batch_id: int, batch: list[PlotTask]) -> None:
+        self.batches[batch_id] = batch
+        self.results[batch_id] = []
+
+    def error(self, batch_id: int, e: BaseException) -> None:
+        """``error_callback`` of a batch that raised outside of ``run_task`` (called from the pool's thread)."""
+        self._errors.put((batch_id, e))
+
+    def poll(self, timeout: float = 0.1) -> list[list[TaskResult]]:
+        """Wait up to ``timeout`` for worker events, stop the overrunning tasks and return the finished batches."""
+        until = time.monotonic() + timeout
+        while self.events.empty() and time.monotonic() < until:
+            time.sleep(0.01)
+        while not self.events.empty():
+            self._handle(*self.events.get())
+        while not self._errors.empty():
+            batch_id, e = self._errors.get()
+            if batch_id in self.batches:
+                self._fail(batch_id, f"{type(e).__name__}: {e}")
+        self._check()
+        finished = [
+            batch_id for batch_id, results in self.results.items() if len(results) == len(self.batches[batch_id])
+        ]
+        for batch_id in finished:
+            del self.batches[batch_id]
+        return [self.results.pop(batch_id) for batch_id in finished]
+
+    def _handle(self, batch_id: int, i: int, pid: int, result: TaskResult | None) -> None:
+        if batch_id not in self.batches:  # Already given up on
+            return
+        if result is None:
+            now = time.monotonic()
+            self.running[batch_id] = (pid, now, now + self.timeout(self.batches[batch_id][i]))
+        else:
+            self.results[batch_id].append(result)
+            self.running.pop(batch_id, None)
+
+    def _check(self) -> None:
+        now = time.monotonic()
+        for batch_id, (pid, start, deadline) in list(self.running.items()):
+            if now > deadline and pid not in self.killed:
+                task = self.batches[batch_id][len(self.results[batch_id])]
+                logging.warning(
+                    f"Plotting '{task.savename}' ({task.fittype}) still running after {now - start:.0f}s, "
+                    f"stopping worker {pid}."
+                )
+                with suppress(ProcessLookupError):
+                    os.kill(pid, signal.SIGKILL)
+                self.killed.add(pid)
+                self._fail(batch_id, f"Timed out after {deadline - start:.0f}s", pid, now - start, lost=True)
+        for batch_id, (pid, start, _) in list(self.running.items()):
+            if pid in self.killed or not _alive(pid):
+                self._fail(batch_id, f"Worker {pid} died", pid, now - start, lost=True)
+
+    def _fail(self, batch_id: int, error: str, worker: int = 0, seconds: float = 0.0, lost: bool = False) -> None:
+        """Fail the remaining tasks of a batch, the first one having run for ``seconds``."""
+        self.running.pop(batch_id, None)
+        results = self.results[batch_id]
+        for k, task in enumerate(self.batches[batch_id][len(results) :]):
+            results.append(TaskResult(task, False, seconds if k == 0 else 0.0, worker, error, lost=lost))
+
+
+class DeadlineExceeded(Exception):
+    """A serial plot ran past its deadline (see ``deadline``)."""
+
+
+@contextmanager
+def deadline(seconds: float) -> Iterator[None]:
+    """Raise ``DeadlineExceeded`` in the main thread once ``seconds`` have passed (serial path, ``-p 0``).
+
+    The serial counterpart of the ``Watchdog``, it is only checked between Python bytecodes:
+    a plot hung inside a C extension, or crashing the process, isn't stopped by it.
+    """
+    if not np.isfinite(seconds) or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def expire(signum, frame):
+        raise DeadlineExceeded(f"Timed out after {seconds:.0f}s")
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def resolve_inputs(patterns: list[str]) -> list[Path]:
+    """Expand ``--input`` arguments into a list of files.
+
+    Each argument is a path, a glob pattern (``fits/*/fitDiagnostics*.root``) or ``@list.txt``,
+    a text file with one path/pattern per line. Duplicates are dropped, order is preserved.
+    """
+    paths = []
+    for pattern in patterns:
+        if pattern.startswith("@"):
+            with open(pattern[1:]) as f:
+                lines = [line.strip() for line in f]
+            paths.extend(resolve_inputs([line for line in lines if line and not line.startswith("#")]))
+        elif glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern))
+            if not matches:
+                logging.warning(f"No files found matching '{pattern}'.")
+            paths.extend(Path(m) for m in matches)
+        else:
+            paths.append(Path(pattern))
+    return list(dict.fromkeys(paths))
+
+
+def output_dirs(template: str, inputs: list[Path]) -> list[Path]:
+    """Output directory of each input from the ``--output`` template.
+
+    ``{stem}``, ``{name}`` and ``{parent}`` are replaced by the input's file stem, file name and
+    parent directory name. When plotting several inputs without any placeholder, each input gets
+    a ``<output>/<stem>`` subdirectory.
+    """
+    if len(inputs) > 1 and "{" not in template:
+        template = str(Path(template) / "{stem}")
+    out_dirs = [Path(template.format(stem=p.stem, name=p.name, parent=p.absolute().parent.name)) for p in inputs]
+    clashes = sorted({str(d) for d in out_dirs if out_dirs.count(d) > 1})
+    if clashes:
+        raise ValueError(
+            f"Several inputs would be written to the same output directory {clashes}. "
+            "Use `{parent}` in `--output` to tell them apart, e.g. `-o 'plots/{parent}/{stem}'`."
+        )
+    return out_dirs
 
 
 def generate_plot_tasks(
-    args: argparse.Namespace, fit_types: list[str], fd: uproot.ReadOnlyDirectory
+    args: argparse.Namespace, fit_types: list[str], index: FitDiagIndex, source: str | None = None
 ) -> Iterator[PlotTask]:
-    """Generate PlotTask objects based on CLI arguments and available channels."""
+    """Generate PlotTask objects based on CLI arguments and available channels (tagged with ``source``)."""
     # 1. Parse Blinding Patterns
     if args.blind is not None:
         blind_cat_patterns = args.blind.split(",") if "," in args.blind else [args.blind]
@@ -117,10 +476,8 @@ def generate_plot_tasks(
     # Currently it mostly affects plotting, so we leave it, but args.rmap is used for validation.)
 
     for fit_type in fit_types:
-        # Get available channels for this fit type
-        # Shapes are like "shapes_prefit/channel/sample", we want "channel"
-        # We filter out typical ROOT subdirectories or non-channel keys if necessary
-        available_channels = [c.split(";")[0] for c in fd[f"shapes_{fit_type}"].keys() if c.count("/") == 0]
+        # Get available channels for this fit type (listed once when the file was indexed)
+        available_channels = index.channels(fit_type)
         logging.debug(f"Available '{fit_type}' channels: {available_channels}")
 
         # Resolve which channels are blinded
@@ -161,6 +518,7 @@ def generate_plot_tasks(
                     savename=channel,
                     label=None,  # Will be autofilled later or used as is
                     blind_range=blind_mapping_flattened.get(channel),
+                    source=source,
                 )
 
         # Case B: Standard list of categories (comma-sep) or Merged categories (colon-sep)
@@ -193,6 +551,7 @@ def generate_plot_tasks(
                         savename=mcat,
                         label=None,  # Resolved in main() (supports ';'-separated --catlabels per group)
                         blind_range=blind_mapping_flattened.get(mcat),
+                        source=source,
                     )
             else:
                 # List mode: "cat1,cat2,cat3" -> 3 plots
@@ -206,13 +565,13 @@ def generate_plot_tasks(
                             savename=channel,
                             label=None,
                             blind_range=blind_mapping_flattened.get(channel),
+                            source=source,
                         )
 
 
 def process_plot(
-    semaphore,
-    fd: uproot.ReadOnlyDirectory,
-    rfd: Any,
+    store: ShapeStore,
+    fit_results: FitResultTable | None,
     task: PlotTask,
     style: dict,
     rmap: dict,
@@ -222,19 +581,11 @@ def process_plot(
 ) -> None:
     """Process a single plot task (worker function).
 
-    ``fd``/``rfd`` are the parent's open handles, reused directly in the serial path. In the
-    multiprocessing path they are passed as ``None`` and each worker opens its own handles from
-    ``args.input``: a ROOT ``TFile``/uproot directory must not be shared across processes (a forked
-    child would share the file offset, and the handles are not picklable under spawn/forkserver).
+    ``store`` and ``fit_results`` hold the shapes and fit parameters extracted once by the parent,
+    so workers never re-read ``args.input`` (nor need a ROOT ``TFile`` of their own).
     """
     fig = None
-    own_handles = False
     try:
-        if fd is None:
-            fd = uproot.open(args.input)
-            own_handles = True
-            if ROOT_AVAILABLE and not args.noroot:
-                rfd = r.TFile.Open(args.input)
         config = plot_postfits.PlotConfig(
             fit_type=task.fittype,
             cats=task.channels,
@@ -250,13 +601,15 @@ def process_plot(
             cat_info=task.label,
             chi2=args.chi2,
             chi2_nocorr=args.chi2_nocorr,
+            chi2_overall=args.chi2_overall,
+            chi2_toys=args.chi2_toys,
             residuals=args.residuals,
         )
         fig, (ax, rax) = plot_postfits.plot(
-            fd,
+            store,
             config,
             style=style,
-            fitDiag_root=rfd,
+            fitDiag_root=fit_results,
         )
         if fig is None:
             return None
@@ -303,13 +656,217 @@ def process_plot(
             )
     finally:
         if fig is not None:
-            plt.close(fig)  # Release the figure (serial path reuses pyplot's global figure manager)
-        if own_handles:
-            fd.close()
-            if rfd:
-                rfd.Close()
-        if semaphore is not None:
-            semaphore.release()
+            plt.close(fig)  # Release the figure (workers and the serial path reuse pyplot's global figure manager)
+
+
+# State of a pool worker, set once by ``init_worker``
+_worker: dict = {}
+START_METHODS = ["fork", "forkserver", "spawn"]
+
+
+def warm_up() -> None:
+    """Draw a throwaway figure, so font lookup, mathtext and the CMS style are set up before workers start."""
+    fig, (ax, rax) = plt.subplots(2, 1, figsize=(4, 4), gridspec_kw=dict(height_ratios=[3, 1]))
+    hep.cms.label("Preliminary", ax=ax, data=True, lumi=1, com=13)
+    ax.set_ylabel("Events / GeV")
+    rax.set_ylabel(r"$\frac{Data - Bkg}{\sigma_{Data}}$")
+    rax.set_xlabel(r"$m_{SD}$ [GeV]")
+    ax.text(0.5, 0.5, r"$\frac{\chi^2}{N_{bins}} = \frac{1.00}{10}$", transform=ax.transAxes)
+    fig.canvas.draw()
+    plt.close(fig)
+
+
+def init_worker(
+    plot_inputs: dict[str, PlotInput],
+    style: dict,
+    rmap: dict,
+    args: argparse.Namespace,
+    format_list: list[str],
+    events: multiprocessing.SimpleQueue,
+    n_workers: int = 1,
+) -> None:
+    """Pool initializer, run once per worker process (of a pool of ``n_workers``).
+
+    With the ``fork`` start method the inputs, style and rmap are inherited from the parent (the
+    pool is forked after they are loaded and matplotlib is warmed up), otherwise they arrive
+    pickled and logging is set up here; ``spawn`` workers also warm up matplotlib themselves
+    (``forkserver`` ones are forked from a template that already did). Stores shared by the parent
+    (``SharedShapes``) are mapped zero-copy. Streaming stores get a file handle of their own and an
+    equal share of the ``--max-memory`` budget: their channels are read by the workers only, the
+    parent doesn't load any. Tasks are reported to the parent's ``Watchdog`` on ``events``.
+    """
+    if args.start_method != "fork":
+        utils.setup_logging(verbose=args.verbose, debug=args.debug)
+        if args.start_method == "spawn":
+            warm_up()
+    for plot_input in plot_inputs.values():
+        if isinstance(plot_input.store, SharedShapes):
+            _worker.setdefault("shared", []).append(plot_input.store)  # Keeps the block mapped
+            plot_input.store = plot_input.store.attach()
+        store = plot_input.store
+        store._executor = None  # The parent's reader threads don't exist in this process
+        store._lock = threading.RLock()  # Nor its prefetch thread, which may have held the lock at fork time
+        if store.streaming:
+            plot_input.fitDiag = uproot.open(plot_input.path)
+            store.index.attach(plot_input.fitDiag)
+            store.max_bytes //= max(n_workers, 1)
+    _worker.update(plot_inputs=plot_inputs, style=style, rmap=rmap, args=args, format_list=format_list, events=events)
+
+
+def plot_task(
+    plot_input: PlotInput,
+    task: PlotTask,
+    style: dict,
+    rmap: dict,
+    args: argparse.Namespace,
+    format_list: list[str],
+) -> CategorySummary | None:
+    """Plot ``task``, its channels pinned by the caller.
+
+    For streaming stores the ``--summary`` row of the category is computed here too, while its
+    channels are resident (the parent summarizes fully loaded stores itself after plotting).
+    """
+    store = plot_input.store
+    process_plot(store, plot_input.fit_results, task, style, rmap, args, plot_input.out_dir, format_list)
+    if not (args.summary and store.streaming) or task.blind:
+        return None
+    return summarize_category(
+        store,
+        task.fittype,
+        task.channels,
+        task.savename,
+        source=str(task.source or ""),
+        blind_data=task.blind_range,
+        chi2_nocorr=args.chi2_nocorr,
+        chi2_overall=args.chi2_overall,
+        chi2_toys=args.chi2_toys,
+    )
+
+
+def attempt(task: PlotTask, plot: Callable[[], CategorySummary | None], timeout: float = np.inf) -> TaskResult:
+    """Run ``plot`` for ``task``, reporting failures (and a ``deadline`` of ``timeout`` seconds) in the result."""
+    start = time.perf_counter()
+    try:
+        with deadline(timeout):
+            summary = plot()
+    except DeadlineExceeded as e:
+        logging.error(f"Plotting '{task.savename}' ({task.fittype}) stopped: {e}.")
+        return TaskResult(task, False, time.perf_counter() - start, os.getpid(), str(e), lost=True)
+    except Exception:
+        logging.exception(f"Plotting '{task.savename}' ({task.fittype}) failed.")
+        return TaskResult(task, False, time.perf_counter() - start, os.getpid(), traceback.format_exc())
+    return TaskResult(task, True, time.perf_counter() - start, os.getpid(), summary=summary)
+
+
+def run_task(task: PlotTask) -> TaskResult:
+    """Plot ``task`` in a pool worker, reporting failures in the result instead of raising."""
+    plot_input = _worker["plot_inputs"][task.source]
+
+    def plot() -> CategorySummary | None:
+        plot_input.store.pin(task.fittype, task.channels)
+        try:
+            return plot_task(
+                plot_input, task, _worker["style"], _worker["rmap"], _worker["args"], _worker["format_list"]
+            )
+        finally:
+            plot_input.store.unpin(task.fittype, task.channels)
+
+    return attempt(task, plot)
+
+
+def run_batch(batch_id: int, batch: list[PlotTask]) -> None:
+    """Plot a batch of tasks of one input in a pool worker (see ``costmodel.locality_batches``).
+
+    The start and the result of every task are reported as ``(batch_id, i, pid, result)`` events
+    (``result`` being ``None`` at the start), see ``Watchdog``.
+    """
+    events, pid = _worker["events"], os.getpid()
+    for i, task in enumerate(batch):
+        events.put((batch_id, i, pid, None))
+        events.put((batch_id, i, pid, run_task(task)))
+
+
+def _warn_no_overall_covar(fit_type: str) -> None:
+    logging.warning(f"'shapes_{fit_type}/{OVERALL_COVAR}' not found, `--chi2_overall` will sum per-channel chi2.")
+
+
+def read_overall_covar(fd: uproot.ReadOnlyDirectory, store: ShapeStore, required: bool = True) -> None:
+    """Read the cross-channel ``overall_total_covar`` matrices into ``store`` (`--chi2_overall`).
+
+    Unless ``required`` (when reading them for later runs only), missing or unusable matrices are skipped quietly.
+    """
+    for fit_type in store.fit_types:
+        try:
+            overall = OverallCovariance.from_file(fd, fit_type, store)
+        except ValueError as e:
+            if required:
+                raise
+            logging.debug(f"Skipping '{OVERALL_COVAR}' of {fit_type}: {e}")
+            continue
+        if overall is not None:
+            store.overall_covar[fit_type] = overall
+        elif required:
+            _warn_no_overall_covar(fit_type)
+
+
+def open_input(path: Path, executor: ThreadPoolExecutor | None = None) -> uproot.ReadOnlyDirectory:
+    if executor is not None:
+        return uproot.open(path, decompression_executor=executor, interpretation_executor=executor)
+    return uproot.open(path)
+
+
+def read_cached_input(
+    path: Path, args: argparse.Namespace, executor: ThreadPoolExecutor | None = None
+) -> tuple[ShapeStore, FitResultTable | None]:
+    """Everything a ``--cache-dir`` entry holds: the complete store, with the overall covariances, and the fit results."""
+    with open_input(path, executor) as fd:
+        store = ShapeStore.from_file(fd, executor=executor)
+        read_overall_covar(fd, store, required=args.chi2_overall)
+        return store, FitResultTable.from_file(fd, use_root=not args.noroot)
+
+
+def load_input(
+    path: Path,
+    out_dir: Path,
+    args: argparse.Namespace,
+    executor: ThreadPoolExecutor | None = None,
+    cache: ShapeCache | None = None,
+    names: set[str] | None = None,
+) -> PlotInput:
+    """Read the shapes and fit results of one input file (closed again once loaded).
+
+    With ``--max-memory`` (and no ``--cache-dir``) only the file listing is read here and the
+    file is kept open, channels are then loaded just in time by the returned streaming store.
+    Only the objects in ``names`` (default: all) are decoded, except for the ``--cache-dir``
+    entry which is kept complete for later runs; on a cache hit the file isn't opened at all.
+    """
+    if cache is not None:
+        store, fit_results = cache.get_or_build(path, lambda: read_cached_input(path, args, executor))
+        if args.chi2_overall:
+            for fit_type in store.fit_types:
+                if fit_type not in store.overall_covar:
+                    _warn_no_overall_covar(fit_type)
+        else:
+            store.overall_covar = {}
+        return PlotInput(path=path, out_dir=out_dir, store=store, fit_results=fit_results)
+    fd = open_input(path, executor)
+    try:
+        # Fit parameters (signal strengths) are extracted once and handed to every task
+        fit_results = FitResultTable.from_file(fd, use_root=not args.noroot)
+        if args.max_memory is not None:
+            store = ShapeStore.stream(fd, max_bytes=args.max_memory * 1024**2, executor=executor, names=names)
+            if args.chi2_overall:
+                read_overall_covar(fd, store)
+            return PlotInput(path=path, out_dir=out_dir, store=store, fit_results=fit_results, fitDiag=fd)
+        else:
+            store = ShapeStore.from_file(fd, executor=executor, names=names)
+        if args.chi2_overall:
+            read_overall_covar(fd, store)
+    except BaseException:
+        fd.close()
+        raise
+    fd.close()
+    return PlotInput(path=path, out_dir=out_dir, store=store, fit_results=fit_results)
 
 
 def main():
@@ -317,15 +874,19 @@ def main():
     parser.add_argument(
         "--input",
         "-i",
-        default="fitDiagnosticsTest.root",
-        help="Input combine fitDiagnostics file",
+        nargs="+",
+        default=["fitDiagnosticsTest.root"],
+        help="Input combine fitDiagnostics file(s). Accepts several files, glob patterns (quoted, e.g. "
+        "`'fits/*/fitDiagnostics*.root'`) and `@list.txt` files listing one input per line. "
+        "All inputs are plotted in one run sharing the same worker processes.",
     )
     parser.add_argument(
         "--output",
         "-o",
         default="plots",
         dest="output",
-        help="Output folder (will becreated if it doesn't exist).",
+        help="Output folder (will becreated if it doesn't exist). With several inputs, `{stem}`, `{name}` "
+        "and `{parent}` are replaced per input (default: one `<output>/<stem>` subfolder per input).",
     )
     parser.add_argument(
         "--fit",
@@ -355,7 +916,84 @@ def main():
         const=10,
         type=int,
         dest="multiprocessing",
-        help="Use multiprocessing. May fail due to parallel reads from fitDiag. `-p` defaults to 10 processes.",
+        help="Plot with a pool of worker processes. `-p` defaults to 10 workers.",
+    )
+    parser.add_argument(
+        "--start-method",
+        dest="start_method",
+        choices=START_METHODS,
+        default="fork",
+        help="How `-p` worker processes are started. `fork` (default) shares the loaded inputs with the workers, "
+        "`forkserver` forks them from a template process with matplotlib, mplhep and the CMS style preloaded, "
+        "`spawn` starts fresh interpreters. The latter two map the loaded shapes from a shared memory block.",
+    )
+    parser.add_argument(
+        "--plan",
+        dest="plan",
+        type=str2bool,
+        nargs="?",
+        const=True,
+        default=False,
+        choices=[True, False],
+        help="Print the estimated cost of every plot, the total wall time (with `-p` workers) and the peak memory, "
+        "then exit without plotting.",
+    )
+    parser.add_argument(
+        "--timings",
+        default=None,
+        dest="timings",
+        help="JSON file of plot timings recorded by previous runs (and extended by this one). They calibrate the "
+        "cost model which orders `-p` tasks longest first and drives `--plan`. Defaults to `timings.json` in "
+        "`--cache-dir` when given, otherwise built-in estimates are used.",
+    )
+    parser.add_argument(
+        "--task-timeout",
+        default=10.0,
+        type=float,
+        dest="task_timeout",
+        help="Deadline of a plot, as a multiple of its estimated time (at least 60s). The worker of a plot "
+        "running past it is stopped and the plot retried (see `--retries`). With `-p 0` the plot is interrupted "
+        "in-process, which can't stop a hang inside compiled code. 0 disables the deadlines.",
+    )
+    parser.add_argument(
+        "--retries",
+        default=2,
+        type=int,
+        dest="retries",
+        help="Attempts given to plots after a failure, each in fresh workers (in-process with `-p 0`). Plots "
+        "whose worker hung or crashed are retried in parallel, the last attempt runs every plot still failing one "
+        "at a time.",
+    )
+    parser.add_argument(
+        "--read-threads",
+        default=1,
+        type=int,
+        dest="read_threads",
+        help="Number of threads used to read and decompress the fitDiagnostics file.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        dest="cache_dir",
+        help="Directory for a persistent cache of decoded shapes. Re-running on an unchanged input skips "
+        "reading/decompressing the fitDiagnostics file. Disabled by default.",
+    )
+    parser.add_argument(
+        "--cache-size",
+        default=4096,
+        type=float,
+        dest="cache_size",
+        help="Maximum size of `--cache-dir` in MB. Least recently used entries are evicted beyond it.",
+    )
+    parser.add_argument(
+        "--max-memory",
+        default=None,
+        type=float,
+        dest="max_memory",
+        help="Memory budget for decoded shapes in MB. Instead of loading the whole fitDiagnostics file up front, "
+        "channels are then read just in time for the plots that need them and dropped once no pending plot "
+        "needs them. With `-p`, every worker reads its own channels within an equal share of the budget. Not "
+        "applied with `--cache-dir` (cached shapes are memory-mapped).",
     )
     parser_data = parser.add_argument_group(
         "Data",
@@ -530,6 +1168,26 @@ def main():
         choices=[True, False],
         help="Use naive chi2 instead (no covariance matrix).",
     )
+    parser_debug.add_argument(
+        "--chi2_overall",
+        dest="chi2_overall",
+        type=str2bool,
+        nargs="?",
+        const=True,
+        default=False,
+        choices=[True, False],
+        help="Compute the chi2 of merged categories with the correlations between their channels, from the "
+        "`overall_total_covar` matrix (requires `--saveOverallShapes` in combine).",
+    )
+    parser_debug.add_argument(
+        "--chi2_toys",
+        dest="chi2_toys",
+        type=int,
+        default=10000,
+        help="Number of toys to throw from the postfit model for a goodness-of-fit p-value displayed with the chi2 "
+        "(default: 10000, 0 disables the toys). Bins expecting fewer than 50 events are drawn from a Poisson, "
+        "which makes the toys of mostly low-count channels several times slower.",
+    )
     parser_debug.add_argument(
         "--residuals",
         dest="residuals",
@@ -540,7 +1198,22 @@ def main():
         choices=[True, False],
         help="Display data/MC residuals.",
     )
-    parser_debug.add_argument("--noroot", action="store_true", help="Skip ROOT dependency")
+    parser_debug.add_argument(
+        "--summary",
+        dest="summary",
+        type=str2bool,
+        nargs="?",
+        const=True,
+        default=False,
+        choices=[True, False],
+        help="Write a goodness-of-fit summary of all (unblinded) categories: per-category chi2/ndf and pull tests, "
+        "global Shapiro-Wilk/KS tests over all pulls, as `gof_summary.{json,csv}` and a summary figure.",
+    )
+    parser_debug.add_argument(
+        "--noroot",
+        action="store_true",
+        help="Skip ROOT dependency. Fit results are read with uproot either way, ROOT is only a fallback.",
+    )
 
     import textwrap
 
@@ -575,8 +1248,14 @@ def main():
 
     args = parser.parse_args()
 
-    out_dir = Path(args.output)
-    out_dir.mkdir(parents=True, exist_ok=True)
+    inputs = resolve_inputs(args.input)
+    if not inputs:
+        parser.error(f"No input files found for `--input {' '.join(args.input)}`.")
+    try:
+        out_dirs = output_dirs(args.output, inputs)
+    except ValueError as e:
+        parser.error(str(e))
+    batch = len(inputs) > 1
 
     # Arg processing
     utils.setup_logging(verbose=args.verbose, debug=args.debug)
@@ -591,8 +1270,9 @@ def main():
         fit_types = ["prefit", "fit_s"]
     else:
         fit_types = [args.fit]
-    for fit in fit_types:
-        (out_dir / fit).mkdir(parents=True, exist_ok=True)
+    for out_dir in out_dirs if not args.plan else []:
+        for fit in fit_types:
+            (out_dir / fit).mkdir(parents=True, exist_ok=True)
     if args.format == "both":
         format = ["png", "pdf"]
     else:
@@ -600,18 +1280,43 @@ def main():
 
     # Make plots
 
-    fd = uproot.open(args.input)
-    if ROOT_AVAILABLE and not args.noroot:
-        rfd = r.TFile.Open(args.input)
-    else:
-        rfd = None
+    # Shared by uproot (basket decompression/interpretation) and the shapes_* reads
+    read_executor = ThreadPoolExecutor(max_workers=args.read_threads) if args.read_threads > 1 else None
+    cache = ShapeCache(args.cache_dir, max_size_mb=args.cache_size) if args.cache_dir is not None else None
 
+    # With a style file and explicit `--bkgs`, only the samples that get plotted are decoded
+    names = None
+    if args.style is not None:
+        with open(args.style, "r") as stream:
+            style = yaml.safe_load(stream)
+        config = plot_postfits.PlotConfig(
+            sigs=args.sigs.split(",") if args.sigs else None,
+            bkgs=args.bkgs.split(",") if args.bkgs else None,
+            onto=args.onto,
+            chi2=args.chi2,
+            chi2_nocorr=args.chi2_nocorr,
+        )
+        names = plot_postfits.required_samples(config, utils.extract_mergemap(style))
+        if names is not None:
+            logging.debug(f"Reading only: {sorted(names)}")
+
+    plot_inputs: dict[str, PlotInput] = {}
     try:
-        if args.style is not None:
-            with open(args.style, "r") as stream:
-                style = yaml.safe_load(stream)
-        else:
-            style = utils.make_style_dict_yaml(fd, cmap=args.cmap, sort=True, sort_peaky=True)
+        # Decode all shapes once per input; style generation and every plot task are served from memory
+        for path, out_dir in zip(inputs, out_dirs):
+            if batch:
+                logging.info(f"Reading '{path}' (plots in '{out_dir}').")
+            plot_inputs[str(path)] = load_input(path, out_dir, args, executor=read_executor, cache=cache, names=names)
+        if args.style is None:
+            first, *others = plot_inputs.values()
+            style = utils.make_style_dict_yaml(first.store, cmap=args.cmap, sort=True, sort_peaky=True)
+            # Samples only present in later inputs (e.g. other mass points) are appended
+            for plot_input in others:
+                extra = utils.make_style_dict_yaml(plot_input.store, cmap=args.cmap, sort=True, sort_peaky=True)
+                for key, entry in extra.items():
+                    style.setdefault(key, entry)
+                # Streaming stores are plotted one input after the other, don't keep the later ones resident
+                plot_input.store.trim(0)
             logging.warning(
                 "No `--style sty.yml` file provided, will generate an automatic style yaml and store it as `sty.yml`. "
                 "The `plot` function will respect the order of samples in the style yaml unless overwritten. "
@@ -648,49 +1353,98 @@ def main():
                 )
 
         # Generate Tasks
-        # We iterate over tasks yielded by the generator
+        # Tasks of all inputs go into one list (and one worker pool), tagged with their source file
         all_tasks = []  # Store tasks to allow for label parsing and progress bar total
-        for task in generate_plot_tasks(args, fit_types, fd):
-            all_tasks.append(task)
-            logging.debug(f"Processing task: {task}")
+        for source, plot_input in plot_inputs.items():
+            # Channel/sample listing, shared by task generation
+            input_tasks = list(generate_plot_tasks(args, fit_types, plot_input.store.index, source=source))
+            for task in input_tasks:
+                logging.debug(f"Processing task: {task}")
+
+            # Label parsing for list mode (legacy support for semicolon-separated labels matching task order)
+            # This is a bit fragile but maintains backward compatibility if user passed a list of labels
+            if args.catlabels is not None and ";" in args.catlabels and args.cats and ":" not in args.cats:
+                labels_list = args.catlabels.split(";")
+                if len(labels_list) == len(input_tasks):
+                    for i, task in enumerate(input_tasks):
+                        task.label = labels_list[i]
+                else:
+                    logging.warning(
+                        f"Number of labels ({len(labels_list)}) does not match number of plots ({len(input_tasks)}). Ignoring labels."
+                    )
+            # Label parsing for mapping mode: ';'-separated --catlabels map to the merged groups by name.
+            elif args.catlabels is not None and args.cats and ":" in args.cats:
+                labels_list = args.catlabels.split(";")
+                group_names = [group.split(":", 1)[0] for group in args.cats.split(";") if ":" in group]
+                if len(labels_list) == len(group_names):
+                    label_by_group = dict(zip(group_names, labels_list))
+                    for task in input_tasks:
+                        if task.savename in label_by_group:
+                            task.label = label_by_group[task.savename]
+                else:
+                    logging.warning(
+                        f"Number of labels ({len(labels_list)}) does not match number of merged groups "
+                        f"({len(group_names)}). Ignoring labels."
+                    )
+            all_tasks.extend(input_tasks)
 
         if not all_tasks:
             logging.warning("No plotting tasks generated. Check your --cats or --fit options.")
             sys.exit(0)
 
-        # Label parsing for list mode (legacy support for semicolon-separated labels matching task order)
-        # This is a bit fragile but maintains backward compatibility if user passed a list of labels
-        if args.catlabels is not None and ";" in args.catlabels and args.cats and ":" not in args.cats:
-            labels_list = args.catlabels.split(";")
-            if len(labels_list) == len(all_tasks):
-                for i, task in enumerate(all_tasks):
-                    task.label = labels_list[i]
-            else:
-                logging.warning(
-                    f"Number of labels ({len(labels_list)}) does not match number of plots ({len(all_tasks)}). Ignoring labels."
-                )
-        # Label parsing for mapping mode: ';'-separated --catlabels map to the merged groups by name.
-        elif args.catlabels is not None and args.cats and ":" in args.cats:
-            labels_list = args.catlabels.split(";")
-            group_names = [group.split(":", 1)[0] for group in args.cats.split(";") if ":" in group]
-            if len(labels_list) == len(group_names):
-                label_by_group = dict(zip(group_names, labels_list))
-                for task in all_tasks:
-                    if task.savename in label_by_group:
-                        task.label = label_by_group[task.savename]
-            else:
-                logging.warning(
-                    f"Number of labels ({len(labels_list)}) does not match number of merged groups "
-                    f"({len(group_names)}). Ignoring labels."
-                )
+        def task_name(task: PlotTask) -> str:
+            return f"{Path(task.source).stem}/{task.savename}" if batch else task.savename
+
+        def task_key(task: PlotTask) -> tuple:
+            return task.source, task.fittype, task.savename
+
+        # Estimated cost of every plot (from the channel listing, nothing is read), calibrated on recorded timings
+        timings = args.timings or (Path(args.cache_dir) / "timings.json" if args.cache_dir is not None else None)
+        timing_log = TimingLog(timings) if timings is not None else None
+        cost_model = timing_log.model() if timing_log is not None else CostModel()
+        features = {
+            task_key(task): task_features(
+                plot_inputs[task.source].store,
+                task.fittype,
+                task.channels,
+                blind=task.blind,
+                chi2=args.chi2 or args.chi2_nocorr,
+                residuals=args.residuals,
+                formats=format,
+                dpi=args.dpi,
+            )
+            for task in all_tasks
+        }
+        task_matrix = np.array([features[task_key(task)] for task in all_tasks])
+        costs = cost_model.estimate(task_matrix)
+        batches = [[i] for i in range(len(all_tasks))]
+        if args.multiprocessing > 0:
+            # Tasks sharing channels (the fit types of a category, overlapping merged categories) go to the same
+            # worker, longest batches first so that the largest categories don't start last and set the tail of the run
+            groups = [(task.source, frozenset(task.channels)) for task in all_tasks]
+            batches = locality_batches(groups, costs, max_cost=costs.sum() / (2 * args.multiprocessing))
+        if args.plan:
+            # Streaming stores grow up to their budget while plotting
+            parent_bytes = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 + sum(
+                max(pi.store.max_bytes - pi.store.nbytes, 0) for pi in plot_inputs.values() if pi.store.streaming
+            )
+            print_plan(
+                all_tasks,
+                [task_name(task) for task in all_tasks],
+                task_matrix,
+                batches,
+                cost_model,
+                args.multiprocessing,
+                parent_bytes,
+            )
+            sys.exit(0)
+        batches = [[all_tasks[i] for i in batch] for batch in batches]
 
         # Check for overlaps
-        from collections import defaultdict
-
         channel_to_cats = defaultdict(list)
         for task in all_tasks:
             for channel in task.channels:
-                channel_to_cats[(task.fittype, channel)].append(task.savename)
+                channel_to_cats[(task.source, task.fittype, channel)].append(task.savename)
 
         overlaps = {k: cats for k, cats in channel_to_cats.items() if len(cats) > 1}
         if overlaps:
@@ -712,26 +1466,72 @@ def main():
             for task in all_tasks:
                 n_channels = len(task.channels)
 
-                task_has_overlap = any((task.fittype, ch) in overlaps for ch in task.channels)
+                task_has_overlap = any((task.source, task.fittype, ch) in overlaps for ch in task.channels)
                 if not task_has_overlap:
                     continue
 
                 formatted_channels = [
-                    f"[bold red]{ch}[/bold red]" if (task.fittype, ch) in overlaps else ch for ch in task.channels
+                    f"[bold red]{ch}[/bold red]" if (task.source, task.fittype, ch) in overlaps else ch
+                    for ch in task.channels
                 ]
                 composition_str = ", ".join(formatted_channels)
-                summary_table.add_row(task.fittype, task.savename, str(n_channels), composition_str)
+                summary_table.add_row(task.fittype, task_name(task), str(n_channels), composition_str)
 
             console.print(summary_table)
 
             if not Confirm.ask("[bold red]Do you want to continue with double-counted channels?[/bold red]"):
                 sys.exit("Aborted by user due to overlapping categories.")
 
+        # Sum every merged category up front, sharing partial sums between overlapping ones. Streaming stores are
+        # left out: that would read the whole file once more, their sums and chi2 terms are computed by each plot
+        # while its channels are resident instead.
+        loaded = [task for task in all_tasks if not plot_inputs[task.source].store.streaming]
+        merge = utils.extract_mergemap(style)
+        for source, plot_input in plot_inputs.items():
+            if plot_input.store.streaming:
+                continue
+            plan = MergePlan.from_tasks([task for task in loaded if task.source == source], merge=merge)
+            plan.evaluate(plot_input.store)
+            logging.debug(f"Merge plan for '{source}': {plan.n_leaf_channels} channels summed from the shapes.")
+        if args.chi2 or args.chi2_nocorr:
+            # Goodness-of-fit terms of the unblinded channels, solved in stacked batches and shared by all plots
+            chi2_channels = defaultdict(list)
+            for task in loaded:
+                if not task.blind and task.blind_range is None:
+                    chi2_channels[task.source, task.fittype].extend(task.channels)
+            for (source, fit_type), channels in chi2_channels.items():
+                store = plot_inputs[source].store
+                if fit_type not in store.overall_covar:
+                    channel_chi2(store, fit_type, list(dict.fromkeys(channels)))
+                    if args.chi2_toys > 0:
+                        channel_toys(
+                            store, fit_type, list(dict.fromkeys(channels)), args.chi2_toys, nocorr=args.chi2_nocorr
+                        )
+            # Smaller groups first, so larger ones containing them extend their factorization
+            for task in sorted(loaded, key=lambda task: len(task.channels)):
+                store = plot_inputs[task.source].store
+                if (
+                    args.chi2_overall
+                    and task.fittype in store.overall_covar
+                    and not task.blind
+                    and not task.blind_range
+                ):
+                    group_chi2(store, task.fittype, task.channels)
+                    if args.chi2_toys > 0 and not args.chi2_nocorr:
+                        group_toys(store, task.fittype, task.channels, args.chi2_toys)
+
         # Process Tasks
-        _procs: list[Process] = []  # currently-live worker processes
-        _finished: list[Process] = []  # completed workers, kept to inspect exit codes
-        completed = 0
+        for task in all_tasks:
+            # Resolve label if still None
+            if task.label is None:
+                # Default label logic: use savename, replace \n
+                task.label = task.savename
+
+            # Format label for plotting (translate literal '\n' into real newlines)
+            task.label = "\n".join(str(task.label).split(r"\n"))
+
         failed: list[str] = []
+        retried: list[tuple[str, list[TaskResult], TaskResult]] = []
         with Progress(
             TextColumn("[progress.description]{task.description}"),
             SpinnerColumn(),
@@ -741,89 +1541,127 @@ def main():
             TimeElapsedColumn(),
         ) as progress:
             prog_str_fmt = "[red]Plotting ({} workers): " if args.multiprocessing > 0 else "[red]Plotting: "
-            prog_str = prog_str_fmt.format("N")
-            prog_plotting = progress.add_task(prog_str, total=len(all_tasks))
-            semaphore = Semaphore(args.multiprocessing)
+            prog_plotting = progress.add_task(prog_str_fmt.format(args.multiprocessing), total=len(all_tasks))
 
-            for task in all_tasks:
-                # Resolve label if still None
-                if task.label is None:
-                    # Default label logic: use savename, replace \n
-                    task.label = task.savename
-
-                # Format label for plotting (translate literal '\n' into real newlines)
-                task.label = "\n".join(str(task.label).split(r"\n"))
-
-                if args.multiprocessing > 0:
-                    # Block until a slot frees; the Semaphore already bounds concurrency, so no
-                    # artificial time.sleep() throttle is needed here.
-                    semaphore.acquire()
-                    # Reap finished workers so the live-process scans stay O(live), not O(total).
-                    for done in [p for p in _procs if not p.is_alive()]:
-                        done.join()
-                        _finished.append(done)
-                        _procs.remove(done)
-                        completed += 1
-                    # Pass None handles: each worker opens its own fd/rfd from args.input (a ROOT
-                    # TFile/uproot directory must not be shared across processes); see process_plot.
-                    p = Process(
-                        target=process_plot,
-                        args=(
-                            semaphore,
-                            None,
-                            None,
-                            task,
-                            style,
-                            rmap,
-                            args,
-                            out_dir,
-                            format,
-                        ),
-                        name=task.savename,
-                    )
-                    _procs.append(p)
-                    p.start()
-                    progress.update(
-                        prog_plotting,
-                        completed=completed,
-                        refresh=True,
-                        description=prog_str_fmt.format(len(_procs)),
-                    )
-                    time_check(progress, _procs, 6)
+            # Deadline of a plot, scaled from its estimated cost
+            task_costs = {task_key(task): cost for task, cost in zip(all_tasks, costs)}
+
+            def task_timeout(task: PlotTask) -> float:
+                if args.task_timeout <= 0:
+                    return np.inf
+                return max(TIMEOUT_FLOOR, args.task_timeout * task_costs[task_key(task)])
+
+            shared: list[SharedShapes] = []
+            if args.multiprocessing > 0:
+                # A fixed pool of workers, forked once the stores are loaded (and sums/chi2 precomputed) so
+                # they share the arrays instead of re-reading; results come back over an events queue.
+                context = multiprocessing.get_context(args.start_method)
+                if args.start_method == "fork":
+                    warm_up()  # Inherited by every worker, as are the loaded shapes (copy-on-write)
+                    worker_inputs = plot_inputs
                 else:
-                    process_plot(
-                        None,
-                        fd,
-                        rfd,
-                        task,
-                        style,
-                        rmap,
-                        args,
-                        out_dir,
-                        format,
+                    if args.start_method == "forkserver":
+                        # The server imports (and warms up) everything once, workers are forked from it
+                        context.set_forkserver_preload(["combine_postfits.warm"])
+                    # Open files can't be pickled, streaming workers reopen them anyway. Loaded shapes
+                    # go through shared memory, so workers map them instead of each receiving a copy.
+                    worker_inputs = {
+                        source: replace(
+                            pi, store=pi.store if pi.store.streaming else SharedShapes(pi.store), fitDiag=None
+                        )
+                        for source, pi in plot_inputs.items()
+                    }
+                    shared = [pi.store for pi in worker_inputs.values() if isinstance(pi.store, SharedShapes)]
+                    logging.debug(
+                        f"Shared {sum(s.nbytes for s in shared) / 1024**2:.1f} MB of shapes with the workers."
                     )
-                    progress.update(prog_plotting, advance=1, refresh=True)
-            if args.multiprocessing > 0:
-                # Drain remaining workers, polling so the time_check watchdog can still fire.
-                while _procs:
-                    for done in [p for p in _procs if not p.is_alive()]:
-                        done.join()
-                        _finished.append(done)
-                        _procs.remove(done)
-                        completed += 1
-                    progress.update(
-                        prog_plotting,
-                        completed=completed,
-                        refresh=True,
-                        description=prog_str_fmt.format(len(_procs)),
+
+                def plot_pass(batches: list[list[PlotTask]], n_workers: int, prog: int) -> list[TaskResult]:
+                    """Plot ``batches`` with a fresh pool of ``n_workers``, overrunning tasks stopped by a ``Watchdog``."""
+                    results: list[TaskResult] = []
+                    n_tasks = sum(len(batch) for batch in batches)
+                    events = context.SimpleQueue()
+                    # Workers read the channels of streaming stores themselves, within their share of the budget
+                    with context.Pool(
+                        n_workers,
+                        initializer=init_worker,
+                        initargs=(worker_inputs, style, rmap, args, format, events, n_workers),
+                    ) as pool:
+                        watchdog = Watchdog(events, task_timeout)
+                        pending = iter(enumerate(batches))
+                        in_flight = 0
+                        while len(results) < n_tasks:
+                            # Keep every worker busy with one batch and have one more waiting
+                            while in_flight < 2 * n_workers and (item := next(pending, None)) is not None:
+                                batch_id, batch = item
+                                watchdog.submit(batch_id, batch)
+                                pool.apply_async(
+                                    run_batch, (batch_id, batch), error_callback=partial(watchdog.error, batch_id)
+                                )
+                                in_flight += 1
+                            for batch_results in watchdog.poll(timeout=0.1):
+                                in_flight -= 1
+                                for result in batch_results:
+                                    results.append(result)
+                                    logging.debug(
+                                        f"Plotted '{task_name(result.task)}' in {result.seconds:.2f}s "
+                                        f"(worker {result.worker})."
+                                    )
+                                progress.update(prog, advance=len(batch_results), refresh=True)
+                    return results
+
+            else:
+
+                def plot_pass(batches: list[list[PlotTask]], n_workers: int, prog: int) -> list[TaskResult]:
+                    """Plot ``batches`` in this process, one task at a time, overrunning tasks stopped by a ``deadline``."""
+                    # Channels are pinned while their tasks run (and, when streaming, dropped once no pending task
+                    # needs them); the next task's channels are read in the background while the current one is rendered.
+                    results: list[TaskResult] = []
+                    scheduler = ChannelScheduler(plot_inputs, [task for batch in batches for task in batch])
+                    with Prefetcher(scheduler, batches) as prefetcher:
+                        for (task,) in prefetcher:
+                            plot = partial(plot_task, plot_inputs[task.source], task, style, rmap, args, format)
+                            results.append(attempt(task, plot, task_timeout(task)))
+                            prefetcher.release([task])
+                            progress.update(prog, advance=1, refresh=True)
+                    return results
+
+            with ExitStack() as stack:
+                for block in shared:
+                    stack.callback(block.unlink)
+                final = {
+                    task_key(result.task): result for result in plot_pass(batches, args.multiprocessing, prog_plotting)
+                }
+                # Hung or crashed plots get another go in fresh workers, then every plot still failing (errors
+                # included) a last one in a single fresh worker, away from the memory pressure of the others.
+                # Serially, both are retried in this process.
+                passes = [args.multiprocessing] * max(args.retries - 1, 0) + [min(args.multiprocessing, 1)] * min(
+                    args.retries, 1
+                )
+                attempts: dict[tuple, list[TaskResult]] = defaultdict(list)
+                for k, n_workers in enumerate(passes):
+                    last = k == len(passes) - 1
+                    retry = [result for result in final.values() if not result.ok and (result.lost or last)]
+                    if not retry:
+                        continue
+                    for result in retry:
+                        attempts[task_key(result.task)].append(result)
+                    where = f"in {n_workers} fresh worker(s)" if n_workers > 0 else "serially"
+                    logging.warning(
+                        f"Retrying {len(retry)} plot(s) {where}: {[task_name(result.task) for result in retry]}"
                     )
-                    if _procs:
-                        time_check(progress, _procs, 6)
-                        time.sleep(0.1)
-                # Surface worker failures instead of silently counting a crashed worker as done.
-                failed = [p.name for p in _finished if p.exitcode]
-                if failed:
-                    logging.error(f"{len(failed)} plotting worker(s) failed (see tracebacks above): {failed}")
+                    prog_str = f"[yellow]Retrying ({n_workers} workers): " if n_workers > 0 else "[yellow]Retrying: "
+                    prog = progress.add_task(prog_str, total=len(retry))
+                    for result in plot_pass([[result.task] for result in retry], n_workers, prog):
+                        final[task_key(result.task)] = result
+            results = list(final.values())
+            retried = [(task_name(final[key].task), failures, final[key]) for key, failures in attempts.items()]
+            # Surface plot failures instead of silently counting a failed plot as done.
+            failed = [task_name(result.task) for result in results if not result.ok]
+            if failed:
+                logging.error(f"{len(failed)} plot(s) failed (see tracebacks above): {failed}")
+            slowest = sorted(results, key=lambda result: result.seconds, reverse=True)[:5]
+            logging.debug(f"Slowest plots: {[(task_name(r.task), round(r.seconds, 2)) for r in slowest]}")
             progress.update(
                 prog_plotting,
                 completed=len(all_tasks),
@@ -831,13 +1669,48 @@ def main():
                 refresh=True,
                 description=prog_str_fmt.format(0),
             )
+        if retried:
+            print_retries(retried)
+        if timing_log is not None:
+            done = [result for result in results if result.ok]
+            timing_log.record(
+                np.array([features[task_key(result.task)] for result in done]).reshape(-1, len(FEATURES)),
+                np.array([result.seconds for result in done]),
+            )
+            logging.debug(f"Recorded {len(done)} plot timings in '{timing_log.path}'.")
+        if args.summary:
+            # Collected in the parent, from the partial sums and chi2 terms computed above, or for streaming stores
+            # from the rows returned by the plots (see ``plot_task``) as their channels aren't resident anymore
+            summaries: dict[Path, GofSummary] = {}
+            for source, plot_input in plot_inputs.items():
+                tasks = [task for task in all_tasks if task.source == source]
+                if plot_input.store.streaming:
+                    task_results = [final[task_key(task)] for task in tasks]
+                    summary = GofSummary([result.summary for result in task_results if result.summary is not None])
+                    missing = [task_name(r.task) for r in task_results if not r.ok and not r.task.blind]
+                    if missing:
+                        logging.warning(f"Failed plots are left out of the goodness-of-fit summary: {missing}")
+                else:
+                    summary = GofSummary.from_tasks(
+                        plot_input.store,
+                        tasks,
+                        chi2_nocorr=args.chi2_nocorr,
+                        chi2_overall=args.chi2_overall,
+                        chi2_toys=args.chi2_toys,
+                    )
+                out_dir = plot_input.out_dir
+                summaries[out_dir] = summaries[out_dir] + summary if out_dir in summaries else summary
+            for out_dir, summary in summaries.items():
+                summary.write(out_dir, formats=format, dpi=args.dpi)
         if failed:
             sys.exit(1)
 
     finally:
-        fd.close()
-        if rfd:
-            rfd.Close()
+        for plot_input in plot_inputs.values():
+            if plot_input.fitDiag is not None:
+                plot_input.fitDiag.close()
+        if read_executor is not None:
+            read_executor.shutdown()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,128 @@
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from .shapes import PartialSum, ShapeStore
+
+
+@dataclass
+class PlanNode:
+    """A set of channels summed either directly (leaf) or from the partial sums of its ``parts``."""
+
+    channels: list[str]
+    parts: list[frozenset[str]] = field(default_factory=list)
+
+    @property
+    def is_leaf(self) -> bool:
+        return not self.parts
+
+
+@dataclass
+class MergePlan:
+    """DAG of the channel sums needed by a set of (merged) categories.
+
+    Overlapping ``--cats`` groups (e.g. ``pass16:ptbin*pass2016;pass:ptbin*pass*``) are split into
+    atoms, the channel sets shared by exactly the same groups. Atoms are summed from the store
+    once, every group is then assembled from the largest already-planned subsets it contains
+    (``pass`` from ``pass16`` and the remaining atoms), so each channel x sample array is added
+    only once per fit type. The ``contains:`` merges of the style are summed along at the atom level.
+
+    Layout: ``nodes[fit_type][frozenset(channels)] -> PlanNode``, in evaluation order.
+    """
+
+    nodes: dict[str, dict[frozenset[str], PlanNode]]
+    groups: dict[str, list[frozenset[str]]]
+    merge: dict[str, list[str]] = field(default_factory=dict)
+    restoreNorm: bool = True
+
+    @classmethod
+    def build(
+        cls,
+        groups: Iterable[tuple[str, list[str]]],
+        merge: dict[str, list[str]] | None = None,
+        restoreNorm: bool = True,
+    ) -> "MergePlan":
+        """Plan the ``(fit_type, channels)`` groups (e.g. from ``PlotTask.fittype/channels``).
+
+        Single-channel groups have nothing to sum and are only planned as parts of larger ones.
+        """
+        by_fit_type: dict[str, dict[frozenset[str], list[str]]] = defaultdict(dict)
+        for fit_type, channels in groups:
+            if len(set(channels)) > 1:
+                by_fit_type[fit_type].setdefault(frozenset(channels), list(dict.fromkeys(channels)))
+        nodes, plan_groups = {}, {}
+        for fit_type, _groups in by_fit_type.items():
+            nodes[fit_type] = cls._plan(list(_groups.values()))
+            plan_groups[fit_type] = list(_groups)
+        return cls(nodes, plan_groups, merge or {}, restoreNorm)
+
+    @classmethod
+    def from_tasks(cls, tasks: Iterable, merge: dict[str, list[str]] | None = None, restoreNorm: bool = True):
+        """Plan the categories of ``PlotTask``s."""
+        return cls.build(((task.fittype, task.channels) for task in tasks), merge=merge, restoreNorm=restoreNorm)
+
+    @staticmethod
+    def _plan(groups: list[list[str]]) -> dict[frozenset[str], PlanNode]:
+        # Atoms: channels grouped by which groups they belong to
+        atoms: dict[tuple[int, ...], list[str]] = {}
+        for channel in dict.fromkeys(ch for group in groups for ch in group):
+            signature = tuple(i for i, group in enumerate(groups) if channel in group)
+            atoms.setdefault(signature, []).append(channel)
+        nodes = {frozenset(atom): PlanNode(atom) for atom in atoms.values()}
+        # Smallest groups first, so larger ones can be built from them
+        for group in sorted(groups, key=len):
+            key = frozenset(group)
+            if key in nodes:
+                continue
+            # Every planned node is a union of atoms, hence either within the group or not overlapping
+            # the remainder, so covering greedily by size always completes.
+            parts, covered = [], set()
+            for candidate in sorted((k for k in nodes if k < key), key=len, reverse=True):
+                if covered.isdisjoint(candidate):
+                    parts.append(candidate)
+                    covered |= candidate
+                    if covered == key:
+                        break
+            # Add up in the group's channel order
+            position = {channel: i for i, channel in enumerate(group)}
+            parts.sort(key=lambda part: min(position[ch] for ch in part))
+            nodes[key] = PlanNode(group, parts)
+        return nodes
+
+    @property
+    def n_leaf_channels(self) -> int:
+        """Number of channels summed directly from the store (per fit type, each one at most once)."""
+        return sum(len(node.channels) for nodes in self.nodes.values() for node in nodes.values() if node.is_leaf)
+
+    def evaluate(self, store: ShapeStore) -> dict[tuple[str, frozenset[str], bool], PartialSum | None]:
+        """Compute the group sums and register them in ``store.sums`` (where ``plot`` picks them up).
+
+        Groups whose channels don't share a binning are left out (``plot`` then sums them itself).
+        """
+        results = {}
+        for fit_type, nodes in self.nodes.items():
+            union = list(dict.fromkeys(ch for node in nodes.values() if node.is_leaf for ch in node.channels))
+            samples = [k for k in store.samples(fit_type, union) if "data" not in k and "covar" not in k]
+            names = list(dict.fromkeys(["data", "total_background", "total"] + samples))
+            sums: dict[frozenset[str], PartialSum | None] = {}
+            for key, node in nodes.items():
+                if node.is_leaf:
+                    tensor = store.tensor(fit_type, node.channels, names, restoreNorm=self.restoreNorm)
+                    sums[key] = tensor.partial_sum(self.merge) if tensor is not None else None
+                elif any(sums[part] is None for part in node.parts):
+                    sums[key] = None
+                else:
+                    try:
+                        total = sums[node.parts[0]]
+                        for part in node.parts[1:]:
+                            total = total + sums[part]
+                        sums[key] = total
+                    except ValueError:
+                        logging.debug(f"  Channels {node.channels} don't share a binning, not precomputing their sum.")
+                        sums[key] = None
+            for key in self.groups[fit_type]:
+                results[fit_type, key, self.restoreNorm] = sums[key]
+                if sums[key] is not None:
+                    store.sums[fit_type, key, self.restoreNorm] = sums[key]
+        return results
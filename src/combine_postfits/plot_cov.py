@@ -5,8 +5,11 @@ import matplotlib
 import matplotlib.pyplot as plt
 import mplhep as hep
 import numpy as np
+import uproot
 from typeguard import typechecked
 
+from .fitresult import FitResultTable
+
 np.seterr(divide="ignore", invalid="ignore")
 
 import fnmatch
@@ -23,18 +26,27 @@ def plot_cov(
     cmap="RdBu",
 ) -> plt.Axes | None:
     logging.info(f"Plotting covariance matrix from {fitDiagnostics_file} ({fit_type})")
-    import ROOT as r
-
-    rf = r.TFile.Open(fitDiagnostics_file)
-    h2 = rf.Get(fit_type).correlationHist()
-
-    x_bins = h2.GetXaxis().GetNbins()
-    y_bins = h2.GetYaxis().GetNbins()
-    y_labels = [h2.GetYaxis().GetBinLabel(i) for i in range(1, y_bins + 1)]
-    x_labels = [h2.GetXaxis().GetBinLabel(i) for i in range(1, x_bins + 1)]
+    try:
+        with uproot.open(fitDiagnostics_file) as fd:
+            fit_results = FitResultTable.from_uproot(fd, fit_types=[fit_type])
+        names, corr = fit_results.correlation_matrix(fit_type)
+        # Same layout as RooFitResult::correlationHist (y-axis in reverse order)
+        x_labels, y_labels = names, names[::-1]
+        content = corr[:, ::-1]
+    except (uproot.DeserializationError, KeyError) as e:
+        logging.info(f"  Could not read the correlation matrix with uproot ({e}), falling back to ROOT.")
+        import ROOT as r
+
+        rf = r.TFile.Open(fitDiagnostics_file)
+        h2 = rf.Get(fit_type).correlationHist()
+
+        x_bins = h2.GetXaxis().GetNbins()
+        y_bins = h2.GetYaxis().GetNbins()
+        y_labels = [h2.GetYaxis().GetBinLabel(i) for i in range(1, y_bins + 1)]
+        x_labels = [h2.GetXaxis().GetBinLabel(i) for i in range(1, x_bins + 1)]
+        content = np.array([[h2.GetBinContent(i + 1, j + 1) for j in range(y_bins)] for i in range(x_bins)])
     hist_2d = hist.new.StrCat(x_labels, label="").StrCat(y_labels, label="").Double()
     view = hist_2d.view()
-    content = np.array([[h2.GetBinContent(i + 1, j + 1) for j in range(y_bins)] for i in range(x_bins)])
     view[:, :] = content
 
     keys = list(x_labels)
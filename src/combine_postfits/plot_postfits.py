@@ -6,8 +6,8 @@ import matplotlib
 
 matplotlib.use("Agg")
 import logging
-from copy import deepcopy
 from dataclasses import dataclass
+from pathlib import Path
 from typing import Any
 
 import hist
@@ -16,10 +16,12 @@ import mplhep as hep
 import numpy as np
 import uproot
 from matplotlib.offsetbox import AnchoredText
-from mplhep.error_estimation import poisson_interval
 from scipy import stats
 from typeguard import typechecked
 
+from .chi2 import OVERALL_COVAR, OverallCovariance, channel_chi2, group_chi2, toy_pvalue
+from .fitresult import FitResultTable
+from .shapes import Shape1D, ShapeStore
 from .utils import (  # Hist masking
     _ensure_slice_by_ix,
     _string_to_slice,
@@ -30,11 +32,9 @@ from .utils import (  # Hist masking
     format_legend,
     get_fit_unc,
     get_fit_val,
-    geth,
-    getha,
-    geths,
     log_pretty,
     merge_hists,
+    poisson_interval,
 )
 
 
@@ -56,24 +56,64 @@ class PlotConfig:
     cat_info: bool | int | str = 2
     chi2: bool = False
     chi2_nocorr: bool = False
+    chi2_overall: bool = False  # correlations between channels from `overall_total_covar`
+    chi2_toys: int = 0  # number of toys for a goodness-of-fit p-value next to the chi2
     residuals: bool = False
 
 
+def required_samples(config: PlotConfig, merge: dict[str, list[str]] | None = None) -> set[str] | None:
+    """Names of the objects ``plot`` reads for ``config``, or None if it needs all of them.
+
+    Without explicit ``bkgs`` every sample of the category is a default background, otherwise only
+    the listed samples (and the components of their ``contains:`` merges) are needed besides the
+    totals. Data is kept even for blinded plots, as the uncertainty band is normalized to it.
+    """
+    if not config.bkgs:
+        return None
+    names = {"data", "total", "total_background", "total_signal"}
+    names.update(config.sigs or [], config.bkgs, config.project or [], [config.onto] if config.onto else [])
+    merge = merge or {}
+    todo = [name for name in names if name in merge]
+    while todo:
+        for name in merge[todo.pop()]:
+            if name not in names:
+                names.add(name)
+                if name in merge:
+                    todo.append(name)
+    if (config.chi2 or config.chi2_nocorr) and not config.blind:
+        names.add("total_covar")
+    return names
+
+
 class HistManager:
-    def __init__(self, hist_dict):
-        self.hist_dict = hist_dict
+    """Serves the shapes of a plot as read-only views.
+
+    The tail-masked variants (bins below ``th`` of the max set to NaN, for drawing) are
+    computed once per ``(name, global_scale, th)`` and cached; new arrays are only allocated
+    when masking actually changes the values. Callers derive new shapes via arithmetic or
+    ``copy()`` instead of modifying the returned ones.
+    """
+
+    def __init__(self, hist_dict: dict[str, Shape1D]):
+        self.hist_dict = {name: h.read_only() for name, h in hist_dict.items()}
         self._max_value_global = np.max([np.max(h.values()) for h in hist_dict.values()]) if hist_dict else 0
+        self._cache: dict[tuple, Shape1D] = {}
 
     def get(self, name, raw=False, global_scale=True, th=0.003):
         if name not in self.hist_dict:
-            logging.warning(f"  Hist '{name}' is missing. Will be replaced with zeros.")
-            _hobj = deepcopy(self.hist_dict[list(self.hist_dict.keys())[0]])
-            _hobj.view().value *= 0
-            _hobj.view().variance *= 0
-            return _hobj
-        if raw:  # Read-only callers; skip the expensive deepcopy.
+            if (name, None, None) not in self._cache:
+                logging.warning(f"  Hist '{name}' is missing. Will be replaced with zeros.")
+                self._cache[name, None, None] = (self.hist_dict[list(self.hist_dict.keys())[0]] * 0).read_only()
+            return self._cache[name, None, None]
+        if raw:
             return self.hist_dict[name]
-        _hobj = deepcopy(self.hist_dict[name])
+        key = (name, global_scale, th)
+        if key not in self._cache:
+            self._cache[key] = self._masked(name, global_scale, th)
+        return self._cache[key]
+
+    def _masked(self, name, global_scale, th):
+        _hobj = self.hist_dict[name]
         if np.any(_hobj.values() < 0):
             # Signal templates may dip negative; select significant bins by magnitude, not sign.
             _values = np.abs(_hobj.values())
@@ -85,20 +125,25 @@ class HistManager:
             logging.debug(
                 f"  Hist '{name}' has values < '{_th:.3f}'. Setting to NaNs: {[f'{v:.2f}' for v in _hobj.values()]}."
             )
-            _hobj.view().value[: non_zero_indices[0]] = np.nan
-            _hobj.view().value[non_zero_indices[-1] + 1 :] = np.nan
+            values = _hobj.values().copy()
+            values[: non_zero_indices[0]] = np.nan
+            values[non_zero_indices[-1] + 1 :] = np.nan
+            _hobj = Shape1D(values, _hobj.variances(), _hobj.edges, _hobj.label).read_only()
             logging.debug(
                 f"  Hist '{name}' had values < '{_th:.3f}'. Now set to NaNs: {[f'{v:.2f}' for v in _hobj.values()]}."
             )
         return _hobj
 
 
-def _format_chi2_label(chi2_val, nbins, chi2_cov_valid, chi2_nocorr):
+def _format_chi2_label(chi2_val, nbins, chi2_cov_valid, chi2_nocorr, p_value=None):
     if chi2_cov_valid and not chi2_nocorr:
         _chi2_str = r"$\frac{\chi^2}{N_{bins}}$ = "
     else:
         _chi2_str = r"$\frac{\chi^2_{no~corr}}{N_{bins}}$ = "
-    return _chi2_str + r"$\frac{" + f"{chi2_val:.2f}" + r"}{" + f"{nbins:.0f}" + r"}$"
+    label = _chi2_str + r"$\frac{" + f"{chi2_val:.2f}" + r"}{" + f"{nbins:.0f}" + r"}$"
+    if p_value is not None:
+        label += r", $p_{toys}$ = " + f"{p_value:.2f}"
+    return label
 
 
 def get_stack_styles(items, style_dict, onto=None):
@@ -113,6 +158,36 @@ def get_stack_styles(items, style_dict, onto=None):
     return _facecolor, _edgecolor, _hatch, _linewidth
 
 
+def compute_pulls(
+    data: Shape1D,
+    tot: Shape1D,
+    blind_slice: slice | None = None,
+    interval: tuple[np.ndarray, np.ndarray] | None = None,
+) -> np.ndarray:
+    """Per-bin ``(data - tot) / sigma_data``, with the Poisson uncertainty of data towards ``tot``.
+
+    ``interval`` can pass the (lower, upper) data uncertainties if already computed; blinded bins are NaN.
+    """
+    if interval is None:
+        interval = np.abs(poisson_interval(data.values(), data.variances()) - data.values())
+    _lo, _hi = interval
+    resid_unc = np.zeros_like(data.values())
+    resid = data.values() - tot.values()
+    logging.debug(f"  Residuals raw: {[f'{v:.2f}' for v in resid]}.")
+    resid_unc[resid < 0] = _hi[resid < 0]
+    resid_unc[resid > 0] = _lo[resid > 0]
+    if blind_slice is not None:  # Honor partial blinding in the residual distribution.
+        resid[blind_slice] = np.nan
+    with np.errstate(divide="ignore", invalid="ignore"):
+        resid /= resid_unc
+    return resid
+
+
+def valid_pulls(resid: np.ndarray) -> np.ndarray:
+    """Drop empty/blinded (NaN) and effectively-zero bins before computing stats."""
+    return resid[np.isfinite(resid) & ~np.isclose(resid, 0, atol=1e-2)]
+
+
 def compute_residual_stats(resid):
     _stat_sw, p_value_sw = stats.shapiro(resid)
     _stat_ks, p_value_ks = stats.kstest(resid, "norm", args=(0, np.std(resid)))
@@ -131,8 +206,7 @@ def add_residual_stats_box(resid_ax, p_value_sw, p_value_ks):
 
 def set_xlimits(ax, rax, data, tot_bkg, clipx):
     if clipx:
-        _h, _bins = data.copy().to_numpy()
-        _h += tot_bkg.to_numpy()[0]
+        _h, _bins = data.values() + tot_bkg.values(), data.edges
         nonzero_left = _bins[:-1][_h > 0]
         nonzero_right = _bins[1:][_h > 0]
         if len(_bins) > 2 and nonzero_left.size > 0:
@@ -142,7 +216,7 @@ def set_xlimits(ax, rax, data, tot_bkg, clipx):
             ax.set_xlim(_bins[0], _bins[-1])
             rax.set_xlim(_bins[0], _bins[-1])
     else:
-        ax.set_xlim(data.axes[0].edges[0], data.axes[0].edges[-1])
+        ax.set_xlim(data.edges[0], data.edges[-1])
 
 
 def _draw_signal_strengths(ax, leg, sigs_original, rmap, hist_keys, fitDiag_root, fit_type, style, blind):
@@ -189,36 +263,26 @@ def _draw_signal_strengths(ax, leg, sigs_original, rmap, hist_keys, fitDiag_root
         ax.set_ylim(None, ax.get_ylim()[-1] * 1.05)
 
 
-def _calc_chi2(channels, restoreNorm, chi2_nocorr, blind_slice=None):
-    # wrap to avoid global variables
+def _calc_chi2(store, fit_type, channels, restoreNorm, chi2_nocorr, blind_slice=None, overall=False):
+    # Terms are cached in the store, so channels (or groups) shared between plots are solved once
+    if overall and fit_type in store.overall_covar:
+        terms = [group_chi2(store, fit_type, channels, restoreNorm=restoreNorm, blind_slice=blind_slice)]
+    else:
+        if overall:
+            logging.warning(f"  '{OVERALL_COVAR}' is not available for '{fit_type}', summing per-channel chi2.")
+        terms = channel_chi2(store, fit_type, channels, restoreNorm=restoreNorm, blind_slice=blind_slice)
     _chi2_tot, _chi2_naive_tot, _nbins = 0, 0, 0
-    _chi2_cov_valid = True
-    for channel in channels:
-        data = getha("data", [channel], restoreNorm=restoreNorm)
-        tot = getha("total", [channel], restoreNorm=restoreNorm)
-        cov = geth("total_covar", channel, restoreNorm=False).values()
-        mask = ~np.isclose(data.values(), 0, atol=1e-4)
-        if blind_slice is not None:  # Exclude partially-blinded bins from the goodness-of-fit.
-            mask[blind_slice] = False
-        cov = cov[mask, :]
-        cov = cov[:, mask]
-        variances = data.variances()[mask]
-        diff = data.values()[mask] - tot.values()[mask]
-        with np.errstate(divide="ignore", invalid="ignore"):
-            chi2_naive = np.sum(np.nan_to_num(diff**2 / variances, posinf=0, neginf=0))
-        _chi2_naive_tot += chi2_naive
-        if not chi2_nocorr:
-            try:
-                chi2 = diff @ np.linalg.inv(cov + np.diag(variances)) @ diff
-                _chi2_tot += chi2
-            except np.linalg.LinAlgError:
-                _chi2_cov_valid = False
-                logging.warning("  Covariance matrix is singular. Will report naive chi2.")
-        _nbins += len(diff)
+    for term in terms:
+        _chi2_tot += term.chi2
+        _chi2_naive_tot += term.chi2_naive
+        _nbins += term.nbins
+    _chi2_cov_valid = bool(np.isfinite(_chi2_tot))
+    if not chi2_nocorr and not _chi2_cov_valid:
+        logging.warning("  Covariance matrix is singular. Will report naive chi2.")
     logging.debug(f"  Chi2: {_chi2_tot:.2f}")
     logging.debug(f"  Chi2 (naive): {_chi2_naive_tot:.2f}")
     logging.debug(f"  Nbins: {_nbins:.0f}")
-    if chi2_nocorr:
+    if chi2_nocorr or not _chi2_cov_valid:
         return _chi2_naive_tot, _nbins, False
     else:
         return _chi2_tot, _nbins, _chi2_cov_valid
@@ -226,7 +290,7 @@ def _calc_chi2(channels, restoreNorm, chi2_nocorr, blind_slice=None):
 
 @typechecked
 def plot(
-    fitDiag_uproot: uproot.ReadOnlyDirectory,
+    fitDiag_uproot: uproot.ReadOnlyDirectory | ShapeStore,
     config: PlotConfig | None = None,
     style: dict | None = None,
     merge: dict[str, list] | None = None,
@@ -235,6 +299,11 @@ def plot(
 ) -> tuple[plt.Figure | None, tuple[plt.Axes | None, plt.Axes | None]]:
     """
     Create a PostFit/PreFit plot from a Combine fitDiagnostics file.
+
+    ``fitDiag_uproot`` can be an open uproot file or a preloaded ``ShapeStore`` (preferred when
+    plotting many categories from the same file, as the shapes are then decoded only once).
+    Likewise ``fitDiag_root`` can be a ROOT ``TFile``, a path (read without ROOT when possible) or a
+    pre-extracted ``FitResultTable``.
     """
     if config is None:
         config = PlotConfig(**kwargs)
@@ -255,13 +324,25 @@ def plot(
     cat_info = config.cat_info
     chi2 = config.chi2
     chi2_nocorr = config.chi2_nocorr
+    chi2_overall = config.chi2_overall
+    chi2_toys = config.chi2_toys
     residuals = config.residuals
 
     # ── Preparation ─────────────────────────────────────────────
     style = style.copy()
     fit_shapes_name = f"shapes_{fit_type}"
+    if fitDiag_root is not None and fit_type != "prefit" and not isinstance(fitDiag_root, FitResultTable):
+        # Walk the RooFitResult once here rather than on every parameter lookup below
+        if isinstance(fitDiag_root, (str, Path)):
+            with uproot.open(fitDiag_root) as fd:
+                fitDiag_root = FitResultTable.from_file(fd, fit_types=[fit_type])
+        else:
+            fitDiag_root = FitResultTable.from_root(fitDiag_root, fit_types=[fit_type])
     if cats is None:
-        cats = [fitDiag_uproot[f"{fit_shapes_name}"].keys()[0].split(";")[0]]
+        if isinstance(fitDiag_uproot, ShapeStore):
+            cats = fitDiag_uproot.channels(fit_type)[:1]
+        else:
+            cats = [fitDiag_uproot[f"{fit_shapes_name}"].keys()[0].split(";")[0]]
     elif isinstance(cats, str):
         cats = [cats]
     logging.info(f"Plotting `{fit_shapes_name}` for categories: {','.join(cats)}.")
@@ -277,25 +358,41 @@ def plot(
     if project is None:
         project = []
     # ── Fetch histograms ────────────────────────────────────────
-    channels = [fitDiag_uproot[f"{fit_shapes_name}/{cat}"] for cat in cats]
+    channels = list(cats)
     if len(channels) == 0:
         return None, (None, None)
-    orig_hist_keys = [
-        k.split(";")[0]
-        for k in list(set(sum([c.keys() for c in channels], [])))
-        if "data" not in k and "covar" not in k
-    ]
-    data = getha("data", channels, restoreNorm=restoreNorm)
-    hist_dict = geths(
-        orig_hist_keys,
-        channels,
-        restoreNorm=restoreNorm,
-        style_dict=None,
-    )
-    tot_bkg = getha("total_background", channels, restoreNorm=restoreNorm)
-    tot = getha("total", channels, restoreNorm=restoreNorm)
+    if isinstance(fitDiag_uproot, ShapeStore):
+        store = fitDiag_uproot
+    else:  # Decode just the requested channels and samples once; everything below is served from memory
+        store = ShapeStore.from_file(
+            fitDiag_uproot, fit_types=[fit_type], channels=channels, names=required_samples(config, merge)
+        )
+        if chi2_overall and (overall := OverallCovariance.from_file(fitDiag_uproot, fit_type, store)) is not None:
+            store.overall_covar[fit_type] = overall
+    orig_hist_keys = [k for k in store.samples(fit_type, channels) if "data" not in k and "covar" not in k]
+    # Shapes stay Shape1D (plain arrays) until they are handed to mplhep. Channels sharing a
+    # binning are summed in one go from a samples x channels x bins tensor, unless the sums were
+    # already precomputed for all categories (see ``merge_plan.MergePlan``).
+    _names = list(dict.fromkeys(["data", "total_background", "total"] + orig_hist_keys))
+    partial = store.sums.get((fit_type, frozenset(channels), restoreNorm))
+    merged = None
+    if partial is not None:
+        shapes, _yields = partial.shapes(), partial.yields
+        if partial.merge == merge:
+            merged = partial.merged_shapes()
+        logging.debug("  Yields:\n" + log_pretty({k: float(v) for k, v in _yields.items()}))
+    elif (tensor := store.tensor(fit_type, channels, _names, restoreNorm=restoreNorm)) is not None:
+        shapes, _yields = tensor.sums(), dict(zip(tensor.samples, tensor.yields.sum(axis=0)))
+        logging.debug(
+            "  Yields:\n"
+            + log_pretty({ch: dict(zip(tensor.samples, map(float, row))) for ch, row in zip(channels, tensor.yields)})
+        )
+    else:
+        shapes, _yields = store.get_many_shapes(fit_type, channels, _names, restoreNorm=restoreNorm), {}
+    data, tot_bkg, tot = shapes["data"], shapes["total_background"], shapes["total"]
+    hist_dict = {k: shapes[k] for k in orig_hist_keys}
     # Prepare merges
-    hist_dict = merge_hists(hist_dict, merge)
+    hist_dict = merge_hists(hist_dict, merge, merged=merged)
     hist_keys = list(hist_dict.keys())
     _merged_away = {name for names in merge.values() for name in names}
     # Check if all available
@@ -317,23 +414,19 @@ def plot(
             _th = remove_tiny
         else:
             raise ValueError(f"Kwarg `remove_tiny={remove_tiny}` not understood.")
+        # Unmerged samples come straight from the summed yields
         for key in list(hist_keys):
             if key in bkgs + sigs + project:
                 continue
-            if np.sum(get_hist(key).values()) < _th:
+            _yield = _yields[key] if key in _yields and key not in merge else np.sum(get_hist(key, raw=True).values())
+            if _yield < _th:
                 logging.info(f"  Skipping hist {key}: because its yield is below threshold.")
                 hist_keys.remove(key)
 
     # ── Resolve signals & backgrounds ───────────────────────────
-    all_channel_keys = set().union(*(c.keys() for c in channels))
-    if "total_signal" not in all_channel_keys:  # no signal in CRs
-        default_signal = []
-    else:
-        default_signal = [
-            k
-            for k in orig_hist_keys
-            if k in channels[0] and channels[0][k] == channels[0]["total_signal"] and "total" not in k
-        ]
+    # NB: this used to compare against cycle-suffixed uproot keys ("total_signal;1"), so matching a
+    # signal to 'total_signal' never triggered. Kept disabled so the default plots don't change.
+    default_signal = []
     default_bkgs = [
         k for k in hist_keys if k not in default_signal and k != onto and "total" not in k and k not in _merged_away
     ]
@@ -401,7 +494,7 @@ def plot(
     plt.subplots_adjust(hspace=0)
     if onto is None:
         hep.histplot(
-            [get_hist(k) for k in bkgs + sigs],
+            [get_hist(k).to_hist() for k in bkgs + sigs],
             ax=ax,
             label=bkgs + sigs,
             stack=True,
@@ -411,7 +504,7 @@ def plot(
     else:
         if onto in hist_dict.keys():
             hep.histplot(
-                get_hist(onto),
+                get_hist(onto).to_hist(),
                 ax=ax,
                 label=onto,
                 yerr=False,  # facecolor='none',
@@ -424,8 +517,8 @@ def plot(
         _facecolor, _edgecolor, _hatch, _linewidth = get_stack_styles(bkgs + sigs, style, onto=onto)
         hep.histplot(
             [
-                get_hist(onto),
-                *[get_hist(k, global_scale=False, th=0.02) for k in bkgs + sigs],
+                get_hist(onto).to_hist(),
+                *[get_hist(k, global_scale=False, th=0.02).to_hist() for k in bkgs + sigs],
             ],
             ax=ax,
             label=["_", *(bkgs + sigs)],
@@ -438,20 +531,22 @@ def plot(
         )
     if not blind:
         if blind_data is not None:
-            _data = deepcopy(data)
-            _sl = _ensure_slice_by_ix(_string_to_slice(blind_data), _data.axes[0].edges)
-            _data.view().value[_sl] = np.nan
-            _data.view().variance[_sl] = np.nan
+            _data = data.copy()
+            _sl = _ensure_slice_by_ix(_string_to_slice(blind_data), _data.edges)
+            _data.values()[_sl] = np.nan
+            _data.variances()[_sl] = np.nan
         else:
             _data = data
         hep.histplot(
-            _data,
+            _data.to_hist(),
             ax=ax,
             label="data",
             xerr=True,
             histtype="errorbar",
             color="k",
             zorder=4,
+            # Same choice as mplhep's default, with the tabulated interval for unweighted data
+            w2method=poisson_interval if np.allclose(_data.variances(), np.around(_data.variances())) else "sqrt",
         )
 
     logging.debug("  DEBUG: Projections")
@@ -459,7 +554,7 @@ def plot(
     if len(project) != 0:
         logging.info(f"  Projecting on x-axis: {','.join(project)}")
         hep.histplot(
-            [get_hist(k) for k in project],
+            [get_hist(k).to_hist() for k in project],
             ax=ax,
             facecolor=[style[k]["color"] for k in project],
             stack=True,
@@ -504,7 +599,7 @@ def plot(
             _scaled_sig = get_hist(sig, global_scale=False, th=0.05) * sig_dicts[sig] / _rs[sig]
             _p_label = style[sig]["label"] if sig_dicts[sig] == 1 else f"{style[sig]['label']} x {sig_dicts[sig]:.0f}"
             hep.histplot(
-                _scaled_sig,
+                _scaled_sig.to_hist(),
                 ax=ax,
                 color=style[sig]["color"],
                 stack=True,
@@ -520,19 +615,20 @@ def plot(
     rh_unc = np.zeros_like(data.values())
     rh = None  # set below when data is visible
     if not blind:
+        # Asymmetric data uncertainties, shared with the residual panel
+        data_lo, data_hi = np.abs(poisson_interval(data.values(), data.variances()) - data.values())
         with np.errstate(divide="ignore", invalid="ignore"):
             rh = data.values() - tot_bkg.values()
-            _lo, _hi = np.abs(poisson_interval(data.values(), data.variances()) - data.values())
-            rh_unc[rh < 0] = _hi[rh < 0]
-            rh_unc[rh > 0] = _lo[rh > 0]
+            rh_unc[rh < 0] = data_hi[rh < 0]
+            rh_unc[rh > 0] = data_lo[rh > 0]
             rh /= rh_unc
         if blind_data is not None:
-            _sl = _ensure_slice_by_ix(_string_to_slice(blind_data), data.axes[0].edges)
+            _sl = _ensure_slice_by_ix(_string_to_slice(blind_data), data.edges)
             rh[_sl] = np.nan
         ## Plotting subplot
         hep.histplot(
             rh,
-            data.axes[0].edges,
+            data.edges,
             ax=rax,
             yerr=1,
             histtype="errorbar",
@@ -559,7 +655,7 @@ def plot(
         hep.histplot(
             _sig_ratios,
             ax=rax,
-            bins=_masked_sigs[0].axes[0].edges,
+            bins=_masked_sigs[0].edges,
             facecolor=_facecolor,
             edgecolor=_edgecolor,
             hatch=_hatch,
@@ -574,11 +670,9 @@ def plot(
             "  Background uncertainties not available (are 0) in fitDiagnostics file. "
             "Fit may not have converged correctly."
         )
-    logging.debug(f"  yerr - bkg variances (raw): {np.sqrt(tot_bkg.variances() * tot_bkg.axes[0].widths)}.")
+    logging.debug(f"  yerr - bkg variances (raw): {np.sqrt(tot_bkg.variances() * tot_bkg.widths)}.")
     with np.errstate(divide="ignore", invalid="ignore"):
-        yerr_nom = np.sqrt(tot_bkg.variances() * tot_bkg.axes[0].widths) / np.sqrt(
-            data.variances() * tot_bkg.axes[0].widths
-        )
+        yerr_nom = np.sqrt(tot_bkg.variances() * tot_bkg.widths) / np.sqrt(data.variances() * tot_bkg.widths)
     yerr = yerr_nom.copy()
     logging.debug(f"  yerr (raw): {yerr}.")
     yerr[~np.isfinite(yerr_nom)] = 0
@@ -589,7 +683,7 @@ def plot(
     good_yerr_mask = yerr < err_th  # Data unc is 1 by definiton
     hep.histplot(
         np.zeros_like(data.values()),
-        tot_bkg.axes[0].edges,
+        tot_bkg.edges,
         ax=rax,
         yerr=[yerr, yerr],
         histtype="band",
@@ -610,9 +704,9 @@ def plot(
 
     # Axis labels
     ax.set_xlabel(None)
-    rax.set_xlabel(tot_bkg.axes[0].label)
+    rax.set_xlabel(tot_bkg.label)
     if restoreNorm:
-        _widths = data.axes[0].widths
+        _widths = data.widths
         if np.std(_widths) == 0:
             ax.set_ylabel(f"Events / {np.mean(_widths):.3g} GeV")
         else:
@@ -693,12 +787,29 @@ def plot(
         hep.yscale_anchored_text(ax, soft_fail=True)
 
     if (chi2 or chi2_nocorr) and not blind:
-        _blind_slice = (
-            _ensure_slice_by_ix(_string_to_slice(blind_data), data.axes[0].edges) if blind_data is not None else None
+        _blind_slice = _ensure_slice_by_ix(_string_to_slice(blind_data), data.edges) if blind_data is not None else None
+        chi2_val, _nbins, _chi2_cov_valid = _calc_chi2(
+            store, fit_type, channels, restoreNorm, chi2_nocorr, blind_slice=_blind_slice, overall=chi2_overall
         )
-        chi2_val, _nbins, _chi2_cov_valid = _calc_chi2(channels, restoreNorm, chi2_nocorr, blind_slice=_blind_slice)
 
-        chi2_label = _format_chi2_label(chi2_val, _nbins, _chi2_cov_valid, chi2_nocorr)
+        p_value = None
+        if chi2_toys > 0:
+            p_value = toy_pvalue(
+                store,
+                fit_type,
+                channels,
+                chi2_val,
+                chi2_toys,
+                restoreNorm=restoreNorm,
+                blind_slice=_blind_slice,
+                nocorr=not _chi2_cov_valid,
+                overall=chi2_overall,
+            )
+            if p_value is None:
+                logging.warning("  Covariance matrix is not positive definite, not throwing toys.")
+            else:
+                logging.debug(f"  Chi2 p-value ({chi2_toys} toys): {p_value:.3f}")
+        chi2_label = _format_chi2_label(chi2_val, _nbins, _chi2_cov_valid, chi2_nocorr, p_value=p_value)
 
         # Should be just a bit higher than 'saturated'
         at = AnchoredText(
@@ -713,20 +824,10 @@ def plot(
     ax.set_ylim(0, ax.get_ylim()[-1] * 1.05)
 
     if residuals and not blind:
-        resid_unc = np.zeros_like(data.values())
-        resid = data.values() - tot.values()
-        logging.debug(f"  Residuals raw: {[f'{v:.2f}' for v in resid]}.")
-        _lo, _hi = np.abs(poisson_interval(data.values(), data.variances()) - data.values())
-        resid_unc[resid < 0] = _hi[resid < 0]
-        resid_unc[resid > 0] = _lo[resid > 0]
-        if blind_data is not None:  # Honor partial blinding in the residual distribution.
-            _sl = _ensure_slice_by_ix(_string_to_slice(blind_data), data.axes[0].edges)
-            resid[_sl] = np.nan
-        with np.errstate(divide="ignore", invalid="ignore"):
-            resid /= resid_unc
+        _blind_slice = _ensure_slice_by_ix(_string_to_slice(blind_data), data.edges) if blind_data is not None else None
+        resid = compute_pulls(data, tot, blind_slice=_blind_slice, interval=(data_lo, data_hi))
         logging.debug(f"  Residuals: {[f'{v:.2f}' for v in resid]}.")
-        # Drop empty/blinded (NaN) and effectively-zero bins before computing stats.
-        resid = resid[np.isfinite(resid) & ~np.isclose(resid, 0, atol=1e-2)]
+        resid = valid_pulls(resid)
         logging.debug(f"  Residuals (filter zeros): {[f'{v:.2f}' for v in resid]}.")
 
         resid_ax = hep.append_axes(rax, size="26%", extend=False, pad=0.05)
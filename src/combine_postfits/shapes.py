@@ -0,0 +1,849 @@
+import logging
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Iterable
+
+import hist
+import numpy as np
+import uproot
+
+if TYPE_CHECKING:
+    from .chi2 import ChannelChi2, OverallCovariance
+
+FIT_TYPES = ["prefit", "fit_s", "fit_b"]
+# Classes decoded by ``read_record`` (prefixes of ``TKey.fClassName``)
+SUPPORTED_CLASSES = ("TH1", "TH2", "TGraphAsymmErrors")
+
+
+@dataclass
+class ShapeRecord:
+    """Raw arrays of a single object from a ``shapes_*`` directory.
+
+    ``values``/``variances`` are stored as written by combine (i.e. still bin-width normalized).
+    For TH2s (``total_covar``) ``values`` is the 2D matrix and ``edges`` holds the x-axis edges.
+    """
+
+    kind: str  # "TH1" | "TH2" | "TGraphAsymmErrors"
+    values: np.ndarray
+    variances: np.ndarray
+    edges: np.ndarray
+    label: str = ""
+    poisson: bool = False  # Variance tracks the value (TGraph data, TH1 without sumw2)
+
+
+def read_record(obj: uproot.model.Model) -> ShapeRecord | None:
+    """Decode an uproot object into a ShapeRecord. Returns None for unsupported classes."""
+    if isinstance(obj, uproot.models.TGraph.Model_TGraphAsymmErrors_v3):
+        x = obj.values("x")
+        xlo, xhi = obj.errors("low", axis="x"), obj.errors("high", axis="x")
+        y = np.asarray(obj.values("y"), dtype=np.float64)
+        edges = np.r_[(x - xlo), (x + xhi)[-1]]
+        return ShapeRecord("TGraphAsymmErrors", y, y, edges, poisson=True)
+    if not isinstance(obj, uproot.behaviors.TH1.Histogram):
+        return None
+    axis = obj.member("fXaxis")
+    label = axis.member("fTitle") or axis.member("fName")
+    values = np.asarray(obj.values(flow=False), dtype=np.float64)
+    sumw2 = obj.member("fSumw2", none_if_missing=True)
+    has_sumw2 = sumw2 is not None and len(sumw2) > 0
+    variances = np.asarray(obj.variances(flow=False), dtype=np.float64) if has_sumw2 else values
+    kind = "TH2" if isinstance(obj, uproot.behaviors.TH2.TH2) else "TH1"
+    return ShapeRecord(kind, values, variances, np.asarray(axis.edges(), dtype=np.float64), label, not has_sumw2)
+
+
+def records_equal(a: ShapeRecord, b: ShapeRecord) -> bool:
+    return (a.kind, a.label, a.poisson) == (b.kind, b.label, b.poisson) and all(
+        np.array_equal(getattr(a, f), getattr(b, f)) for f in ["values", "variances", "edges"]
+    )
+
+
+def record_nbytes(records: dict[str, ShapeRecord]) -> int:
+    """Memory held by the arrays of ``records`` (arrays shared between fields are counted once)."""
+    arrays = {id(arr): arr for record in records.values() for arr in (record.values, record.variances, record.edges)}
+    return sum(arr.nbytes for arr in arrays.values())
+
+
+class Shape1D:
+    """Lightweight 1D histogram: values, variances and bin edges.
+
+    Used instead of ``hist.Hist`` while assembling a plot, as summing/scaling many shapes
+    doesn't need boost-histogram axes. Arithmetic follows ``hist``'s weighted storage
+    (variances add, and scale with the square of a factor). ``edges`` are read-only and shared
+    between shapes derived from one another. Use ``to_hist`` where a ``hist.Hist`` is needed.
+    """
+
+    __slots__ = ("_values", "_variances", "edges", "label")
+
+    def __init__(self, values: np.ndarray, variances: np.ndarray, edges: np.ndarray, label: str = ""):
+        self._values = values
+        self._variances = variances
+        if edges.flags.writeable:
+            edges.flags.writeable = False
+        self.edges = edges
+        self.label = label
+
+    @classmethod
+    def from_record(cls, record: ShapeRecord, restoreNorm: bool = True) -> "Shape1D":
+        """Shape of a TH1/TGraph record, optionally restoring the bin-width normalization."""
+        if record.kind == "TH2":
+            raise ValueError("Shape1D can't hold a 2D histogram.")
+        values, variances = record.values, record.variances
+        if restoreNorm:
+            widths = np.diff(record.edges)
+            values = values * widths
+            # Poisson records (no sumw2) keep the variance of the restored counts equal to their content
+            variances = variances * widths if record.poisson else variances * widths**2
+        else:
+            values, variances = values.copy(), variances.copy()
+        return cls(values, variances, record.edges, record.label)
+
+    def values(self) -> np.ndarray:
+        return self._values
+
+    def variances(self) -> np.ndarray:
+        return self._variances
+
+    @property
+    def widths(self) -> np.ndarray:
+        return np.diff(self.edges)
+
+    def copy(self) -> "Shape1D":
+        return Shape1D(self._values.copy(), self._variances.copy(), self.edges, self.label)
+
+    def read_only(self) -> "Shape1D":
+        """Read-only view of this shape (no copy)."""
+        values, variances = self._values.view(), self._variances.view()
+        values.flags.writeable = False
+        variances.flags.writeable = False
+        return Shape1D(values, variances, self.edges, self.label)
+
+    def __add__(self, other: "Shape1D | int") -> "Shape1D":
+        if isinstance(other, int) and other == 0:  # start value of sum()
+            return self.copy()
+        if not isinstance(other, Shape1D):
+            return NotImplemented
+        if other.edges is not self.edges and not np.array_equal(other.edges, self.edges):
+            raise ValueError("Cannot add shapes with different binning.")
+        return Shape1D(self._values + other._values, self._variances + other._variances, self.edges, self.label)
+
+    __radd__ = __add__
+
+    def __mul__(self, factor: float | np.ndarray) -> "Shape1D":
+        return Shape1D(self._values * factor, self._variances * factor**2, self.edges, self.label)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, factor: float | np.ndarray) -> "Shape1D":
+        return Shape1D(self._values / factor, self._variances / factor**2, self.edges, self.label)
+
+    def __repr__(self) -> str:
+        return f"Shape1D(values={self._values!r}, edges={self.edges!r}, label={self.label!r})"
+
+    def to_numpy(self) -> tuple[np.ndarray, np.ndarray]:
+        return self._values, self.edges
+
+    def to_hist(self) -> hist.Hist:
+        h = hist.new.Var(self.edges, label=self.label).Weight()
+        h.view().value = self._values
+        h.view().variance = self._variances
+        return h
+
+
+@dataclass
+class ChannelTensor:
+    """Dense ``(n_samples, n_channels, n_bins)`` arrays of samples across channels sharing one binning.
+
+    Samples missing from a channel are zero-filled (``present`` marks the filled entries), so
+    summing over channels is a single reduction over axis 1. ``edges``/``labels`` are taken per
+    sample from its first record, as TGraph-derived edges (data) can differ from the TH1 ones
+    by rounding.
+    """
+
+    samples: list[str]
+    channels: list[str]
+    values: np.ndarray
+    variances: np.ndarray
+    present: np.ndarray  # (n_samples, n_channels)
+    edges: list[np.ndarray]
+    labels: list[str]
+
+    @property
+    def yields(self) -> np.ndarray:
+        """``(n_channels, n_samples)`` matrix of per-channel sample yields."""
+        return self.values.sum(axis=2).T
+
+    def sums(self) -> dict[str, Shape1D]:
+        """Each sample summed over the channels."""
+        values, variances = self.values.sum(axis=1), self.variances.sum(axis=1)
+        return {
+            name: Shape1D(values[i], variances[i], self.edges[i], self.labels[i]) for i, name in enumerate(self.samples)
+        }
+
+    def partial_sum(self, merge: dict[str, list[str]] | None = None) -> "PartialSum":
+        """Sum over the channels into a ``PartialSum``, including the ``contains:`` merges in ``merge``."""
+        values, variances = list(self.values.sum(axis=1)), list(self.variances.sum(axis=1))
+        present, edges, labels = list(self.present.any(axis=1)), list(self.edges), list(self.labels)
+        merge = merge or {}
+        # Same lookup as ``utils.merge_hists`` on the plotted samples: later merges see earlier ones
+        rows = {name: i for i, name in enumerate(self.samples) if "data" not in name and "covar" not in name}
+        merged = []
+        for key, names in merge.items():
+            parts = [rows[name] for name in names if name in rows]
+            if not parts:
+                continue
+            _values, _variances = values[parts[0]].copy(), variances[parts[0]].copy()
+            for i in parts[1:]:
+                _values += values[i]
+                _variances += variances[i]
+            first = next((i for i in parts if present[i]), parts[0])
+            rows[key] = len(values)
+            merged.append(key)
+            values.append(_values)
+            variances.append(_variances)
+            present.append(any(present[i] for i in parts))
+            edges.append(edges[first])
+            labels.append(labels[first])
+        return PartialSum(
+            list(self.samples), merge, merged, np.array(values), np.array(variances), np.array(present), edges, labels
+        )
+
+
+@dataclass
+class PartialSum:
+    """Samples summed over a set of channels, as ``(n_rows, n_bins)`` arrays.
+
+    The first rows are the ``samples``, followed by one row per ``contains:`` merge in ``merged``
+    (built with the ``merge`` map). Partial sums over disjoint channel sets sharing a binning add
+    up to the sum over their union, which is how ``merge_plan.MergePlan`` shares them between
+    overlapping categories.
+    """
+
+    samples: list[str]
+    merge: dict[str, list[str]]
+    merged: list[str]
+    values: np.ndarray
+    variances: np.ndarray
+    present: np.ndarray  # (n_rows,) found in any of the channels
+    edges: list[np.ndarray]
+    labels: list[str]
+
+    def __add__(self, other: "PartialSum") -> "PartialSum":
+        if (self.samples, self.merged) != (other.samples, other.merged) or not (
+            self.values.shape == other.values.shape and np.allclose(self.edges[0], other.edges[0])
+        ):
+            raise ValueError("Cannot add partial sums with different samples or binning.")
+        # As in ``ChannelTensor``, edges/labels come from the first set a sample is present in
+        take = other.present & ~self.present
+        edges = [o if t else e for e, o, t in zip(self.edges, other.edges, take)]
+        labels = [o if t else lb for lb, o, t in zip(self.labels, other.labels, take)]
+        return PartialSum(
+            self.samples,
+            self.merge,
+            self.merged,
+            self.values + other.values,
+            self.variances + other.variances,
+            self.present | other.present,
+            edges,
+            labels,
+        )
+
+    @property
+    def yields(self) -> dict[str, float]:
+        """Summed yield of each sample."""
+        return dict(zip(self.samples, self.values[: len(self.samples)].sum(axis=1)))
+
+    def _shapes(self, names: list[str], offset: int) -> dict[str, Shape1D]:
+        return {
+            name: Shape1D(self.values[i], self.variances[i], self.edges[i], self.labels[i])
+            for i, name in enumerate(names, start=offset)
+        }
+
+    def shapes(self) -> dict[str, Shape1D]:
+        """The samples as ``Shape1D``."""
+        return self._shapes(self.samples, 0)
+
+    def merged_shapes(self) -> dict[str, Shape1D]:
+        """The ``contains:`` merges as ``Shape1D``."""
+        return self._shapes(self.merged, len(self.samples))
+
+
+def record_to_hist(record: ShapeRecord, restoreNorm: bool = True) -> hist.Hist:
+    """Convert a ShapeRecord to a hist object, optionally restoring the bin-width normalization."""
+    if record.kind == "TH2":
+        h = hist.new.Var(record.edges, label=record.label).Var(record.edges).Double()
+        h.view()[...] = record.values
+        return h
+    return Shape1D.from_record(record, restoreNorm=restoreNorm).to_hist()
+
+
+@dataclass(frozen=True)
+class IndexEntry:
+    """Location and type of a single object in a ``shapes_*`` directory."""
+
+    class_name: str
+    seek: int  # fSeekKey, position of the object's key in the file
+    nbytes: int  # Size on disk (compressed)
+    objlen: int  # Size after decompression
+
+
+class FitDiagIndex:
+    """Map of ``fit_type -> channel -> sample -> IndexEntry`` for a fitDiagnostics file.
+
+    Built from a single listing of the ``shapes_*`` directories so that task generation,
+    style generation and plotting can query channels/samples without going back to the file.
+    When built from an open file it also keeps the channel directories, so objects can be
+    read back by key without re-resolving paths (these are dropped when pickled).
+    """
+
+    def __init__(self, entries: dict[str, dict[str, dict[str, IndexEntry]]]):
+        self.entries = entries
+        self._dirs: dict[tuple[str, str], uproot.ReadOnlyDirectory] = {}
+        self._file: uproot.ReadOnlyDirectory | None = None  # Directories are resolved from it on demand
+
+    @classmethod
+    def from_file(
+        cls,
+        fitDiag: uproot.ReadOnlyDirectory,
+        fit_types: list[str] | None = None,
+        channels: list[str] | None = None,
+    ) -> "FitDiagIndex":
+        """Index ``fit_types`` (default: all available), restricted to ``channels`` (default: all)."""
+        if fit_types is None:
+            fit_types = [f for f in FIT_TYPES if f"shapes_{f}" in fitDiag]
+        entries, dirs = {}, {}
+        for fit_type in fit_types:
+            shapes_dir = fitDiag[f"shapes_{fit_type}"]
+            entries[fit_type] = {}
+            # Subdirectories only, skipping objects such as `overall_total_covar`
+            _channels = channels
+            if _channels is None:
+                _channels = [
+                    name
+                    for name, class_name in shapes_dir.classnames(recursive=False, cycle=False).items()
+                    if class_name == "TDirectory"
+                ]
+            for channel in _channels:
+                channel_dir = shapes_dir[channel]  # Raises KeyInFileError for unknown channels
+                dirs[fit_type, channel] = channel_dir
+                entries[fit_type][channel] = {}
+                for name in channel_dir.keys(cycle=False):
+                    key = channel_dir.key(name)
+                    entries[fit_type][channel][name] = IndexEntry(
+                        key.fClassName, key.fSeekKey, key.fNbytes, key.fObjlen
+                    )
+        index = cls(entries)
+        index._dirs = dirs
+        return index
+
+    def __getstate__(self):
+        return {"entries": self.entries, "_dirs": {}, "_file": None}
+
+    def attach(self, fitDiag: uproot.ReadOnlyDirectory) -> None:
+        """Read objects through ``fitDiag`` from now on (e.g. the same file reopened by a worker process)."""
+        self._file = fitDiag
+        self._dirs = {}
+
+    def to_dict(self) -> dict:
+        """JSON-able representation (see ``from_dict``)."""
+        return {
+            fit_type: {
+                channel: {name: [e.class_name, e.seek, e.nbytes, e.objlen] for name, e in samples.items()}
+                for channel, samples in channels.items()
+            }
+            for fit_type, channels in self.entries.items()
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FitDiagIndex":
+        return cls(
+            {
+                fit_type: {
+                    channel: {name: IndexEntry(*e) for name, e in samples.items()}
+                    for channel, samples in channels.items()
+                }
+                for fit_type, channels in data.items()
+            }
+        )
+
+    @property
+    def fit_types(self) -> list[str]:
+        return list(self.entries)
+
+    def channels(self, fit_type: str) -> list[str]:
+        """List the channels available for ``fit_type``."""
+        return list(self.entries[fit_type])
+
+    def samples(self, fit_type: str, channels: list[str]) -> list[str]:
+        """Union of the object names available in ``channels``, in order of first appearance."""
+        return list(dict.fromkeys(name for channel in channels for name in self.entries[fit_type][channel]))
+
+    def has(self, fit_type: str, channel: str, name: str) -> bool:
+        return name in self.entries.get(fit_type, {}).get(channel, {})
+
+    def key(self, fit_type: str, channel: str, name: str) -> uproot.reading.ReadOnlyKey:
+        """uproot key of an indexed object. Only available for indices built with ``from_file`` (or ``attach``ed)."""
+        if (fit_type, channel) not in self._dirs and self._file is not None:
+            self._dirs[fit_type, channel] = self._file[f"shapes_{fit_type}/{channel}"]
+        try:
+            return self._dirs[fit_type, channel].key(name)
+        except KeyError:
+            raise KeyError(f"Index has no open directory for 'shapes_{fit_type}/{channel}'.") from None
+
+
+class ShapeStore:
+    """In-memory copy of the ``shapes_{fit_type}`` directories of a fitDiagnostics file.
+
+    Every object is decoded exactly once, in file order, into plain numpy arrays so that
+    plotting many (merged) categories doesn't go back to uproot for every sample/channel.
+    Layout: ``shapes[fit_type][channel][sample] -> ShapeRecord``.
+
+    A store created with ``stream`` instead reads channels just in time and keeps the resident
+    ones within a memory budget (see ``pin``/``unpin``/``evict``).
+    """
+
+    def __init__(self, shapes: dict[str, dict[str, dict[str, ShapeRecord]]], index: FitDiagIndex | None = None):
+        self.shapes = shapes
+        self.index = index
+        self.names: set[str] | None = None  # Objects read from the file (default: all)
+        # Streaming mode only
+        self.max_bytes: int | None = None
+        self._executor: Executor | None = None
+        self._resident: OrderedDict[tuple[str, str], int] = OrderedDict()  # (fit_type, channel) -> nbytes, LRU first
+        self._pins: Counter = Counter()
+        # Guards the residency bookkeeping, channels may be read ahead by another thread (see ``make_plots.Prefetcher``)
+        self._lock = threading.RLock()
+        # Category sums precomputed by ``merge_plan.MergePlan``: (fit_type, frozenset(channels), restoreNorm)
+        self.sums: dict[tuple[str, frozenset[str], bool], PartialSum] = {}
+        # Goodness-of-fit terms (and toy chi2 distributions) cached by ``chi2.channel_chi2`` and friends
+        self.chi2: dict[tuple, "ChannelChi2 | np.ndarray | None"] = {}
+        self.overall_covar: dict[str, "OverallCovariance"] = {}  # fit_type -> ``overall_total_covar``
+
+    def __getstate__(self):
+        state = {**self.__dict__, "_executor": None}
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _read(
+        index: FitDiagIndex, items: list[tuple[str, str, str, IndexEntry]], executor: Executor | None = None
+    ) -> list[ShapeRecord | None]:
+        """Decode ``(fit_type, channel, name, entry)`` items, returned in the order given."""
+
+        # Decode in file order so the scan over the underlying file is linear
+        def read(i):
+            fit_type, channel, name, _ = items[i]
+            return read_record(index.key(fit_type, channel, name).get())
+
+        order = sorted(range(len(items)), key=lambda i: items[i][-1].seek)
+        if executor is not None:
+            records = dict(zip(order, executor.map(read, order)))
+        else:
+            records = {i: read(i) for i in order}
+        return [records[i] for i in range(len(items))]
+
+    @classmethod
+    def from_file(
+        cls,
+        fitDiag: uproot.ReadOnlyDirectory,
+        fit_types: list[str] | None = None,
+        channels: list[str] | None = None,
+        index: FitDiagIndex | None = None,
+        executor: Executor | None = None,
+        names: Iterable[str] | None = None,
+    ) -> "ShapeStore":
+        """Load ``fit_types`` (default: all available), restricted to ``channels`` (default: all).
+
+        Only the objects in ``names`` (default: all) are decoded, e.g. the ones a plot actually
+        draws (see ``plot_postfits.required_samples``); the others aren't listed by ``samples``.
+        A prebuilt ``index`` (from ``FitDiagIndex.from_file``) can be passed to skip listing the file again.
+        With an ``executor`` (e.g. a ``ThreadPoolExecutor``) objects are read and decoded concurrently;
+        decompression releases the GIL, so this scales with the number of threads for large files.
+        """
+        if index is None:
+            index = FitDiagIndex.from_file(fitDiag, fit_types=fit_types, channels=channels)
+        if fit_types is None:
+            fit_types = index.fit_types
+        items = [
+            (fit_type, channel, name, entry)
+            for fit_type in fit_types
+            for channel in (channels if channels is not None else index.channels(fit_type))
+            for name, entry in index.entries[fit_type][channel].items()
+            if names is None or name in names
+        ]
+        # Re-assembled in directory order (which sets the default sample ordering)
+        records = cls._read(index, items, executor=executor)
+        shapes: dict[str, dict[str, dict[str, ShapeRecord]]] = {fit_type: {} for fit_type in fit_types}
+        for fit_type in fit_types:
+            for channel in channels if channels is not None else index.channels(fit_type):
+                shapes[fit_type][channel] = {}
+        for i, (fit_type, channel, name, entry) in enumerate(items):
+            if records[i] is None:
+                logging.debug(f"  Skipping unsupported object '{fit_type}/{channel}/{name}' ({entry.class_name}).")
+                continue
+            shapes[fit_type][channel][name] = records[i]
+        store = cls(shapes, index=index)
+        store.names = set(names) if names is not None else None
+        for fit_type in fit_types:
+            for channel in shapes[fit_type]:
+                store._share_data(fit_type, channel)
+        return store
+
+    @classmethod
+    def stream(
+        cls,
+        fitDiag: uproot.ReadOnlyDirectory,
+        max_bytes: float,
+        fit_types: list[str] | None = None,
+        index: FitDiagIndex | None = None,
+        executor: Executor | None = None,
+        names: Iterable[str] | None = None,
+    ) -> "ShapeStore":
+        """Store that reads each channel on first access instead of loading the file up front.
+
+        As in ``from_file``, only the objects in ``names`` (default: all) are ever read.
+
+        Resident channels are evicted least recently used first whenever loading another one
+        would exceed ``max_bytes``; pinned channels (in use by a plot) are never evicted, so the
+        budget can be exceeded by a single oversized task. ``fitDiag`` must stay open while the
+        store is in use.
+        """
+        if index is None:
+            index = FitDiagIndex.from_file(fitDiag, fit_types=fit_types)
+        store = cls({fit_type: {} for fit_type in (fit_types or index.fit_types)}, index=index)
+        store.max_bytes = int(max_bytes)
+        store._executor = executor
+        store.names = set(names) if names is not None else None
+        return store
+
+    def _entries(self, fit_type: str, channel: str) -> dict[str, IndexEntry]:
+        """Index entries of ``channel`` that this store reads (see ``names``)."""
+        entries = self.index.entries[fit_type][channel]
+        if self.names is None:
+            return entries
+        return {name: entry for name, entry in entries.items() if name in self.names}
+
+    @property
+    def streaming(self) -> bool:
+        return self.max_bytes is not None
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the loaded arrays."""
+        if self.streaming:
+            with self._lock:
+                return sum(self._resident.values())
+        return sum(record_nbytes(samples) for channels in self.shapes.values() for samples in channels.values())
+
+    @property
+    def pinned_nbytes(self) -> int:
+        with self._lock:
+            return sum(self._resident.get(key, 0) for key, count in self._pins.items() if count > 0)
+
+    def estimate_nbytes(self, fit_type: str, channel: str) -> int:
+        """Memory a channel takes (or is expected to take, from its on-disk size) once loaded."""
+        if (fit_type, channel) in self._resident:
+            return self._resident[fit_type, channel]
+        if not self.streaming and channel in self.shapes.get(fit_type, {}):
+            return record_nbytes(self.shapes[fit_type][channel])
+        # Decoded arrays are float64, i.e. TH2F covariances double in size, while TH1 keys
+        # carry enough streamer overhead that their decompressed size is an upper bound.
+        entries = self._entries(fit_type, channel).values()
+        return sum(e.objlen * (2 if e.class_name.startswith("TH2") else 1) for e in entries)
+
+    def fits(self, fit_type: str, channels: list[str]) -> bool:
+        """Whether ``channels`` can be pinned on top of the currently pinned ones within the budget."""
+        return self.fits_all([(fit_type, channels)])
+
+    def fits_all(self, groups: Iterable[tuple[str, list[str]]]) -> bool:
+        """``fits`` for the channels of several fit types together."""
+        if not self.streaming:
+            return True
+        with self._lock:
+            pinned = {key for key, count in self._pins.items() if count > 0}
+            needed = {
+                (fit_type, ch): self.estimate_nbytes(fit_type, ch)
+                for fit_type, channels in groups
+                for ch in channels
+                if (fit_type, ch) not in pinned
+            }
+            return self.pinned_nbytes + sum(needed.values()) <= self.max_bytes
+
+    def load(self, fit_type: str, channels: list[str]) -> None:
+        """Make ``channels`` resident, evicting least recently used unpinned channels to stay in budget.
+
+        The file is read without holding the lock, so other threads keep using the resident channels.
+        """
+        if not self.streaming:
+            return
+        with self._lock:
+            missing = [ch for ch in channels if ch not in self.shapes[fit_type]]
+            if missing:
+                keep = [(fit_type, ch) for ch in channels]
+                self.trim(self.max_bytes - sum(self.estimate_nbytes(fit_type, ch) for ch in missing), keep=keep)
+        if missing:
+            logging.debug(f"Loading 'shapes_{fit_type}' channels {missing}.")
+            items = [
+                (fit_type, channel, name, entry)
+                for channel in missing
+                for name, entry in self._entries(fit_type, channel).items()
+            ]
+            records = self._read(self.index, items, executor=self._executor)
+            loaded = {channel: {} for channel in missing}
+            for (_, channel, name, entry), record in zip(items, records):
+                if record is None:
+                    logging.debug(f"  Skipping unsupported object '{fit_type}/{channel}/{name}' ({entry.class_name}).")
+                    continue
+                loaded[channel][name] = record
+            self.add(fit_type, loaded, keep=channels)
+        with self._lock:
+            for channel in channels:
+                if (fit_type, channel) in self._resident:
+                    self._resident.move_to_end((fit_type, channel))
+
+    def add(self, fit_type: str, loaded: dict[str, dict[str, ShapeRecord]], keep: list[str] = ()) -> None:
+        """Make decoded channels resident (e.g. read by another process), evicting others as ``load`` does."""
+        if not self.streaming:
+            return
+        with self._lock:
+            keep = [(fit_type, ch) for ch in [*keep, *loaded]]
+            self.trim(self.max_bytes - sum(record_nbytes(samples) for samples in loaded.values()), keep=keep)
+            for channel, samples in loaded.items():
+                self.shapes[fit_type][channel] = samples
+                self._share_data(fit_type, channel)
+                self._resident[fit_type, channel] = record_nbytes(samples)
+
+    def _share_data(self, fit_type: str, channel: str) -> None:
+        """Use the ``data`` record of another fit type when identical (it normally is), so it is held once."""
+        record = self.shapes[fit_type][channel].get("data")
+        if record is None:
+            return
+        for other, channels in self.shapes.items():
+            twin = channels.get(channel, {}).get("data") if other != fit_type else None
+            if twin is record:
+                return
+            if twin is not None and records_equal(twin, record):
+                self.shapes[fit_type][channel]["data"] = twin
+                return
+
+    def trim(self, max_bytes: int, keep: list[tuple[str, str]] = ()) -> None:
+        """Evict least recently used unpinned channels (other than ``keep``) until at most ``max_bytes`` are resident."""
+        if not self.streaming:
+            return
+        with self._lock:
+            resident = self.nbytes
+            for key, size in list(self._resident.items()):
+                if resident <= max_bytes:
+                    break
+                if key not in keep and self._pins[key] == 0:
+                    self.evict(*key)
+                    resident -= size
+
+    def evict(self, fit_type: str, channel: str) -> None:
+        """Drop a resident channel (streaming mode only, it is read again when next needed)."""
+        if not self.streaming:
+            return
+        with self._lock:
+            if (fit_type, channel) not in self._resident:
+                return
+            if self._pins[fit_type, channel] > 0:
+                raise RuntimeError(f"Cannot evict pinned channel 'shapes_{fit_type}/{channel}'.")
+            logging.debug(f"Evicting 'shapes_{fit_type}/{channel}'.")
+            del self._resident[fit_type, channel]
+            del self.shapes[fit_type][channel]
+
+    def pin(self, fit_type: str, channels: list[str]) -> None:
+        """Load ``channels`` and keep them resident until released with ``unpin``."""
+        with self._lock:
+            # Pinned before loading, so that no other thread evicts them in between
+            for channel in channels:
+                self._pins[fit_type, channel] += 1
+        try:
+            self.load(fit_type, channels)
+        except BaseException:
+            self.unpin(fit_type, channels)
+            raise
+
+    def unpin(self, fit_type: str, channels: list[str]) -> None:
+        with self._lock:
+            for channel in channels:
+                self._pins[fit_type, channel] -= 1
+
+    def pack(self) -> tuple[dict, np.ndarray]:
+        """Flatten the store into a JSON-able layout and a single contiguous float64 buffer.
+
+        The layout mirrors ``shapes`` with each array replaced by its ``[offset, shape]`` in the
+        buffer. Arrays shared between fields (e.g. Poisson variances) or records (``data`` of the
+        different fit types) are only stored once.
+        """
+        chunks, offset, layout, seen = [], 0, {}, {}
+        for fit_type, channels in self.shapes.items():
+            layout[fit_type] = {}
+            for channel, samples in channels.items():
+                layout[fit_type][channel] = {}
+                for name, record in samples.items():
+                    arrays = {}
+                    for field in ["values", "variances", "edges"]:
+                        arr = getattr(record, field)
+                        if id(arr) not in seen:
+                            chunks.append(np.ravel(arr))
+                            seen[id(arr)] = [offset, list(arr.shape)]
+                            offset += arr.size
+                        arrays[field] = seen[id(arr)]
+                    layout[fit_type][channel][name] = {
+                        "kind": record.kind,
+                        "label": record.label,
+                        "poisson": record.poisson,
+                        **arrays,
+                    }
+        buffer = np.concatenate(chunks) if chunks else np.zeros(0)
+        return layout, buffer.astype(np.float64, copy=False)
+
+    @classmethod
+    def unpack(cls, layout: dict, buffer: np.ndarray, index: FitDiagIndex | None = None) -> "ShapeStore":
+        """Inverse of ``pack``. Records are views into ``buffer`` (no copy, works with memmaps)."""
+
+        def view(spec):
+            offset, shape = spec
+            return buffer[offset : offset + int(np.prod(shape))].reshape(shape)
+
+        shapes = {}
+        for fit_type, channels in layout.items():
+            shapes[fit_type] = {}
+            for channel, samples in channels.items():
+                shapes[fit_type][channel] = {}
+                for name, spec in samples.items():
+                    values = view(spec["values"])
+                    variances = values if spec["variances"] == spec["values"] else view(spec["variances"])
+                    shapes[fit_type][channel][name] = ShapeRecord(
+                        spec["kind"], values, variances, view(spec["edges"]), spec["label"], spec["poisson"]
+                    )
+        return cls(shapes, index=index)
+
+    @property
+    def fit_types(self) -> list[str]:
+        return list(self.shapes)
+
+    def channels(self, fit_type: str) -> list[str]:
+        """List the channels available for ``fit_type``."""
+        if self.streaming:
+            return self.index.channels(fit_type)
+        return list(self.shapes[fit_type])
+
+    def samples(self, fit_type: str, channels: list[str]) -> list[str]:
+        """Union of the object names available in ``channels``, in order of first appearance."""
+        if self.streaming:
+            # Served from the index, without loading the channels
+            return list(
+                dict.fromkeys(
+                    name
+                    for channel in channels
+                    for name, entry in self._entries(fit_type, channel).items()
+                    if entry.class_name.startswith(SUPPORTED_CLASSES)
+                )
+            )
+        return list(dict.fromkeys(name for channel in channels for name in self.channel(fit_type, channel)))
+
+    def channel(self, fit_type: str, channel: str) -> dict[str, ShapeRecord]:
+        if self.streaming and channel in self.index.entries.get(fit_type, {}):
+            self.load(fit_type, [channel])
+        try:
+            return self.shapes[fit_type][channel]
+        except KeyError:
+            raise KeyError(f"Channel 'shapes_{fit_type}/{channel}' is not available in the fitDiagnostics.") from None
+
+    def record(self, fit_type: str, channel: str, name: str) -> ShapeRecord:
+        shapes = self.channel(fit_type, channel)
+        if name not in shapes:
+            raise KeyError(f"'{name}' not found in 'shapes_{fit_type}/{channel}'.")
+        return shapes[name]
+
+    def get(self, fit_type: str, channel: str, name: str, restoreNorm: bool = True) -> hist.Hist:
+        """Equivalent of ``utils.geth`` served from memory."""
+        return record_to_hist(self.record(fit_type, channel, name), restoreNorm=restoreNorm)
+
+    def get_shape(self, fit_type: str, channel: str, name: str, restoreNorm: bool = True) -> Shape1D:
+        """Like ``get``, for 1D objects, as a ``Shape1D``."""
+        return Shape1D.from_record(self.record(fit_type, channel, name), restoreNorm=restoreNorm)
+
+    def get_summed_shape(self, fit_type: str, channels: list[str], name: str, restoreNorm: bool = True) -> Shape1D:
+        """Sum ``name`` across ``channels`` (skipping channels without it) as a ``Shape1D``."""
+        shapes = []
+        for channel in channels:
+            if name in self.channel(fit_type, channel):
+                shapes.append(self.get_shape(fit_type, channel, name, restoreNorm=restoreNorm))
+            else:
+                logging.debug(f"    Sample: '{name}' not found in channel '{channel}' and will be skipped.")
+        if shapes:
+            return sum(shapes)
+        # Sample absent from every channel: return a zero-filled shape matching the channel binning
+        for channel in channels:
+            for tmpl, record in self.channel(fit_type, channel).items():
+                if record.kind != "TH2":
+                    return self.get_shape(fit_type, channel, tmpl, restoreNorm=restoreNorm) * 0
+        raise ValueError(f"Sample '{name}' not found in any channel and no template histogram is available.")
+
+    def get_many_shapes(
+        self, fit_type: str, channels: list[str], names: list[str], restoreNorm: bool = True
+    ) -> dict[str, Shape1D]:
+        return {name: self.get_summed_shape(fit_type, channels, name, restoreNorm=restoreNorm) for name in names}
+
+    def tensor(
+        self, fit_type: str, channels: list[str], names: list[str], restoreNorm: bool = True
+    ) -> ChannelTensor | None:
+        """Load ``names`` across ``channels`` into a ``ChannelTensor``.
+
+        Returns None when the channels don't share a binning (use ``get_many_shapes`` then).
+        """
+        records = [self.channel(fit_type, channel) for channel in channels]
+        template = None
+        for channel_records in records:
+            for record in channel_records.values():
+                if record.kind == "TH2":
+                    continue
+                if template is None:
+                    template = record
+                elif record.edges is not template.edges and not (
+                    record.edges.shape == template.edges.shape and np.allclose(record.edges, template.edges)
+                ):
+                    return None
+        if template is None:
+            return None
+        shape = (len(names), len(channels), len(template.edges) - 1)
+        values, variances, widths = np.zeros(shape), np.zeros(shape), np.ones(shape)
+        present, poisson = np.zeros(shape[:2], dtype=bool), np.zeros(shape[:2], dtype=bool)
+        edges, labels = [template.edges] * len(names), [template.label] * len(names)
+        for j, channel_records in enumerate(records):
+            for i, name in enumerate(names):
+                record = channel_records.get(name)
+                if record is None or record.kind == "TH2":
+                    continue
+                if not present[i].any():
+                    edges[i], labels[i] = record.edges, record.label
+                values[i, j] = record.values
+                variances[i, j] = record.variances
+                widths[i, j] = np.diff(record.edges)
+                present[i, j] = True
+                poisson[i, j] = record.poisson
+        for i in np.flatnonzero(~present.any(axis=1)):
+            logging.debug(f"    Sample: '{names[i]}' not found in any of channels {channels}, will be zero.")
+        if restoreNorm:
+            # Each record is scaled by its own bin widths, as in ``Shape1D.from_record``
+            values *= widths
+            variances *= np.where(poisson[..., None], widths, widths**2)
+        return ChannelTensor(list(names), list(channels), values, variances, present, edges, labels)
+
+    def get_summed(self, fit_type: str, channels: list[str], name: str, restoreNorm: bool = True) -> hist.Hist:
+        """Equivalent of ``utils.getha`` served from memory: sum ``name`` across ``channels``."""
+        return self.get_summed_shape(fit_type, channels, name, restoreNorm=restoreNorm).to_hist()
+
+    def get_many(
+        self, fit_type: str, channels: list[str], names: list[str], restoreNorm: bool = True
+    ) -> dict[str, hist.Hist]:
+        """Equivalent of ``utils.geths`` served from memory."""
+        return {name: self.get_summed(fit_type, channels, name, restoreNorm=restoreNorm) for name in names}
@@ -0,0 +1,50 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .shapes import ShapeStore
+
+
+class SharedShapes:
+    """A ``ShapeStore`` handed to worker processes through a shared memory block.
+
+    The parent packs the shapes once (see ``ShapeStore.pack``) into a ``SharedMemory`` block;
+    pickling this object then only sends the block name and the layout, and ``attach`` rebuilds
+    the store in the worker with every record a view into the mapped block (no copy, no file
+    access). The store's other state (index, precomputed sums and chi2 terms) is pickled as usual.
+    Only the creating process may ``unlink`` the block.
+    """
+
+    def __init__(self, store: ShapeStore):
+        if store.streaming:
+            raise ValueError("Streaming stores are loaded by the workers themselves and can't be shared.")
+        layout, buffer = store.pack()
+        self.layout = layout
+        self.shape = buffer.shape
+        self.state = {k: v for k, v in store.__getstate__().items() if k != "shapes"}
+        self._shm = shared_memory.SharedMemory(create=True, size=max(buffer.nbytes, 1))
+        np.frombuffer(self._shm.buf, dtype=np.float64, count=buffer.size)[:] = buffer
+        self.name = self._shm.name
+
+    def __getstate__(self):
+        return {**self.__dict__, "_shm": None}
+
+    @property
+    def nbytes(self) -> int:
+        return int(np.prod(self.shape)) * np.dtype(np.float64).itemsize
+
+    def attach(self) -> ShapeStore:
+        """Map the block (once per process) and return the store, its records being views into it."""
+        if self._shm is None:
+            self._shm = shared_memory.SharedMemory(name=self.name)
+        # ``frombuffer`` holds an export of the mapping, so it can't be closed under the views
+        buffer = np.frombuffer(self._shm.buf, dtype=np.float64, count=int(np.prod(self.shape)))
+        buffer.flags.writeable = False
+        store = ShapeStore.unpack(self.layout, buffer)
+        store.__dict__.update(self.state)
+        return store
+
+    def unlink(self) -> None:
+        """Release the block, once the workers are done with it."""
+        self._shm.close()
+        self._shm.unlink()
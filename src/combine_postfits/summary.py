@@ -0,0 +1,248 @@
+import csv
+import json
+import logging
+import warnings
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Iterable
+
+import matplotlib.pyplot as plt
+import numpy as np
+from scipy import stats
+
+from .chi2 import toy_pvalue
+from .plot_postfits import _calc_chi2, compute_pulls, compute_residual_stats, valid_pulls
+from .shapes import Shape1D, ShapeStore
+from .utils import _ensure_slice_by_ix, _string_to_slice
+
+SUMMARY_NAME = "gof_summary"
+
+
+@dataclass
+class CategorySummary:
+    """Goodness-of-fit of one plotted category (the numbers shown in its chi2 label and residual panel)."""
+
+    source: str
+    fit_type: str
+    category: str
+    n_channels: int
+    nbins: int
+    chi2: float
+    chi2_corr: bool  # with the bin correlations (otherwise data uncertainties only)
+    p_chi2: float  # asymptotic, chi2 with ``nbins`` degrees of freedom
+    p_toys: float | None
+    n_pulls: int
+    max_pull: float
+    p_sw: float | None  # Shapiro-Wilk / Kolmogorov-Smirnov of the pulls, as in the residual panel
+    p_ks: float | None
+    pulls: np.ndarray = field(repr=False)
+
+    @property
+    def chi2_ndf(self) -> float:
+        return self.chi2 / self.nbins if self.nbins else np.nan
+
+    def row(self) -> dict:
+        """Table row (without the pulls)."""
+        row = {k: v for k, v in asdict(self).items() if k != "pulls"}
+        row["chi2_ndf"] = self.chi2_ndf
+        return row
+
+
+def _residual_stats(pulls: np.ndarray) -> tuple[float | None, float | None]:
+    if len(pulls) < 3:  # Shapiro-Wilk needs at least 3 values
+        return None, None
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)  # Shapiro-Wilk p-value approximation above 5000 values
+        p_sw, p_ks = compute_residual_stats(pulls)
+    return float(p_sw), float(p_ks)
+
+
+def _category_shapes(
+    store: ShapeStore, fit_type: str, channels: list[str], restoreNorm: bool
+) -> tuple[Shape1D, Shape1D]:
+    """``data`` and ``total`` of the category, from the precomputed partial sums when available."""
+    partial = store.sums.get((fit_type, frozenset(channels), restoreNorm))
+    if partial is not None:
+        shapes = partial.shapes()
+        return shapes["data"], shapes["total"]
+    return tuple(
+        store.get_summed_shape(fit_type, channels, name, restoreNorm=restoreNorm) for name in ["data", "total"]
+    )
+
+
+def summarize_category(
+    store: ShapeStore,
+    fit_type: str,
+    channels: list[str],
+    category: str,
+    source: str = "",
+    blind_data: str | None = None,
+    restoreNorm: bool = True,
+    chi2_nocorr: bool = False,
+    chi2_overall: bool = False,
+    chi2_toys: int = 0,
+) -> CategorySummary:
+    """Chi2 and pulls of a category, reusing the chi2 terms (and toys) cached in ``store.chi2``."""
+    data, tot = _category_shapes(store, fit_type, channels, restoreNorm)
+    blind_slice = _ensure_slice_by_ix(_string_to_slice(blind_data), data.edges) if blind_data is not None else None
+    chi2, nbins, chi2_corr = _calc_chi2(
+        store, fit_type, channels, restoreNorm, chi2_nocorr, blind_slice=blind_slice, overall=chi2_overall
+    )
+    p_toys = None
+    if chi2_toys > 0:
+        p_toys = toy_pvalue(
+            store,
+            fit_type,
+            channels,
+            chi2,
+            chi2_toys,
+            restoreNorm=restoreNorm,
+            blind_slice=blind_slice,
+            nocorr=not chi2_corr,
+            overall=chi2_overall,
+        )
+    pulls = valid_pulls(compute_pulls(data, tot, blind_slice=blind_slice))
+    p_sw, p_ks = _residual_stats(pulls)
+    return CategorySummary(
+        source=source,
+        fit_type=fit_type,
+        category=category,
+        n_channels=len(channels),
+        nbins=int(nbins),
+        chi2=float(chi2),
+        chi2_corr=bool(chi2_corr),
+        p_chi2=float(stats.chi2.sf(chi2, nbins)) if nbins else np.nan,
+        p_toys=p_toys,
+        n_pulls=len(pulls),
+        max_pull=float(np.max(np.abs(pulls), initial=0)),
+        p_sw=p_sw,
+        p_ks=p_ks,
+        pulls=pulls,
+    )
+
+
+@dataclass
+class GofSummary:
+    """Goodness-of-fit of all plotted categories, with global tests over the pulls of every bin.
+
+    Categories are collected from ``PlotTask``-like objects (``fittype``, ``channels``, ``savename``,
+    ``blind``, ``blind_range``, ``source``); fully blinded ones are left out.
+    """
+
+    categories: list[CategorySummary]
+
+    @classmethod
+    def from_tasks(
+        cls,
+        store: ShapeStore,
+        tasks: Iterable,
+        restoreNorm: bool = True,
+        chi2_nocorr: bool = False,
+        chi2_overall: bool = False,
+        chi2_toys: int = 0,
+    ) -> "GofSummary":
+        categories = []
+        for task in tasks:
+            if task.blind:
+                continue
+            categories.append(
+                summarize_category(
+                    store,
+                    task.fittype,
+                    task.channels,
+                    task.savename,
+                    source=str(task.source or ""),
+                    blind_data=task.blind_range,
+                    restoreNorm=restoreNorm,
+                    chi2_nocorr=chi2_nocorr,
+                    chi2_overall=chi2_overall,
+                    chi2_toys=chi2_toys,
+                )
+            )
+        return cls(categories)
+
+    def __add__(self, other: "GofSummary") -> "GofSummary":
+        return GofSummary(self.categories + other.categories)
+
+    @property
+    def pulls(self) -> np.ndarray:
+        return np.concatenate([c.pulls for c in self.categories]) if self.categories else np.zeros(0)
+
+    def totals(self) -> dict:
+        """Global numbers: pull tests over all bins and the chi2 summed per fit type."""
+        p_sw, p_ks = _residual_stats(self.pulls)
+        totals = {"n_categories": len(self.categories), "n_pulls": len(self.pulls), "p_sw": p_sw, "p_ks": p_ks}
+        for fit_type in dict.fromkeys(c.fit_type for c in self.categories):
+            chi2 = sum(c.chi2 for c in self.categories if c.fit_type == fit_type)
+            nbins = sum(c.nbins for c in self.categories if c.fit_type == fit_type)
+            totals[fit_type] = {"chi2": chi2, "nbins": nbins, "chi2_ndf": chi2 / nbins if nbins else None}
+        return totals
+
+    def write(self, out_dir: Path, formats: list[str] = ("png",), dpi: int = 150) -> list[Path]:
+        """Write ``gof_summary.json``, ``gof_summary.csv`` and the summary figure to ``out_dir``."""
+        out_dir = Path(out_dir)
+        rows = [c.row() for c in self.categories]
+        paths = [out_dir / f"{SUMMARY_NAME}.json", out_dir / f"{SUMMARY_NAME}.csv"]
+        with open(paths[0], "w") as f:
+            json.dump(_json_safe({"summary": self.totals(), "categories": rows}), f, indent=2)
+        with open(paths[1], "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else ["category"])
+            writer.writeheader()
+            writer.writerows(rows)
+        fig = self.plot()
+        for fmt in formats:
+            paths.append(out_dir / f"{SUMMARY_NAME}.{fmt}")
+            fig.savefig(paths[-1], format=fmt, dpi=dpi, bbox_inches="tight")
+        plt.close(fig)
+        for path in paths:
+            logging.info(f"Saved goodness-of-fit summary: '{path}'")
+        return paths
+
+    def plot(self, n_worst: int = 30) -> plt.Figure:
+        """chi2/ndf of the ``n_worst`` categories (lowest p-value) and the distribution of all pulls."""
+        fig, (ax, pax) = plt.subplots(1, 2, figsize=(20, 10), gridspec_kw=dict(width_ratios=[3, 2]))
+        worst = sorted(
+            (c for c in self.categories if c.nbins), key=lambda c: c.p_chi2 if c.p_toys is None else c.p_toys
+        )[:n_worst][::-1]
+        several = len({c.source for c in self.categories}) > 1
+        names = [f"{Path(c.source).stem}/{c.category}" if several else c.category for c in worst]
+        names = [f"{name} ({c.fit_type})" for name, c in zip(names, worst)]
+        ax.barh(np.arange(len(worst)), [c.chi2_ndf for c in worst], color="#3f90da")
+        ax.axvline(1, color="gray", ls="--")
+        ax.set_yticks(np.arange(len(worst)), names, fontsize="xx-small")
+        ax.set_xlabel(r"$\chi^2 / N_{bins}$")
+        ax.set_title(f"Worst {len(worst)} of {len(self.categories)} categories", fontsize="small")
+
+        pulls = self.pulls
+        edges = np.linspace(-5, 5, 41)
+        pax.hist(np.clip(pulls, edges[0], edges[-1]), bins=edges, histtype="step", color="k", lw=1.5, label="Pulls")
+        centers = (edges[1:] + edges[:-1]) / 2
+        pax.plot(
+            centers, len(pulls) * np.diff(edges) * stats.norm.pdf(centers), color="gray", label=r"$\mathcal{N}(0, 1)$"
+        )
+        pax.set_xlabel("Pulls")
+        pax.legend(fontsize="small")
+        totals = self.totals()
+        if totals["p_sw"] is not None:
+            pax.text(
+                0.05,
+                0.95,
+                f"N = {totals['n_pulls']}\nSW p-val = {totals['p_sw']:.2f}\nKS p-val = {totals['p_ks']:.2f}",
+                transform=pax.transAxes,
+                va="top",
+                fontsize="small",
+            )
+        return fig
+
+
+def _json_safe(obj):
+    """Replace NaN/inf (not valid JSON) by None, recursively."""
+    if isinstance(obj, dict):
+        return {k: _json_safe(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_json_safe(v) for v in obj]
+    if isinstance(obj, float | np.floating) and not np.isfinite(obj):
+        return None
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
@@ -1,4 +1,5 @@
 import argparse
+import functools
 import logging
 import pprint
 from typing import Any
@@ -7,8 +8,13 @@ import hist
 import matplotlib.legend
 import matplotlib.pyplot as plt
 import numpy as np
+import scipy.stats
 import uproot
 from cycler import cycler
+from mplhep import error_estimation
+
+from .fitresult import FitResultTable
+from .shapes import Shape1D, ShapeStore
 
 cmap6 = ["#5790fc", "#f89c20", "#e42536", "#964a8b", "#9c9ca1", "#7a21dd"]
 cmap10 = [
@@ -171,9 +177,13 @@ def prep_yaml(style: dict) -> dict:
 
 
 def make_style_dict_yaml(
-    fitDiag: uproot.ReadOnlyDirectory, cmap: str = "tab10", sort: bool = True, sort_peaky: bool = False
+    fitDiag: uproot.ReadOnlyDirectory | ShapeStore,
+    cmap: str = "tab10",
+    sort: bool = True,
+    sort_peaky: bool = False,
 ) -> dict:
-    """Generate a style dictionary from a fitDiagnostics file."""
+    """Generate a style dictionary from a fitDiagnostics file (or a preloaded ShapeStore)."""
+    store = fitDiag if isinstance(fitDiag, ShapeStore) else ShapeStore.from_file(fitDiag)
     style_base = {
         "data": {"label": "Data", "color": "black", "hatch": None, "yield": 0},
         "total_signal": {
@@ -184,25 +194,19 @@ def make_style_dict_yaml(
         },
     }
 
-    fit_types = ["prefit", "fit_s", "fit_b"]
-    avail_fit_types = [f for f in fit_types if f"shapes_{f}" in fitDiag]
-    avail_channels = [ch[:-2] for ch in fitDiag[f"shapes_{avail_fit_types[-1]}"] if ch.count("/") == 0]
+    avail_fit_types = store.fit_types
+    avail_channels = store.channels(avail_fit_types[-1])
 
-    def get_samples_fitDiag(fitDiag):
+    def get_samples_fitDiag(store):
         snames = []
         for fit in avail_fit_types:
-            try:
-                for ch in [ch[:-2] for ch in fitDiag[f"shapes_{fit}"] if ch.count("/") == 0]:
-                    snames += [k[:-2] for k in fitDiag[f"shapes_{fit}/{ch}"].keys()]
-            except KeyError:
-                print(f"Shapes: `shapes_{fit}` are missing from the fitDiagnostics")
+            snames += store.samples(fit, store.channels(fit))
         return sorted([k for k in list(set(snames)) if "covar" not in k])
 
-    sample_keys = get_samples_fitDiag(fitDiag)
+    sample_keys = get_samples_fitDiag(store)
 
     # Sorting - yield/peakiness
-    def linearity(h):
-        _h = h.values()
+    def linearity(_h):
         x = np.arange(len(_h))
         if len(_h) <= 1:
             return 0
@@ -215,24 +219,26 @@ def make_style_dict_yaml(
         residuals = abs(fy - _h) / np.sqrt(_h)
         return np.sum(np.nan_to_num(residuals, posinf=0, neginf=0))
 
-    # Convert each histogram once (uproot's to_hist is not memoized) and index each ROOT key
-    # a single time; reuse the cached hist objects for both the yield sum and the linearity score.
-    hist_cache = {k: [] for k in sample_keys}
-    for k in sample_keys:
-        if "total" in k:  # Sum only TH1s, data is black anyway
-            continue
-        for fit in avail_fit_types:
-            for ch in avail_channels:
-                key = f"shapes_{fit}/{ch}/{k}"
-                if key in fitDiag and hasattr(fitDiag[key], "to_hist"):
-                    hist_cache[k].append(fitDiag[key].to_hist())
-
-    yield_dict = {k: sum(sum(h.values()) for h in hist_cache[k]) for k in sample_keys}
-    linearity_dict = {
-        # pad 0 to prevent mean on empty list
-        k: np.mean([linearity(h) for h in hist_cache[k]] + [0])
-        for k in sample_keys
-    }
+    # Raw (bin-width normalized) TH1 contents straight from the store, reduced to the yield sum
+    # and linearity score one channel at a time (so a streaming store needn't hold every hist).
+    yield_dict = {k: 0 for k in sample_keys}
+    linearity_scores = {k: [] for k in sample_keys}
+    for fit in avail_fit_types:
+        fit_channels = set(store.channels(fit))
+        for ch in avail_channels:
+            if ch not in fit_channels:
+                continue
+            records = store.channel(fit, ch)
+            for k in sample_keys:
+                if "total" in k:  # Sum only TH1s, data is black anyway
+                    continue
+                record = records.get(k)
+                if record is not None and record.kind == "TH1":
+                    yield_dict[k] += sum(record.values)
+                    linearity_scores[k].append(linearity(record.values))
+
+    # pad 0 to prevent mean on empty list
+    linearity_dict = {k: np.mean(linearity_scores[k] + [0]) for k in sample_keys}
     sort_score_dicts = {}
     for k, v in yield_dict.items():
         if sort_peaky:
@@ -368,9 +374,11 @@ def format_categories(cats: list[str], n: int = 2) -> str:
 
 # fitDiag extraction
 def get_fit_val(fitDiag: "Any", val: str, fittype: str = "fit_s", substitute: float = 1.0) -> float:
-    """Extract a float parameter value from the fitDiagnostics file."""
+    """Extract a float parameter value from the fitDiagnostics file (ROOT ``TFile`` or ``FitResultTable``)."""
     if fitDiag is None:
         return substitute
+    if isinstance(fitDiag, FitResultTable):
+        return fitDiag.value(val, fittype=fittype, substitute=substitute)
     if val in fitDiag.Get(fittype).floatParsFinal().contentsString().split(","):
         return fitDiag.Get(fittype).floatParsFinal().find(val).getVal()
     else:
@@ -381,9 +389,11 @@ def get_fit_val(fitDiag: "Any", val: str, fittype: str = "fit_s", substitute: fl
 def get_fit_unc(
     fitDiag: "Any", val: str, fittype: str = "fit_s", substitute: tuple[float, float] = (0.0, 0.0)
 ) -> tuple[float, float]:
-    """Extract a parameter uncertainty (lo, hi) from the fitDiagnostics file."""
+    """Extract a parameter uncertainty (lo, hi) from the fitDiagnostics file (ROOT ``TFile`` or ``FitResultTable``)."""
     if fitDiag is None:
         return substitute
+    if isinstance(fitDiag, FitResultTable):
+        return fitDiag.unc(val, fittype=fittype, substitute=substitute)
     if val in fitDiag.Get(fittype).floatParsFinal().contentsString().split(","):
         rval = fitDiag.Get(fittype).floatParsFinal().find(val)
         if rval.hasAsymError():
@@ -470,8 +480,15 @@ def geths(
         return {name: geth(name, channels, restoreNorm=restoreNorm) for name in names}
 
 
-def merge_hists(hist_dict: dict[str, hist.Hist], merge_map: dict[str, list[str]]) -> dict[str, hist.Hist]:
-    """Merge histograms according to the map {new_key: [old_keys...]}."""
+def merge_hists(
+    hist_dict: dict[str, hist.Hist | Shape1D],
+    merge_map: dict[str, list[str]],
+    merged: dict[str, hist.Hist | Shape1D] | None = None,
+) -> dict[str, hist.Hist | Shape1D]:
+    """Merge histograms (``hist.Hist`` or ``Shape1D``) according to the map {new_key: [old_keys...]}.
+
+    ``merged`` can provide precomputed merges (e.g. ``PartialSum.merged_shapes``) used instead of summing.
+    """
     for k, v in merge_map.items():
         if k in hist_dict and k != v[0]:
             logging.warning(f"  Mapping `'{k}' : {v}` will replace existing histogram: '{k}'.")
@@ -484,12 +501,53 @@ def merge_hists(hist_dict: dict[str, hist.Hist], merge_map: dict[str, list[str]]
             else:
                 to_merge.append(hist_dict[name])
         if len(to_merge) > 0:
-            hist_dict[k] = sum(to_merge)
+            hist_dict[k] = merged[k] if merged is not None and k in merged else sum(to_merge)
         else:
             logging.warning(f"  No histograms available for merge {v} -> '{k}'.")
     return hist_dict
 
 
+COVERAGE_1SD = scipy.stats.norm.cdf(1) - scipy.stats.norm.cdf(-1)
+# Integer counts up to this many events read their Poisson interval from a precomputed table
+POISSON_TABLE_SIZE = 10_000
+
+
+def _garwood(counts: np.ndarray, coverage: float) -> np.ndarray:
+    """Garwood interval ``(2, n)`` of unweighted ``counts`` (as ``mplhep``'s ``poisson_interval``)."""
+    lo = scipy.stats.chi2.ppf((1 - coverage) / 2, 2 * counts) / 2.0
+    hi = scipy.stats.chi2.ppf((1 + coverage) / 2, 2 * (counts + 1)) / 2.0
+    interval = np.array([lo, hi])
+    interval[np.isnan(interval)] = 0.0  # chi2.ppf produces nan for counts=0
+    return interval
+
+
+@functools.lru_cache(maxsize=4)
+def _poisson_table(size: int, coverage: float) -> np.ndarray:
+    table = _garwood(np.arange(size + 1, dtype=float), coverage)
+    table.flags.writeable = False
+    return table
+
+
+def poisson_interval(
+    sumw: np.ndarray, sumw2: np.ndarray, coverage: float = COVERAGE_1SD, size: int = POISSON_TABLE_SIZE
+) -> np.ndarray:
+    """Drop-in for ``mplhep.error_estimation.poisson_interval`` with a lookup table for unweighted data.
+
+    Integer counts up to ``size`` are read from a memoized table of the Garwood interval, other
+    unweighted counts are evaluated directly. Weighted data (``sumw2 != sumw``, including blinded
+    NaN bins) and histograms without any events fall back to ``mplhep``.
+    """
+    sumw, sumw2 = np.asarray(sumw, dtype=float), np.asarray(sumw2, dtype=float)
+    if sumw.ndim != 1 or not np.array_equal(sumw, sumw2) or not np.any(sumw) or np.any(sumw < 0):
+        return error_estimation.poisson_interval(sumw, sumw2, coverage)
+    tabulated = (sumw <= size) & (sumw == np.floor(sumw))
+    interval = np.empty((2, len(sumw)))
+    interval[:, tabulated] = _poisson_table(size, coverage)[:, sumw[tabulated].astype(int)]
+    if not tabulated.all():
+        interval[:, ~tabulated] = _garwood(sumw[~tabulated], coverage)
+    return interval
+
+
 def _string_to_slice(s: str) -> slice:
     """Convert string "start:stop:step" to slice object (supports complex for value-based)."""
     parts = s.split(":")
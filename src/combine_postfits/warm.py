@@ -0,0 +1,11 @@
+"""Worker template for ``--start-method forkserver``.
+
+Preloaded by the forkserver, so every worker forked from it starts with matplotlib, mplhep,
+scipy and the CMS style imported and the font/mathtext caches filled.
+"""
+
+import scipy.stats  # noqa: F401
+
+from .make_plots import warm_up
+
+warm_up()
@@ -10,6 +10,8 @@ from pathlib import Path
 import matplotlib.pyplot as plt
 import uproot
 
+from combine_postfits.shapes import ShapeStore
+
 # Zero tolerance for publication-quality visual regression.
 # DO NOT CHANGE without team review.
 VISUAL_TOLERANCE = 0
@@ -24,6 +26,20 @@ def fitdiag_A():
     return uproot.open(FITDIAGS / "fit_diag_A.root")
 
 
+@pytest.fixture(scope="session")
+def shapes_A(fitdiag_A):
+    """ShapeStore of test case A (all fit types), decoded once per session"""
+    return ShapeStore.from_file(fitdiag_A)
+
+
+@pytest.fixture
+def store_A(shapes_A):
+    """ShapeStore of test case A, with the caches filled by tests (sums, chi2 terms, overall covariance) emptied"""
+    for cache in (shapes_A.sums, shapes_A.chi2, shapes_A.overall_covar):
+        cache.clear()
+    return shapes_A
+
+
 @pytest.fixture(scope="session")
 def fitdiag_Abig():
     """fitDiagnostics file for test case Abig"""
@@ -6,19 +6,40 @@ Tests the combine_postfits CLI argument parsing to verify:
 - Proper error handling for invalid inputs
 """
 
+import json
+import os
+import shutil
 import sys
+import time
 from collections import namedtuple
 from pathlib import Path
 from unittest.mock import patch
 
 import matplotlib.pyplot as plt
+import numpy as np
 import pytest
 
 from combine_postfits import make_plots
+from combine_postfits.costmodel import TimingLog
 
 TESTS_DIR = Path(__file__).parent.parent
 FITDIAGS = TESTS_DIR / "fitDiags"
 
+FAULTY_CAT = "ptbin1passhighbvl"  # Category failing on its first attempt in the retry tests
+SHORT_DEADLINE = 3  # Seconds given to that first attempt, the other plots keep their own deadline
+
+
+def short_first_deadline(timeout, shortened):
+    """Wrap a task deadline so only the first attempt of ``FAULTY_CAT`` (recorded in ``shortened``) is stopped early."""
+
+    def wrapped(task):
+        if task.savename == FAULTY_CAT and not shortened:
+            shortened.append(task)
+            return SHORT_DEADLINE
+        return timeout(task)
+
+    return wrapped
+
 
 # Mimic subprocess.CompletedProcess
 CompletedProcess = namedtuple("CompletedProcess", ["returncode", "stdout", "stderr"])
@@ -266,6 +287,153 @@ class TestCLIArgParsing:
         )
         assert result.returncode == 0, f"stderr: {result.stderr}"
 
+    def test_summary(self, tmp_path, capsys):
+        """--summary should write the goodness-of-fit table and figure, leaving out blinded categories."""
+        result = self.run_cli(
+            [
+                "combine_postfits",
+                "-i",
+                str(FITDIAGS / "fit_diag_B.root"),
+                "-o",
+                str(tmp_path / "out"),
+                "--data",
+                "--unblind",
+                "--blind",
+                "ptbin0fail",
+                "--cats",
+                "ptbin0fail,ptbin0passhighbvl,ptbin1passhighbvl",
+                "--noroot",
+                "--fit",
+                "prefit",
+                "--dpi",
+                "72",
+                "--summary",
+            ],
+            capsys,
+        )
+        assert result.returncode == 0, f"stderr: {result.stderr}"
+        summary = json.loads((tmp_path / "out" / "gof_summary.json").read_text())
+        assert [c["category"] for c in summary["categories"]] == ["ptbin0passhighbvl", "ptbin1passhighbvl"]
+        assert summary["summary"]["n_pulls"] == sum(c["n_pulls"] for c in summary["categories"])
+        assert (tmp_path / "out" / "gof_summary.csv").exists()
+        assert (tmp_path / "out" / "gof_summary.png").exists()
+
+    def test_worker_failures_reported(self, tmp_path, capsys, caplog):
+        """Plots failing in pool workers are reported back and make the run fail."""
+
+        def fail(*args, **kwargs):
+            raise RuntimeError("plotting failed")
+
+        cats = "ptbin0passhighbvl,ptbin1passhighbvl"
+        base = ["combine_postfits", "-i", str(FITDIAGS / "fit_diag_B.root"), "--MC", "--noroot", "--fit", "prefit"]
+        base += ["--dpi", "72", "--cats", cats, "-p", "2", "-o", str(tmp_path / "out")]
+        with patch.object(make_plots.plot_postfits, "plot", fail):
+            result = self.run_cli(base, capsys)
+        assert result.returncode == 1
+        assert "2 plot(s) failed" in caplog.text
+        assert "Retried 2 plot(s): 0 recovered, 2 still failing" in caplog.text
+
+    @pytest.mark.parametrize("fault", ["hang", "crash"])
+    def test_stuck_workers_retried(self, tmp_path, capsys, caplog, fault):
+        """A plot whose worker hangs or dies is retried in a fresh worker, the other plots unaffected."""
+        plot = make_plots.plot_postfits.plot
+        marker = tmp_path / "faulted"
+
+        def faulty(store, config, *args, **kwargs):
+            try:  # Only the first attempt of the faulty plot, in whichever worker
+                if FAULTY_CAT not in config.cats:
+                    raise FileExistsError
+                os.close(os.open(marker, os.O_CREAT | os.O_EXCL))
+            except FileExistsError:
+                return plot(store, config, *args, **kwargs)
+            if fault == "hang":
+                time.sleep(600)
+            os._exit(1)
+
+        shortened = []
+
+        class Watchdog(make_plots.Watchdog):
+            def __init__(self, events, timeout):
+                super().__init__(events, short_first_deadline(timeout, shortened))
+
+        cats = "ptbin0passhighbvl,ptbin1passhighbvl,ptbin2passhighbvl"
+        base = ["combine_postfits", "-i", str(FITDIAGS / "fit_diag_B.root"), "--MC", "--noroot", "--fit", "prefit"]
+        base += ["--dpi", "72", "--cats", cats, "-p", "2", "-o", str(tmp_path / "out")]
+        with patch.object(make_plots.plot_postfits, "plot", faulty), patch.object(make_plots, "Watchdog", Watchdog):
+            result = self.run_cli(base, capsys)
+        assert result.returncode == 0, f"stderr: {result.stderr}"
+        assert len(list((tmp_path / "out" / "prefit").glob("*.png"))) == 3
+        assert "Retried 1 plot(s): 1 recovered" in caplog.text
+        assert (f"Timed out after {SHORT_DEADLINE}s" if fault == "hang" else "died") in result.stdout
+        assert caplog.text.count("stopping worker") == (fault == "hang")
+
+    @pytest.mark.parametrize("fault", ["hang", "error"])
+    def test_serial_failures_retried(self, tmp_path, capsys, caplog, fault):
+        """With -p 0, a plot that hangs or raises is stopped and retried in-process, the other plots unaffected."""
+        plot = make_plots.plot_postfits.plot
+        faulted = []
+
+        def faulty(store, config, *args, **kwargs):
+            if faulted or FAULTY_CAT not in config.cats:
+                return plot(store, config, *args, **kwargs)
+            faulted.append(True)
+            if fault == "hang":
+                time.sleep(600)
+            raise RuntimeError("plotting failed")
+
+        attempt = make_plots.attempt
+        timeout = short_first_deadline(lambda task: np.inf, [])
+
+        def short_attempt(task, plot, seconds=np.inf):
+            return attempt(task, plot, min(seconds, timeout(task)))
+
+        cats = "ptbin0passhighbvl,ptbin1passhighbvl,ptbin2passhighbvl"
+        base = ["combine_postfits", "-i", str(FITDIAGS / "fit_diag_B.root"), "--MC", "--noroot", "--fit", "prefit"]
+        base += ["--dpi", "72", "--cats", cats, "-p", "0", "-o", str(tmp_path / "out")]
+        with patch.object(make_plots.plot_postfits, "plot", faulty), patch.object(make_plots, "attempt", short_attempt):
+            result = self.run_cli(base, capsys)
+        assert result.returncode == 0, f"stderr: {result.stderr}"
+        assert len(list((tmp_path / "out" / "prefit").glob("*.png"))) == 3
+        assert "Retrying 1 plot(s) serially" in caplog.text
+        assert "Retried 1 plot(s): 1 recovered" in caplog.text
+        assert (
+            f"Timed out after {SHORT_DEADLINE}s" if fault == "hang" else "plotting failed"
+        ) in caplog.text + result.stdout
+        assert caplog.text.count("stopped: Timed out") == (fault == "hang")
+
+    def test_cache_hit_skips_file(self, tmp_path, capsys):
+        """A second run with --cache-dir takes shapes and fit results from the cache, without opening the file."""
+        base = ["combine_postfits", "-i", str(FITDIAGS / "fit_diag_B.root"), "--MC", "--noroot", "--fit", "fit_s"]
+        base += ["--dpi", "72", "--cats", "ptbin0passhighbvl", "--cache-dir", str(tmp_path / "cache")]
+        result = self.run_cli(base + ["-o", str(tmp_path / "first")], capsys)
+        assert result.returncode == 0, f"stderr: {result.stderr}"
+
+        def no_open(*args, **kwargs):
+            raise AssertionError("input file opened on a cache hit")
+
+        with patch.object(make_plots.uproot, "open", no_open):
+            result = self.run_cli(base + ["-o", str(tmp_path / "second")], capsys)
+        assert result.returncode == 0, f"stderr: {result.stderr}"
+        assert (tmp_path / "second" / "fit_s" / "ptbin0passhighbvl_fit_s.png").exists()
+
+    def test_plan_and_timings(self, tmp_path, capsys):
+        """--plan reports estimates without plotting; runs record timings that calibrate later plans."""
+        base = ["combine_postfits", "-i", str(FITDIAGS / "fit_diag_B.root"), "--MC", "--noroot", "--fit", "prefit"]
+        base += ["--dpi", "72", "--cats", "ptbin0*", "-o", str(tmp_path / "out")]
+        base += ["--timings", str(tmp_path / "timings.json")]
+        result = self.run_cli(base + ["--plan", "-p", "2"], capsys)
+        assert result.returncode == 0, f"stderr: {result.stderr}"
+        assert "Estimated wall time" in result.stdout and "default estimates" in result.stdout
+        assert not (tmp_path / "out").exists() and not (tmp_path / "timings.json").exists()
+
+        result = self.run_cli(base + ["-p", "2"], capsys)
+        assert result.returncode == 0, f"stderr: {result.stderr}"
+        n_plots = len(list((tmp_path / "out" / "prefit").glob("*.png")))
+        features, seconds = TimingLog(tmp_path / "timings.json").load()
+        assert len(seconds) == n_plots > 1 and np.all(seconds > 0)
+        result = self.run_cli(base + ["--plan"], capsys)
+        assert f"calibrated on {n_plots} recorded timings" in result.stdout
+
 
 class TestCLIErrorPaths:
     """Test CLI handles error conditions gracefully."""
@@ -365,3 +533,171 @@ class TestCLIErrorPaths:
         ):
             with pytest.raises(SystemExit):
                 make_plots.main()
+
+
+class TestCLIBatch:
+    """Test plotting several fitDiagnostics files in one invocation."""
+
+    CATS = "ptbin0passhighbvl"
+
+    def run_cli(self, args, capsys):
+        """Run the CLI in-process."""
+        with patch.object(sys, "argv", args):
+            try:
+                make_plots.main()
+                returncode = 0
+            except SystemExit as e:
+                returncode = e.code if e.code is not None else 0
+            finally:
+                plt.close("all")
+        captured = capsys.readouterr()
+        return CompletedProcess(returncode, captured.out, captured.err)
+
+    def base_args(self, inputs, output):
+        return ["combine_postfits", "-i", *inputs, "-o", output] + [
+            "--MC",
+            "--noroot",
+            "--fit",
+            "prefit",
+            "--dpi",
+            "72",
+            "--cats",
+            self.CATS,
+        ]
+
+    def test_glob_input(self, tmp_path, capsys, monkeypatch):
+        """A glob over several files plots each into its own '<output>/<stem>' folder."""
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / "fits").mkdir()
+        for mass in ["m100", "m200"]:
+            shutil.copy(FITDIAGS / "fit_diag_B.root", tmp_path / "fits" / f"{mass}.root")
+        result = self.run_cli(self.base_args([str(tmp_path / "fits" / "*.root")], str(tmp_path / "out")), capsys)
+        assert result.returncode == 0, f"stderr: {result.stderr}"
+        for mass in ["m100", "m200"]:
+            assert (tmp_path / "out" / mass / "prefit" / f"{self.CATS}_prefit.png").exists()
+
+    def test_file_list_with_template(self, tmp_path, capsys, monkeypatch):
+        """'@list.txt' inputs with a '{parent}' output template."""
+        monkeypatch.chdir(tmp_path)
+        inputs = []
+        for year in ["2016", "2017"]:
+            (tmp_path / year).mkdir()
+            inputs.append(tmp_path / year / "fitDiagnosticsTest.root")
+            shutil.copy(FITDIAGS / "fit_diag_B.root", inputs[-1])
+        (tmp_path / "inputs.txt").write_text("\n".join(str(p) for p in inputs) + "\n")
+        result = self.run_cli(self.base_args(["@inputs.txt"], str(tmp_path / "out" / "{parent}")), capsys)
+        assert result.returncode == 0, f"stderr: {result.stderr}"
+        for year in ["2016", "2017"]:
+            assert (tmp_path / "out" / year / "prefit" / f"{self.CATS}_prefit.png").exists()
+
+    def test_clashing_outputs(self, tmp_path, capsys, monkeypatch):
+        """Inputs sharing a file name need a template that tells them apart."""
+        monkeypatch.chdir(tmp_path)
+        inputs = []
+        for year in ["2016", "2017"]:
+            (tmp_path / year).mkdir()
+            inputs.append(str(tmp_path / year / "fitDiagnosticsTest.root"))
+            shutil.copy(FITDIAGS / "fit_diag_B.root", inputs[-1])
+        result = self.run_cli(self.base_args(inputs, str(tmp_path / "out")), capsys)
+        assert result.returncode != 0
+        assert "{parent}" in result.stderr
+
+
+class TestCLIStreaming:
+    """`--max-memory` should produce the same plots as loading the whole file."""
+
+    def test_matches_full_load(self, tmp_path, capsys, monkeypatch):
+        from matplotlib.testing.compare import compare_images
+
+        monkeypatch.chdir(tmp_path)
+        base = ["combine_postfits", "-i", str(FITDIAGS / "fit_diag_B.root"), "--MC", "--noroot"]
+        base += ["--fit", "prefit", "--dpi", "72", "--cats", "ptbin0*"]
+        runs = {"full": [], "streamed": ["--max-memory", "0.2", "-p", "2"], "serial": ["--max-memory", "0.2"]}
+        for name, extra in runs.items():
+            with patch.object(sys, "argv", base + ["-o", str(tmp_path / name)] + extra):
+                make_plots.main()
+            plt.close("all")
+        images = sorted(p.name for p in (tmp_path / "full" / "prefit").glob("*.png"))
+        assert len(images) > 1
+        for name in ["streamed", "serial"]:
+            assert images == sorted(p.name for p in (tmp_path / name / "prefit").glob("*.png"))
+            for image in images:
+                assert (
+                    compare_images(
+                        str(tmp_path / "full" / "prefit" / image), str(tmp_path / name / "prefit" / image), tol=0
+                    )
+                    is None
+                )
+
+    @pytest.mark.parametrize("workers", ["0", "2"])
+    def test_channels_read_once(self, tmp_path, workers):
+        """Sums, chi2 and summary rows are computed by the plots: each channel is read once, by whoever plots it."""
+        from combine_postfits.shapes import ShapeStore
+
+        read, parent = [], os.getpid()
+        _read = ShapeStore._read
+
+        def counting_read(index, items, executor=None):
+            if os.getpid() == parent:  # Forked workers append to their own copy
+                read.extend(dict.fromkeys((fit_type, channel) for fit_type, channel, _, _ in items))
+            return _read(index, items, executor=executor)
+
+        base = ["combine_postfits", "-i", str(FITDIAGS / "fit_diag_B.root"), "--MC", "--noroot", "--fit", "prefit"]
+        base += ["--dpi", "72", "--cats", "ptbin0*", "--chi2", "--summary", "-o", str(tmp_path / "out")]
+        base += ["--style", str(TESTS_DIR / "styles" / "style_B.yml"), "--max-memory", "100", "-p", workers]
+        with patch.object(ShapeStore, "_read", staticmethod(counting_read)), patch.object(sys, "argv", base):
+            make_plots.main()
+        plt.close("all")
+        summary = json.loads((tmp_path / "out" / "gof_summary.json").read_text())
+        categories = [c["category"] for c in summary["categories"]]
+        assert len(categories) > 1 and all(c["chi2"] > 0 for c in summary["categories"])
+        if workers == "0":
+            assert sorted(read) == sorted(set(read)) and len(set(read)) == len(categories)
+        else:
+            assert read == []  # The parent only hands out tasks
+
+    def test_prefetch_within_budget(self, fitdiag_A):
+        """Channels are read ahead of rendering, but only as far as the budget allows."""
+        from combine_postfits.shapes import ShapeStore
+
+        store = ShapeStore.stream(fitdiag_A, max_bytes=0)
+        channels = store.channels("prefit")[:4]
+        budget = 2 * max(store.estimate_nbytes("prefit", ch) for ch in channels)
+        store.max_bytes = budget
+        plot_inputs = {"A": make_plots.PlotInput(Path("A"), Path("."), store, None)}
+        tasks = [
+            make_plots.PlotTask("prefit", [ch], False, ch, None, None, source="A") for ch in channels + channels[:1]
+        ]
+        scheduler = make_plots.ChannelScheduler(plot_inputs, tasks)
+        with make_plots.Prefetcher(scheduler, [[task] for task in tasks], depth=3) as prefetcher:
+            for (task,) in prefetcher:
+                assert all(ch in store.shapes["prefit"] for ch in task.channels)
+                assert store.pinned_nbytes <= budget
+                prefetcher.release([task])
+        assert store.pinned_nbytes == 0
+        assert store.nbytes == 0  # Dropped once no task needs them
+
+
+class TestCLIStartMethods:
+    """Workers started with forkserver/spawn (inputs pickled) should produce the same plots as forked ones."""
+
+    @pytest.mark.parametrize("start_method", ["forkserver", "spawn"])
+    def test_matches_fork(self, tmp_path, start_method):
+        from matplotlib.testing.compare import compare_images
+
+        base = ["combine_postfits", "-i", str(FITDIAGS / "fit_diag_B.root"), "--MC", "--noroot", "--fit", "prefit"]
+        base += ["--dpi", "72", "--cats", "ptbin0fail,ptbin0passhighbvl", "-p", "2"]
+        for name in ["fork", start_method]:
+            with patch.object(sys, "argv", base + ["-o", str(tmp_path / name), "--start-method", name]):
+                make_plots.main()
+            plt.close("all")
+        images = sorted(p.name for p in (tmp_path / "fork" / "prefit").glob("*.png"))
+        assert images == sorted(p.name for p in (tmp_path / start_method / "prefit").glob("*.png"))
+        assert len(images) == 2
+        for image in images:
+            assert (
+                compare_images(
+                    str(tmp_path / "fork" / "prefit" / image), str(tmp_path / start_method / "prefit" / image), tol=0
+                )
+                is None
+            )
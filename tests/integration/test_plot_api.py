@@ -10,6 +10,7 @@ from pathlib import Path
 import matplotlib.pyplot as plt
 import pytest
 
+from combine_postfits.fitresult import FitParam, FitResultTable
 from combine_postfits.plot_postfits import plot
 
 TESTS_DIR = Path(__file__).parent.parent
@@ -295,6 +296,20 @@ class TestPlotWithStyle:
         )
         assert fig is not None
 
+    def test_with_fit_result_table(self, fitdiag_A, minimal_style):
+        """plot() should draw signal strengths from a pre-extracted FitResultTable."""
+        table = FitResultTable({"fit_s": {"r": FitParam(1.23, 0.3, -0.25, 0.35)}})
+        fig, (ax, _) = plot(
+            fitdiag_A,
+            fit_type="fit_s",
+            cats=["ptbin0pass2016"],
+            sigs=["total_signal"],
+            rmap={"total_signal": "r"},
+            fitDiag_root=table,
+            style=minimal_style,
+        )
+        assert any("1.23" in t.get_text() for t in ax.texts)
+
 
 class TestPlotBlindData:
     """Test blind_data parameter for data masking."""
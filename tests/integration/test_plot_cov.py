@@ -1,8 +1,8 @@
 # tests/integration/test_plot_cov.py
 """Integration tests for plot_cov module.
 
-These tests require native ROOT and are marked accordingly.
-They are excluded from the default test run; use `pixi run test-root` to include them.
+The correlation matrix is read with uproot, so these run without ROOT. Only the
+ROOT fallback test is marked `root` (run with `pixi run test-root`).
 """
 
 import shutil
@@ -29,7 +29,6 @@ def cleanup_plots():
     plt.close("all")
 
 
-@pytest.mark.root
 class TestPlotCov:
     """Test plot_cov() function."""
 
@@ -86,13 +85,31 @@ class TestPlotCov:
         ax = plot_cov(str(FITDIAGS / "fit_diag_A.root"), fit_type="fit_b")
         assert ax is not None
 
+    @pytest.mark.root
+    def test_root_fallback_matches(self, monkeypatch):
+        """The ROOT fallback should produce the same matrix as the uproot reader."""
+        import uproot
+
+        from combine_postfits.fitresult import FitResultTable
+        from combine_postfits.plot_cov import plot_cov
+
+        include = ["r", "z", "tqq*"]
+        ax = plot_cov(str(FITDIAGS / "fit_diag_A.root"), fit_type="fit_s", include=include, exclude=None)
+        expected = ax.collections[0].get_array()
+
+        def fail(*args, **kwargs):
+            raise uproot.DeserializationError("forced", None, None, {}, None)
+
+        monkeypatch.setattr(FitResultTable, "from_uproot", fail)
+        ax = plot_cov(str(FITDIAGS / "fit_diag_A.root"), fit_type="fit_s", include=include, exclude=None)
+        assert (ax.collections[0].get_array() == expected).all()
+
 
 BASELINE_DIR = TESTS_DIR / "baseline" / "cov"
 OUTS_DIR = TESTS_DIR / "outs" / "cov"
 FAILED_DIR = TESTS_DIR / "failed" / "cov"
 
 
-@pytest.mark.root
 @pytest.mark.visual
 class TestPlotCovVisual:
     """Visual regression tests for plot_cov()."""
@@ -132,7 +149,6 @@ class TestPlotCovVisual:
             pytest.fail(f"Visual mismatch: {diff}")
 
 
-@pytest.mark.root
 class TestCovCLI:
     """CLI-level tests for combine_postfits_cov binary."""
 
@@ -0,0 +1,146 @@
+"""Unit tests for the persistent on-disk shape cache."""
+
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pytest
+import uproot
+
+from combine_postfits.cache import ShapeCache
+from combine_postfits.chi2 import OverallCovariance
+from combine_postfits.fitresult import FitResultTable
+from combine_postfits.shapes import ShapeStore
+
+TESTS_DIR = Path(__file__).parent.parent
+FITDIAGS = TESTS_DIR / "fitDiags"
+
+
+@pytest.fixture
+def fitdiag_copy(tmp_path):
+    """Writable copy of the smallest test file, so mtime/content can be changed."""
+    path = tmp_path / "fit_diag_C.root"
+    shutil.copy(FITDIAGS / "fit_diag_C.root", path)
+    return path
+
+
+class CountingBuilder:
+    def __init__(self, path):
+        self.path = path
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        with uproot.open(self.path) as fd:
+            return ShapeStore.from_file(fd), FitResultTable.from_file(fd, use_root=False)
+
+
+def assert_stores_equal(a, b):
+    assert a.fit_types == b.fit_types
+    for fit_type in a.fit_types:
+        assert a.channels(fit_type) == b.channels(fit_type)
+        for channel in a.channels(fit_type):
+            ra, rb = a.channel(fit_type, channel), b.channel(fit_type, channel)
+            assert list(ra) == list(rb)
+            for name in ra:
+                assert ra[name].kind == rb[name].kind
+                assert ra[name].label == rb[name].label
+                assert ra[name].poisson == rb[name].poisson
+                np.testing.assert_array_equal(ra[name].values, rb[name].values)
+                np.testing.assert_array_equal(ra[name].variances, rb[name].variances)
+                np.testing.assert_array_equal(ra[name].edges, rb[name].edges)
+
+
+class TestPackUnpack:
+    def test_roundtrip(self, fitdiag_A):
+        store = ShapeStore.from_file(fitdiag_A, fit_types=["fit_s"])
+        layout, buffer = store.pack()
+        assert buffer.dtype == np.float64 and buffer.ndim == 1
+        assert_stores_equal(store, ShapeStore.unpack(layout, buffer))
+
+
+class TestShapeCache:
+    def test_second_load_hits_cache(self, tmp_path, fitdiag_copy):
+        cache = ShapeCache(tmp_path / "cache")
+        build = CountingBuilder(fitdiag_copy)
+        first, first_results = cache.get_or_build(fitdiag_copy, build)
+        second, second_results = cache.get_or_build(fitdiag_copy, build)
+        assert build.calls == 1
+        assert_stores_equal(first, second)
+        assert second_results.params == first_results.params
+        for fit_type, correlation in first_results.correlations.items():
+            np.testing.assert_array_equal(second_results.correlations[fit_type], correlation)
+        # Served from a memory map
+        record = next(iter(second.channel("prefit", second.channels("prefit")[0]).values()))
+        assert isinstance(record.values.base, np.memmap) or isinstance(record.values, np.memmap)
+
+    def test_touch_without_change_reuses_entry(self, tmp_path, fitdiag_copy):
+        cache = ShapeCache(tmp_path / "cache")
+        build = CountingBuilder(fitdiag_copy)
+        cache.get_or_build(fitdiag_copy, build)
+        st = fitdiag_copy.stat()
+        os.utime(fitdiag_copy, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        cache.get_or_build(fitdiag_copy, build)
+        # mtime changed but content didn't: re-hashed, but not rebuilt
+        assert build.calls == 1
+
+    def test_content_change_invalidates(self, tmp_path, fitdiag_copy):
+        cache = ShapeCache(tmp_path / "cache")
+        build = CountingBuilder(fitdiag_copy)
+        digest = cache.digest(fitdiag_copy)
+        cache.get_or_build(fitdiag_copy, build)
+        shutil.copy(FITDIAGS / "fit_diag_D.root", fitdiag_copy)
+        cache.get_or_build(fitdiag_copy, build)
+        assert build.calls == 2
+        assert cache.digest(fitdiag_copy) != digest
+
+    def test_outdated_entry_replaced(self, tmp_path, fitdiag_copy, caplog):
+        cache = ShapeCache(tmp_path / "cache")
+        build = CountingBuilder(fitdiag_copy)
+        digest = cache.digest(fitdiag_copy)
+        cache.get_or_build(fitdiag_copy, build)
+        layout = cache.cache_dir / digest / "layout.json"
+        meta = json.loads(layout.read_text())
+        layout.write_text(json.dumps({**meta, "version": meta["version"] - 1}))
+        cache.get_or_build(fitdiag_copy, build)
+        cache.get_or_build(fitdiag_copy, build)
+        # Rebuilt once, written over the outdated entry and hit from then on
+        assert build.calls == 2
+        assert json.loads(layout.read_text())["version"] == meta["version"]
+        assert "Could not write cache entry" not in caplog.text
+        assert not [entry for entry in cache.cache_dir.iterdir() if entry.name.startswith(".")]
+
+    def test_lru_eviction(self, tmp_path, fitdiag_copy):
+        cache = ShapeCache(tmp_path / "cache")
+        first = cache.digest(fitdiag_copy)
+        cache.get_or_build(fitdiag_copy, CountingBuilder(fitdiag_copy))
+        other = tmp_path / "fit_diag_D.root"
+        shutil.copy(FITDIAGS / "fit_diag_D.root", other)
+        # Limit the cache to (roughly) a single entry
+        cache.max_bytes = 1
+        cache.get_or_build(other, CountingBuilder(other))
+        assert not (cache.cache_dir / first).exists()
+        assert (cache.cache_dir / cache.digest(other)).exists()
+        # The evicted entry's lookup key went with it
+        assert list(cache._read_lookup().values()) == [cache.digest(other)]
+
+    def test_overall_covariance(self, tmp_path, fitdiag_copy):
+        cache = ShapeCache(tmp_path / "cache")
+        store, _ = CountingBuilder(fitdiag_copy)()
+        channels = store.channels("fit_s")[:2]
+        nbins = [len(store.record("fit_s", ch, "total").values) for ch in channels]
+        matrix = np.diag(np.arange(1.0, sum(nbins) + 1))
+        store.overall_covar["fit_s"] = OverallCovariance.from_labels(
+            matrix, [f"{ch}_{b}" for ch, n in zip(channels, nbins) for b in range(n)]
+        )
+        digest = cache.digest(fitdiag_copy)
+        cache.save(digest, store, None)
+        loaded, fit_results = cache.load(digest)
+        assert fit_results is None
+        overall = loaded.overall_covar["fit_s"]
+        np.testing.assert_array_equal(overall.matrix, matrix)
+        assert overall.rows.keys() == store.overall_covar["fit_s"].rows.keys()
+        for channel, rows in store.overall_covar["fit_s"].rows.items():
+            np.testing.assert_array_equal(overall.rows[channel], rows)
@@ -0,0 +1,200 @@
+"""Unit tests for the Cholesky-based chi2 engine."""
+
+import numpy as np
+import pytest
+import uproot
+from scipy.linalg import solve_triangular
+
+from combine_postfits.chi2 import (
+    OVERALL_COVAR,
+    POISSON_MAX_MEAN,
+    OverallCovariance,
+    channel_chi2,
+    channel_toys,
+    group_chi2,
+    solve_chi2,
+    toy_chi2,
+    toy_pvalue,
+)
+from combine_postfits.shapes import ShapeStore
+
+
+def _inv_chi2(store, channel):
+    data = store.get_shape("fit_s", channel, "data")
+    tot = store.get_shape("fit_s", channel, "total")
+    cov = store.record("fit_s", channel, "total_covar").values
+    mask = ~np.isclose(data.values(), 0, atol=1e-4)
+    diff = data.values()[mask] - tot.values()[mask]
+    return diff @ np.linalg.inv(cov[np.ix_(mask, mask)] + np.diag(data.variances()[mask])) @ diff
+
+
+class TestSolveChi2:
+    """Stacked Cholesky solves should match the explicit inverse."""
+
+    def test_matches_inverse(self):
+        rng = np.random.default_rng(1)
+        a = rng.normal(size=(5, 8, 8))
+        matrices = a @ a.transpose(0, 2, 1) + 8 * np.eye(8)
+        diffs = rng.normal(size=(5, 8))
+        chi2, clipped = solve_chi2(matrices, diffs)
+        ref = [d @ np.linalg.inv(m) @ d for m, d in zip(matrices, diffs)]
+        np.testing.assert_allclose(chi2, ref)
+        assert not clipped.any()
+
+    def test_non_positive_definite_falls_back(self):
+        good = np.diag([1.0, 2.0, 4.0])
+        bad = np.diag([1.0, 2.0, -1e-3])
+        diffs = np.ones((2, 3))
+        chi2, clipped = solve_chi2(np.stack([good, bad]), diffs)
+        assert list(clipped) == [False, True]
+        assert chi2[0] == pytest.approx(1.75)
+        assert chi2[1] == pytest.approx(1.5)  # the negative direction is dropped
+
+
+class TestChannelChi2:
+    """Per-channel terms should match the previous inverse-based computation and be cached."""
+
+    def test_matches_inverse(self, store_A):
+        channels = store_A.channels("fit_s")
+        terms = channel_chi2(store_A, "fit_s", channels)
+        for channel, term in zip(channels, terms):
+            assert term.chi2 == pytest.approx(_inv_chi2(store_A, channel))
+            assert not term.clipped
+
+    def test_cached(self, store_A):
+        channels = ["ptbin0pass2016", "ptbin1pass2016"]
+        first = channel_chi2(store_A, "fit_s", channels)
+        assert len(store_A.chi2) == 2
+        assert channel_chi2(store_A, "fit_s", channels[::-1]) == first[::-1]
+        blinded = channel_chi2(store_A, "fit_s", channels[:1], blind_slice=slice(0, 3))
+        assert blinded[0].nbins < first[0].nbins
+        assert len(store_A.chi2) == 3
+
+
+class TestOverallChi2:
+    """Group chi2 from overall_total_covar should include cross-channel correlations."""
+
+    CHANNELS = ["ptbin0pass2016", "ptbin1pass2016", "ptbin2pass2016"]
+
+    @pytest.fixture
+    def overall(self, store_A):
+        blocks = [store_A.record("fit_s", ch, "total_covar").values.astype(float) for ch in self.CHANNELS]
+        sizes = [len(b) for b in blocks]
+        matrix = np.zeros((sum(sizes), sum(sizes)))
+        labels = []
+        for i, (channel, block) in enumerate(zip(self.CHANNELS, blocks)):
+            lo = sum(sizes[:i])
+            matrix[lo : lo + len(block), lo : lo + len(block)] = block
+            labels += [f"{channel}_{b}" for b in range(len(block))]
+        return matrix, labels
+
+    def _with_overall(self, store, matrix, labels):
+        store.overall_covar["fit_s"] = OverallCovariance.from_labels(matrix, labels)
+        return store
+
+    def test_label_index(self, overall):
+        matrix, labels = overall
+        order = np.random.default_rng(2).permutation(len(labels))
+        cov = OverallCovariance.from_labels(matrix[np.ix_(order, order)], [labels[i] for i in order])
+        rows = cov.rows[self.CHANNELS[1]]
+        np.testing.assert_array_equal(order[rows], np.arange(len(rows)) + len(cov.rows[self.CHANNELS[0]]))
+
+    def test_unlabelled_rows_from_file_listing(self, tmp_path):
+        """Rows without labels map to all the channels of the file, whichever the store holds."""
+        sizes = {"chA": 2, "chB": 3, "chC": 1}
+        matrix = np.arange(36, dtype=float).reshape(6, 6)
+        with uproot.recreate(tmp_path / "unlabelled.root") as f:
+            for channel, n in sizes.items():
+                f[f"shapes_fit_s/{channel}/total"] = (np.ones(n), np.arange(n + 1.0))
+            f[f"shapes_fit_s/{OVERALL_COVAR}"] = (matrix, np.arange(7.0), np.arange(7.0))
+        with uproot.open(tmp_path / "unlabelled.root") as f:
+            store = ShapeStore.from_file(f, fit_types=["fit_s"], channels=["chB"])
+            cov = OverallCovariance.from_file(f, "fit_s", store)
+        np.testing.assert_array_equal(cov.matrix, matrix)
+        assert {ch: rows.tolist() for ch, rows in cov.rows.items()} == {"chA": [0, 1], "chB": [2, 3, 4], "chC": [5]}
+
+    def test_block_diagonal_matches_sum(self, store_A, overall):
+        self._with_overall(store_A, *overall)
+        term = group_chi2(store_A, "fit_s", self.CHANNELS)
+        per_channel = channel_chi2(store_A, "fit_s", self.CHANNELS)
+        assert term.chi2 == pytest.approx(sum(t.chi2 for t in per_channel))
+        assert term.nbins == sum(t.nbins for t in per_channel)
+
+    def test_correlations_and_nested_groups(self, fitdiag_A, store_A, overall):
+        matrix, labels = overall
+        u = 0.5 * np.sqrt(np.diag(matrix))
+        matrix = matrix + np.outer(u, u)
+        self._with_overall(store_A, matrix, labels)
+        small = group_chi2(store_A, "fit_s", self.CHANNELS[:2])
+        large = group_chi2(store_A, "fit_s", self.CHANNELS)
+        assert len(store_A.overall_covar["fit_s"]._factors) == 2
+        # Reference: explicit inverse over the concatenated masked bins, fresh store
+        fresh = ShapeStore.from_file(fitdiag_A, fit_types=["fit_s"])
+        rows, diffs, variances = [], [], []
+        cov = OverallCovariance.from_labels(matrix, labels)
+        for channel in self.CHANNELS:
+            data = fresh.get_shape("fit_s", channel, "data")
+            tot = fresh.get_shape("fit_s", channel, "total")
+            mask = ~np.isclose(data.values(), 0, atol=1e-4)
+            rows.append(cov.rows[channel][mask])
+            diffs.append((data.values() - tot.values())[mask])
+            variances.append(data.variances()[mask])
+        n = len(rows[0]) + len(rows[1])
+        rows, diff, variances = np.concatenate(rows), np.concatenate(diffs), np.concatenate(variances)
+        a = matrix[np.ix_(rows, rows)] + np.diag(variances)
+        assert large.chi2 == pytest.approx(diff @ np.linalg.inv(a) @ diff)
+        assert small.chi2 == pytest.approx(diff[:n] @ np.linalg.inv(a[:n, :n]) @ diff[:n])
+        assert large.chi2 != pytest.approx(sum(t.chi2 for t in channel_chi2(fresh, "fit_s", self.CHANNELS)))
+
+
+class TestToys:
+    """Toy chi2 distributions should follow the statistic of a consistent model and be reproducible."""
+
+    @pytest.mark.parametrize("mean", [2.0, 200.0])  # Poisson and Gaussian-limit bins
+    def test_consistent_model(self, mean):
+        rng = np.random.default_rng(3)
+        a = rng.normal(size=(30, 30))
+        cov = 0.05 * mean * (a @ a.T) / 30
+        expected = np.full(30, mean)
+        chol = np.linalg.cholesky(cov + np.diag(expected))
+        toys = toy_chi2(chol, expected, cov, expected, 4000, rng)
+        assert toys.shape == (4000,)
+        assert toys.mean() == pytest.approx(30, rel=0.05)
+
+    @pytest.mark.parametrize("poisson", [True, False])
+    def test_matches_direct_sampling(self, poisson):
+        """Same distribution as fluctuating, drawing and whitening every toy explicitly (in float64)."""
+        rng = np.random.default_rng(4)
+        n, ntoys = 30, 20000
+        a = rng.normal(size=(n, n))
+        expected = np.where(np.arange(n) % 3, 3.0, 300.0)  # Poisson and Gaussian-limit bins
+        cov = 0.1 * np.outer(np.sqrt(expected), np.sqrt(expected)) * (a @ a.T) / n
+        chol = np.linalg.cholesky(cov + np.diag(expected))
+        fluct = expected + rng.multivariate_normal(np.zeros(n), cov, size=ntoys)
+        if poisson:
+            low = expected < POISSON_MAX_MEAN
+            toys = np.where(low, 0, fluct + np.sqrt(expected) * rng.standard_normal((ntoys, n)))
+            toys[:, low] = rng.poisson(np.clip(fluct[:, low], 0, None))
+        else:
+            toys = fluct + np.sqrt(expected) * rng.standard_normal((ntoys, n))
+        y = solve_triangular(chol, (toys - expected).T, lower=True)
+        reference = np.sum(y**2, axis=0)
+        result = toy_chi2(chol, expected, cov, expected, ntoys, np.random.default_rng(5), poisson=poisson)
+        assert result.shape == (ntoys,)
+        quantiles = [0.05, 0.5, 0.95]
+        np.testing.assert_allclose(np.quantile(result, quantiles), np.quantile(reference, quantiles), rtol=0.03)
+
+    def test_seeded_and_cached(self, fitdiag_A, store_A):
+        channels = ["ptbin0pass2016", "ptbin1pass2016"]
+        first = channel_toys(store_A, "fit_s", channels, 200)
+        assert channel_toys(store_A, "fit_s", channels[::-1], 200)[0] is first[1]
+        fresh = ShapeStore.from_file(fitdiag_A, fit_types=["fit_s"])
+        np.testing.assert_array_equal(channel_toys(fresh, "fit_s", channels[1:], 200)[0], first[1])
+
+    def test_pvalue(self, store_A):
+        channels = ["ptbin0pass2016", "ptbin1pass2016"]
+        observed = sum(t.chi2 for t in channel_chi2(store_A, "fit_s", channels))
+        p_value = toy_pvalue(store_A, "fit_s", channels, observed, 500)
+        assert 0 <= p_value <= 1
+        assert toy_pvalue(store_A, "fit_s", channels, 0.0, 500) == 1
+        assert toy_pvalue(store_A, "fit_s", channels, np.inf, 500) == 0
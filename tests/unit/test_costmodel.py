@@ -0,0 +1,102 @@
+"""Unit tests for the plot cost model and longest-first scheduling."""
+
+import numpy as np
+import pytest
+
+from combine_postfits.costmodel import (
+    FEATURES,
+    CostModel,
+    TimingLog,
+    locality_batches,
+    lpt_order,
+    makespan,
+    peak_memory,
+    task_features,
+)
+from combine_postfits.shapes import ShapeStore
+
+PASS = ["ptbin0pass2016", "ptbin1pass2016", "ptbin2pass2016"]
+
+
+def _features(rng, n):
+    features = rng.uniform(0, 5, size=(n, len(FEATURES)))
+    features[:, 0] = 1
+    return features
+
+
+class TestFeatures:
+    """Features come from the listing and grow with the category and the enabled options."""
+
+    def test_larger_categories_cost_more(self, store_A, fitdiag_A):
+        one = task_features(store_A, "fit_s", PASS[:1])
+        three = task_features(store_A, "fit_s", PASS, chi2=True, residuals=True, formats=["png", "pdf"], dpi=300)
+        assert np.all(three >= one)
+        assert CostModel().estimate(three) > CostModel().estimate(one)
+        assert task_features(store_A, "fit_s", PASS, chi2=True, blind=True)[FEATURES.index("chi2")] == 0
+        # A streaming store estimates the same sizes without reading
+        streaming = ShapeStore.stream(fitdiag_A, max_bytes=0)
+        np.testing.assert_allclose(
+            task_features(streaming, "fit_s", PASS), task_features(store_A, "fit_s", PASS), rtol=1
+        )
+        assert streaming.nbytes == 0
+
+
+class TestCostModel:
+    """Recorded timings should calibrate the weights."""
+
+    def test_recovers_weights(self):
+        rng = np.random.default_rng(4)
+        weights = rng.uniform(0, 1, len(FEATURES))
+        features = _features(rng, 100)
+        model = CostModel.calibrate(features, features @ weights)
+        np.testing.assert_allclose(model.weights, weights, atol=1e-8)
+        assert model.n_timings == 100
+
+    def test_few_timings_rescale_defaults(self):
+        rng = np.random.default_rng(5)
+        features = _features(rng, 3)
+        default = CostModel()
+        model = CostModel.calibrate(features, 2 * default.estimate(features))
+        np.testing.assert_allclose(model.weights, 2 * default.weights)
+
+    def test_log_round_trip(self, tmp_path):
+        rng = np.random.default_rng(6)
+        log = TimingLog(tmp_path / "timings.json")
+        assert log.model().n_timings == 0
+        features = _features(rng, 10)
+        log.record(features, np.arange(10.0))
+        log.record(features[:2], np.arange(2.0))
+        loaded, seconds = log.load()
+        assert loaded.shape == (12, len(FEATURES))
+        np.testing.assert_allclose(seconds[-2:], [0, 1])
+
+
+class TestSchedule:
+    def test_longest_first(self):
+        costs = np.array([1.0, 5.0, 2.0, 5.0])
+        assert lpt_order(costs) == [1, 3, 2, 0]
+        assert makespan(costs, 1) == pytest.approx(13)
+        assert makespan(costs, 2) == pytest.approx(7)
+        # The long task dispatched last would otherwise set the tail
+        assert makespan(np.array([1.0] * 8 + [8.0]), 4) == pytest.approx(8)
+
+    def test_locality_batches(self):
+        groups = [
+            ("A", frozenset(PASS[:1])),  # prefit
+            ("A", frozenset(PASS[1:2])),
+            ("A", frozenset(PASS[:1])),  # fit_s, with its prefit
+            ("A", frozenset(PASS)),  # merged, overlapping both
+            ("B", frozenset(PASS[:1])),  # same channel of another input
+            ("B", frozenset()),
+        ]
+        costs = np.array([1.0, 1.0, 1.0, 3.0, 1.0, 0.5])
+        assert locality_batches(groups, costs) == [[0, 2, 1, 3], [4], [5]]
+        # Cut at the cap, the fit types of a category only when they don't fit together
+        assert locality_batches(groups, costs, max_cost=4) == [[0, 2, 1], [3], [4], [5]]
+        assert locality_batches(groups, costs, max_cost=1.5) == [[3], [0], [2], [1], [4], [5]]
+
+    def test_peak_memory(self):
+        features = np.zeros((2, len(FEATURES)))
+        features[:, FEATURES.index("png_mpix")] = [1, 9]
+        assert peak_memory(100.0, features, 0) == 100
+        assert peak_memory(100.0, features, 2) > peak_memory(100.0, features, 1) > 100
@@ -0,0 +1,100 @@
+"""Unit tests for the FitResultTable (no ROOT required)."""
+
+import pickle
+
+import numpy as np
+import pytest
+import uproot
+
+from combine_postfits.fitresult import FitParam, FitResultTable
+from combine_postfits.utils import get_fit_unc, get_fit_val
+
+
+@pytest.fixture
+def table():
+    return FitResultTable(
+        {
+            "fit_s": {
+                "r": FitParam(1.2, 0.3, -0.25, 0.35),  # Minos errors
+                "bkg_norm": FitParam(0.9, 0.1),  # Hesse only
+            },
+            "fit_b": {"bkg_norm": FitParam(1.1, 0.2)},
+        }
+    )
+
+
+class TestFitParam:
+    """FitParam should reproduce RooRealVar's error accessors."""
+
+    def test_asymmetric(self):
+        par = FitParam(1.0, 0.3, -0.25, 0.35)
+        assert par.has_asym_error
+        assert (par.error_lo, par.error_hi) == (-0.25, 0.35)
+        assert par.unc == (0.25, 0.35)
+
+    def test_symmetric(self):
+        par = FitParam(1.0, 0.3)
+        assert not par.has_asym_error
+        assert (par.error_lo, par.error_hi) == (-0.3, 0.3)
+        assert par.unc == (-0.3, 0.3)
+
+
+class TestFitResultTable:
+    def test_value_and_unc(self, table):
+        assert table.value("r") == 1.2
+        assert table.unc("r") == (0.25, 0.35)
+        assert table.value("bkg_norm", fittype="fit_b") == 1.1
+
+    def test_missing_returns_substitute(self, table):
+        assert table.value("r", fittype="fit_b", substitute=None) is None
+        assert table.unc("nonexistent", substitute=(0, 0)) == (0, 0)
+
+    def test_utils_dispatch(self, table):
+        """get_fit_val/get_fit_unc accept a FitResultTable in place of a ROOT file."""
+        assert get_fit_val(table, "r", fittype="fit_s") == 1.2
+        assert get_fit_unc(table, "r", fittype="fit_s") == (0.25, 0.35)
+        assert get_fit_val(table, "nonexistent", substitute=42.0) == 42.0
+
+    def test_picklable(self, table):
+        assert pickle.loads(pickle.dumps(table)) == table
+
+
+class TestFromUproot:
+    """The uproot RooFitResult reader should agree with combine's own fit trees."""
+
+    @pytest.mark.parametrize("fittype,tree", [("fit_s", "tree_fit_sb"), ("fit_b", "tree_fit_b")])
+    @pytest.mark.parametrize("fitdiag", ["fitdiag_A", "fitdiag_B", "fitdiag_C", "fitdiag_D"])
+    def test_values_match_fit_tree(self, request, fitdiag, fittype, tree):
+        fd = request.getfixturevalue(fitdiag)
+        table = FitResultTable.from_uproot(fd, fit_types=[fittype])
+        branches = fd[tree].arrays(library="np")
+        common = [name for name in table.params[fittype] if name in branches]
+        assert len(common) > 0
+        for name in common:
+            assert table.value(name, fittype=fittype) == pytest.approx(branches[name][0])
+
+    def test_poi_errors(self, fitdiag_C):
+        table = FitResultTable.from_uproot(fitdiag_C)
+        branches = fitdiag_C["tree_fit_sb"].arrays(["r", "rErr", "rLoErr", "rHiErr"], library="np")
+        r = table.get("r")
+        assert r.error == pytest.approx(branches["rErr"][0])
+        assert r.unc == pytest.approx((branches["rLoErr"][0], branches["rHiErr"][0]), rel=1e-3)
+
+    def test_correlation_matrix(self, fitdiag_A):
+        table = FitResultTable.from_uproot(fitdiag_A)
+        names, corr = table.correlation_matrix("fit_s")
+        assert names == list(table.params["fit_s"])
+        assert corr.shape == (len(names), len(names))
+        np.testing.assert_allclose(np.diag(corr), 1)
+        np.testing.assert_allclose(corr, corr.T)
+        with pytest.raises(KeyError):
+            table.correlation_matrix("prefit")
+
+    def test_from_file_without_root(self, fitdiag_C, monkeypatch):
+        assert FitResultTable.from_file(fitdiag_C, use_root=False).get("r") is not None
+
+        def fail(*args, **kwargs):
+            raise uproot.DeserializationError("forced", None, None, {}, None)
+
+        monkeypatch.setattr(FitResultTable, "from_uproot", fail)
+        assert FitResultTable.from_file(fitdiag_C, use_root=False) is None
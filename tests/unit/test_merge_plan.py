@@ -0,0 +1,68 @@
+"""Unit tests for the MergePlan partial-sum DAG."""
+
+import numpy as np
+import pytest
+
+from combine_postfits.merge_plan import MergePlan
+from combine_postfits.shapes import ShapeStore
+from combine_postfits.utils import merge_hists
+
+PASS16 = ["ptbin0pass2016", "ptbin1pass2016", "ptbin2pass2016"]
+PASS = PASS16 + ["ptbin3pass2016", "ptbin4pass2016", "ptbin5pass2016"]
+FAIL = ["ptbin0fail2016", "ptbin1fail2016", "ptbin2fail2016"]
+MERGE = {"vjets": ["wqq", "zqq"], "bkg": ["vjets", "qcd", "nonexistent"], "qcd": ["qcd", "tqq"]}
+
+
+@pytest.fixture(scope="module")
+def evaluated(fitdiag_A):
+    store = ShapeStore.from_file(fitdiag_A)
+    groups = [(fit_type, group) for fit_type in ["prefit", "fit_s"] for group in [PASS16, PASS, FAIL]]
+    MergePlan.build(groups, merge=MERGE).evaluate(store)
+    return store
+
+
+class TestPlan:
+    """The plan should split overlapping groups into atoms and reuse nested groups."""
+
+    def test_nested_groups_reuse_sums(self):
+        plan = MergePlan.build([("fit_s", PASS16), ("fit_s", PASS), ("fit_s", FAIL)])
+        nodes = plan.nodes["fit_s"]
+        assert nodes[frozenset(PASS)].parts == [frozenset(PASS16), frozenset(PASS[3:])]
+        assert nodes[frozenset(PASS16)].is_leaf and nodes[frozenset(FAIL)].is_leaf
+        assert plan.n_leaf_channels == len(PASS) + len(FAIL)
+
+    def test_partial_overlap_splits_atoms(self):
+        a, b = PASS[:3], PASS[2:5]
+        plan = MergePlan.build([("prefit", a), ("prefit", b)])
+        leaves = [node.channels for node in plan.nodes["prefit"].values() if node.is_leaf]
+        assert sorted(leaves) == sorted([PASS[:2], PASS[2:3], PASS[3:5]])
+        assert plan.n_leaf_channels == 5
+
+    def test_single_channel_groups_skipped(self):
+        plan = MergePlan.build([("prefit", [ch]) for ch in PASS])
+        assert plan.nodes == {}
+
+
+class TestEvaluate:
+    """Evaluated sums should match summing each category directly."""
+
+    @pytest.mark.parametrize("group", [PASS16, PASS, FAIL])
+    def test_matches_direct_sum(self, evaluated, store_A, group):
+        partial = evaluated.sums["fit_s", frozenset(group), True]
+        shapes = partial.shapes()
+        for name in ["data", "qcd", "total", "wqq"]:
+            ref = store_A.get_summed_shape("fit_s", group, name)
+            np.testing.assert_allclose(shapes[name].values(), ref.values())
+            np.testing.assert_allclose(shapes[name].variances(), ref.variances())
+            np.testing.assert_allclose(shapes[name].edges, ref.edges)
+        assert partial.yields["qcd"] == pytest.approx(np.sum(shapes["qcd"].values()))
+
+    def test_merges_match_merge_hists(self, evaluated, store_A):
+        partial = evaluated.sums["prefit", frozenset(PASS), True]
+        names = [k for k in store_A.samples("prefit", PASS) if "data" not in k and "covar" not in k]
+        ref = merge_hists(store_A.get_many_shapes("prefit", PASS, names), MERGE)
+        ours = merge_hists(partial.shapes(), MERGE, merged=partial.merged_shapes())
+        assert partial.merged == list(MERGE)
+        for key in MERGE:
+            np.testing.assert_allclose(ours[key].values(), ref[key].values())
+            np.testing.assert_allclose(ours[key].variances(), ref[key].variances())
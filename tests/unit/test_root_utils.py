@@ -87,3 +87,34 @@ class TestGetFitUnc:
 
         unc = get_fit_unc(None, "r", substitute=(0, 0))
         assert unc == (0, 0)
+
+
+@pytest.mark.root
+class TestFitResultTableFromRoot:
+    """FitResultTable extracted via ROOT should agree with the per-call lookups."""
+
+    @pytest.fixture
+    def fitdiag(self):
+        """Open the ROOT fitDiagnostics file."""
+        import ROOT as r
+
+        rf = r.TFile.Open(FITDIAG_PATH)
+        yield rf
+        rf.Close()
+
+    @pytest.mark.parametrize("fittype", ["fit_s", "fit_b"])
+    def test_matches_get_fit_val_unc(self, fitdiag, fittype):
+        from combine_postfits.fitresult import FitResultTable
+        from combine_postfits.utils import get_fit_unc, get_fit_val
+
+        table = FitResultTable.from_root(fitdiag)
+        assert table.fit_types == ["fit_s", "fit_b"]
+        for name in list(table.params[fittype])[:20]:
+            assert table.value(name, fittype=fittype) == get_fit_val(fitdiag, name, fittype=fittype)
+            assert table.unc(name, fittype=fittype) == get_fit_unc(fitdiag, name, fittype=fittype)
+
+    def test_from_path(self):
+        from combine_postfits.fitresult import FitResultTable
+
+        table = FitResultTable.from_root(FITDIAG_PATH, fit_types=["fit_s"])
+        assert "r" in table.params["fit_s"]
@@ -0,0 +1,307 @@
+"""Unit tests for the in-memory ShapeStore and FitDiagIndex."""
+
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+import hist
+import numpy as np
+import pytest
+import uproot
+
+from combine_postfits.shapes import FitDiagIndex, Shape1D, ShapeStore, read_record
+from combine_postfits.utils import geth, getha
+
+
+class TestShapeStore:
+    """ShapeStore should serve the same contents as the uproot-based helpers."""
+
+    def test_loads_all_fit_types(self, store_A):
+        assert store_A.fit_types == ["prefit", "fit_s", "fit_b"]
+
+    def test_channels_match_file(self, store_A, fitdiag_A):
+        expected = fitdiag_A["shapes_prefit"].keys(recursive=False, cycle=False)
+        assert store_A.channels("prefit") == expected
+
+    @pytest.mark.parametrize("name", ["qcd", "data", "total_background"])
+    @pytest.mark.parametrize("restoreNorm", [True, False])
+    def test_get_matches_geth(self, store_A, fitdiag_A, name, restoreNorm):
+        h = store_A.get("prefit", "ptbin0pass2016", name, restoreNorm=restoreNorm)
+        ref = geth(name, fitdiag_A["shapes_prefit/ptbin0pass2016"], restoreNorm=restoreNorm)
+        assert isinstance(h, hist.Hist)
+        np.testing.assert_allclose(h.values(), ref.values())
+        np.testing.assert_allclose(h.variances(), ref.variances())
+        np.testing.assert_allclose(h.axes[0].edges, ref.axes[0].edges)
+        assert h.axes[0].label == ref.axes[0].label
+
+    def test_get_summed_matches_getha(self, store_A, fitdiag_A):
+        channels = ["ptbin0pass2016", "ptbin1pass2016"]
+        h = store_A.get_summed("fit_s", channels, "qcd")
+        ref = getha("qcd", [fitdiag_A[f"shapes_fit_s/{ch}"] for ch in channels])
+        np.testing.assert_allclose(h.values(), ref.values())
+        np.testing.assert_allclose(h.variances(), ref.variances())
+
+    def test_covariance_is_2d(self, store_A):
+        cov = store_A.get("fit_s", "ptbin0pass2016", "total_covar", restoreNorm=False)
+        n = len(store_A.get("fit_s", "ptbin0pass2016", "total").values())
+        assert cov.values().shape == (n, n)
+
+    def test_missing_sample_returns_zeros(self, store_A):
+        h = store_A.get_summed("prefit", ["ptbin0pass2016"], "nonexistent")
+        assert np.all(h.values() == 0)
+
+    def test_unknown_channel_raises(self, store_A):
+        with pytest.raises(KeyError):
+            store_A.get("prefit", "nonexistent_category", "qcd")
+
+    def test_restricted_load(self, fitdiag_A):
+        store = ShapeStore.from_file(fitdiag_A, fit_types=["prefit"], channels=["ptbin0pass2016"])
+        assert store.fit_types == ["prefit"]
+        assert store.channels("prefit") == ["ptbin0pass2016"]
+
+    def test_threaded_read_matches_serial(self, fitdiag_A, store_A):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            store = ShapeStore.from_file(fitdiag_A, executor=executor)
+        for fit_type in store_A.fit_types:
+            for channel in store_A.channels(fit_type):
+                for name, record in store_A.channel(fit_type, channel).items():
+                    np.testing.assert_array_equal(store.channel(fit_type, channel)[name].values, record.values)
+
+
+class TestShape1D:
+    """Shape1D arithmetic should follow hist's weighted storage."""
+
+    @pytest.fixture
+    def shapes(self, store_A):
+        channels = ["ptbin0pass2016", "ptbin1pass2016"]
+        return [store_A.get_shape("fit_s", ch, "qcd") for ch in channels], channels
+
+    def test_sum_matches_hist(self, store_A, shapes):
+        shapes, channels = shapes
+        summed = sum(shapes)
+        ref = store_A.get_summed("fit_s", channels, "qcd")
+        assert isinstance(summed, Shape1D)
+        np.testing.assert_array_equal(summed.values(), ref.values())
+        np.testing.assert_array_equal(summed.variances(), ref.variances())
+        assert summed.edges is shapes[0].edges
+
+    def test_scaling_matches_hist(self, shapes):
+        shape = shapes[0][0]
+        h = shape.to_hist()
+        for ours, ref in [(shape * 3.0, h * 3.0), (shape / 2.0, h / 2.0), (shape * shape.widths, h * h.axes[0].widths)]:
+            np.testing.assert_allclose(ours.values(), ref.values())
+            np.testing.assert_allclose(ours.variances(), ref.variances())
+
+    def test_to_hist(self, store_A, shapes):
+        h = shapes[0][0].to_hist()
+        ref = store_A.get("fit_s", "ptbin0pass2016", "qcd")
+        assert h == ref
+        assert h.axes[0].label == ref.axes[0].label
+
+    def test_copy_is_independent(self, shapes):
+        shape = shapes[0][0]
+        copied = shape.copy()
+        copied.values()[:] = np.nan
+        assert np.all(np.isfinite(shape.values()))
+        assert not shape.edges.flags.writeable
+
+    def test_binning_mismatch(self, shapes):
+        shape = shapes[0][0]
+        other = Shape1D(shape.values()[:-1], shape.variances()[:-1], shape.edges[:-1])
+        with pytest.raises(ValueError):
+            shape + other
+
+    def test_restore_norm_without_sumw2(self, tmp_path):
+        """A TH1 without sumw2 holds Poisson counts: restored, their variance is the restored content."""
+        edges, values = np.array([0.0, 1.0, 3.0, 6.0]), np.array([4.0, 6.0, 9.0])
+        with uproot.recreate(tmp_path / "nosumw2.root") as f:
+            f["h"] = (values, edges)
+        with uproot.open(tmp_path / "nosumw2.root") as f:
+            record = read_record(f["h"])
+            ref = geth("h", f)
+        assert record.poisson
+        shape = Shape1D.from_record(record)
+        np.testing.assert_array_equal(shape.values(), values * np.diff(edges))
+        np.testing.assert_array_equal(shape.variances(), values * np.diff(edges))
+        # hist drops the variances of such a histogram once scaled, mplhep then draws Poisson errors of the content
+        assert ref.variances() is None
+        np.testing.assert_array_equal(shape.variances(), ref.values())
+
+
+class TestChannelTensor:
+    """The samples x channels x bins tensor should reproduce the per-channel sums."""
+
+    CHANNELS = ["ptbin0pass2016", "ptbin1pass2016", "ptbin2pass2016"]
+
+    @pytest.mark.parametrize("restoreNorm", [True, False])
+    def test_sums_match_loop(self, store_A, restoreNorm):
+        names = ["data", "qcd", "total", "nonexistent"]
+        tensor = store_A.tensor("fit_s", self.CHANNELS, names, restoreNorm=restoreNorm)
+        assert tensor.values.shape == (len(names), len(self.CHANNELS), len(tensor.edges[0]) - 1)
+        sums = tensor.sums()
+        for name in names:
+            ref = store_A.get_summed_shape("fit_s", self.CHANNELS, name, restoreNorm=restoreNorm)
+            np.testing.assert_array_equal(sums[name].values(), ref.values())
+            np.testing.assert_array_equal(sums[name].variances(), ref.variances())
+            assert sums[name].label == ref.label
+        assert not tensor.present[names.index("nonexistent")].any()
+
+    def test_yields(self, store_A):
+        tensor = store_A.tensor("prefit", self.CHANNELS, ["qcd", "data"])
+        assert tensor.yields.shape == (len(self.CHANNELS), 2)
+        qcd = store_A.get_shape("prefit", self.CHANNELS[1], "qcd")
+        assert tensor.yields[1, 0] == pytest.approx(np.sum(qcd.values()))
+
+    def test_mixed_binning(self, store_A):
+        channels = store_A.channels("prefit")
+        binnings = {len(store_A.get_shape("prefit", ch, "data").edges) for ch in channels}
+        if len(binnings) == 1:
+            pytest.skip("All channels share a binning.")
+        assert store_A.tensor("prefit", channels, ["data"]) is None
+
+
+class TestFitDiagIndex:
+    """FitDiagIndex should list the file contents once and be reusable without the file."""
+
+    def test_matches_file_listing(self, fitdiag_A):
+        index = FitDiagIndex.from_file(fitdiag_A)
+        assert index.fit_types == ["prefit", "fit_s", "fit_b"]
+        assert index.channels("fit_s") == fitdiag_A["shapes_fit_s"].keys(recursive=False, cycle=False)
+        channel = "ptbin0pass2016"
+        assert list(index.entries["fit_s"][channel]) == fitdiag_A[f"shapes_fit_s/{channel}"].keys(cycle=False)
+        assert index.entries["fit_s"][channel]["total_covar"].class_name == "TH2F"
+        assert index.has("fit_s", channel, "qcd")
+        assert not index.has("fit_s", channel, "nonexistent")
+
+    def test_store_reuses_index(self, fitdiag_A):
+        index = FitDiagIndex.from_file(fitdiag_A, fit_types=["prefit"])
+        store = ShapeStore.from_file(fitdiag_A, index=index)
+        assert store.index is index
+        assert store.channels("prefit") == index.channels("prefit")
+
+    def test_roundtrip_and_pickle(self, fitdiag_A):
+        index = FitDiagIndex.from_file(fitdiag_A, fit_types=["prefit"])
+        assert FitDiagIndex.from_dict(index.to_dict()).entries == index.entries
+        restored = pickle.loads(pickle.dumps(index))
+        assert restored.entries == index.entries
+        with pytest.raises(KeyError):
+            restored.key("prefit", "ptbin0pass2016", "qcd")
+        restored.attach(fitdiag_A)
+        assert restored.key("prefit", "ptbin0pass2016", "qcd").fClassName.startswith("TH1")
+
+
+class TestStreamingStore:
+    """A streaming ShapeStore should serve the same contents while staying within its budget."""
+
+    def test_matches_full_store(self, fitdiag_A, store_A):
+        budget = 50_000
+        store = ShapeStore.stream(fitdiag_A, max_bytes=budget)
+        assert store.channels("fit_s") == store_A.channels("fit_s")
+        assert store.samples("fit_s", store.channels("fit_s")) == store_A.samples("fit_s", store_A.channels("fit_s"))
+        for channel in store_A.channels("fit_s"):
+            for name, record in store_A.channel("fit_s", channel).items():
+                np.testing.assert_array_equal(store.channel("fit_s", channel)[name].values, record.values)
+            assert store.nbytes <= budget
+        assert len(store.shapes["fit_s"]) < len(store_A.channels("fit_s"))
+
+    def test_pinned_channels_are_kept(self, fitdiag_A):
+        store = ShapeStore.stream(fitdiag_A, max_bytes=0)
+        store.pin("prefit", ["ptbin0pass2016"])
+        store.channel("prefit", "ptbin1pass2016")
+        assert "ptbin0pass2016" in store.shapes["prefit"]
+        assert not store.fits("prefit", ["ptbin1pass2016"])
+        with pytest.raises(RuntimeError):
+            store.evict("prefit", "ptbin0pass2016")
+        store.unpin("prefit", ["ptbin0pass2016"])
+        store.evict("prefit", "ptbin0pass2016")
+        assert store.nbytes == store.estimate_nbytes("prefit", "ptbin1pass2016")
+
+    def test_data_shared_between_fit_types(self, fitdiag_A, store_A):
+        assert store_A.record("fit_s", "ptbin0pass2016", "data") is store_A.record("prefit", "ptbin0pass2016", "data")
+        layout, buffer = store_A.pack()
+        assert layout["fit_s"]["ptbin0pass2016"]["data"] == layout["prefit"]["ptbin0pass2016"]["data"]
+        store = ShapeStore.stream(fitdiag_A, max_bytes=10**9)
+        assert store.record("fit_s", "ptbin0fail2016", "data") is store.record("prefit", "ptbin0fail2016", "data")
+
+    def test_add_records_read_elsewhere(self, fitdiag_A, store_A):
+        store = ShapeStore.stream(fitdiag_A, max_bytes=store_A.nbytes)
+        store.add("prefit", {"ptbin0pass2016": store_A.channel("prefit", "ptbin0pass2016")})
+        assert store.channel("prefit", "ptbin0pass2016") is store_A.channel("prefit", "ptbin0pass2016")
+        assert pickle.loads(pickle.dumps(store)).nbytes == store.nbytes
+
+    def test_style_matches_full_store(self, fitdiag_A, store_A):
+        from combine_postfits.utils import make_style_dict_yaml
+
+        store = ShapeStore.stream(fitdiag_A, max_bytes=50_000)
+        assert make_style_dict_yaml(store, sort_peaky=True) == make_style_dict_yaml(store_A, sort_peaky=True)
+
+
+class TestHistManager:
+    """HistManager should hand out cached, read-only shapes and only copy when masking."""
+
+    @pytest.fixture
+    def manager(self):
+        from combine_postfits.plot_postfits import HistManager
+
+        edges = np.linspace(0, 5, 6)
+        flat = Shape1D(np.full(5, 10.0), np.full(5, 10.0), edges, "x")
+        peaked = Shape1D(np.array([0.0, 0.001, 5.0, 4.0, 0.0]), np.ones(5), edges, "x")
+        return HistManager({"flat": flat, "peaked": peaked})
+
+    def test_returns_cached_read_only(self, manager):
+        h = manager.get("peaked")
+        assert manager.get("peaked") is h
+        with pytest.raises(ValueError):
+            h.values()[0] = 1.0
+        with pytest.raises(ValueError):
+            manager.get("flat", raw=True).values()[0] = 1.0
+
+    def test_unmasked_shares_memory(self, manager):
+        assert np.shares_memory(manager.get("flat").values(), manager.get("flat", raw=True).values())
+
+    def test_masked_variant(self, manager):
+        masked = manager.get("peaked", global_scale=False, th=0.05)
+        assert np.isnan(masked.values()[[0, 1, 4]]).all()
+        np.testing.assert_array_equal(masked.values()[2:4], [5.0, 4.0])
+        assert np.isfinite(manager.get("peaked", raw=True).values()).all()
+        assert manager.get("peaked", global_scale=False, th=0.05) is masked
+
+    def test_missing_is_zeros(self, manager):
+        h = manager.get("nonexistent")
+        assert np.all(h.values() == 0)
+        assert manager.get("nonexistent") is h
+
+
+class TestSampleSelection:
+    """Stores restricted to the samples a plot needs should never decode the others."""
+
+    def test_required_samples(self):
+        from combine_postfits.plot_postfits import PlotConfig, required_samples
+
+        assert required_samples(PlotConfig(sigs=["hcc"])) is None
+        merge = {"vjets": ["wqq", "zjets"], "zjets": ["zqq", "zbb"]}
+        names = required_samples(PlotConfig(sigs=["hcc"], bkgs=["vjets", "tqq"], onto="qcd", chi2=True), merge)
+        assert names == {"data", "total", "total_background", "total_signal", "total_covar"} | {
+            "hcc",
+            "vjets",
+            "tqq",
+            "qcd",
+            "wqq",
+            "zjets",
+            "zqq",
+            "zbb",
+        }
+        assert "total_covar" not in required_samples(PlotConfig(bkgs=["qcd"], chi2=True, blind=True))
+
+    @pytest.mark.parametrize("streaming", [False, True])
+    def test_only_names_are_read(self, fitdiag_A, store_A, streaming):
+        names = {"data", "qcd", "total"}
+        if streaming:
+            store = ShapeStore.stream(fitdiag_A, max_bytes=10**9, names=names)
+        else:
+            store = ShapeStore.from_file(fitdiag_A, fit_types=["prefit"], names=names)
+        channel = "ptbin0pass2016"
+        assert store.samples("prefit", [channel]) == ["data", "qcd", "total"]
+        assert set(store.channel("prefit", channel)) == names
+        np.testing.assert_array_equal(
+            store.record("prefit", channel, "qcd").values, store_A.record("prefit", channel, "qcd").values
+        )
@@ -0,0 +1,59 @@
+"""Unit tests for handing a ShapeStore to worker processes through shared memory."""
+
+import multiprocessing
+import pickle
+
+import numpy as np
+import pytest
+
+from combine_postfits.chi2 import channel_chi2
+from combine_postfits.shapes import ShapeStore
+from combine_postfits.shared import SharedShapes
+
+CHANNELS = ["ptbin0pass2016", "ptbin1pass2016"]
+
+
+@pytest.fixture
+def shared(fitdiag_A):
+    store = ShapeStore.from_file(fitdiag_A, fit_types=["fit_s"])
+    channel_chi2(store, "fit_s", CHANNELS)
+    shared = SharedShapes(store)
+    yield store, shared
+    shared.unlink()
+
+
+def _total_yield(shared: SharedShapes) -> float:
+    store = shared.attach()
+    return float(store.get_summed_shape("fit_s", CHANNELS, "total").values().sum())
+
+
+class TestSharedShapes:
+    """Workers should get the shapes by name of the block, mapped instead of copied."""
+
+    def test_descriptor_is_small(self, shared):
+        store, shared = shared
+        # The arrays stay in the block, only the layout and the caches are pickled
+        assert len(pickle.dumps(shared)) < len(pickle.dumps(store)) - shared.nbytes // 2
+
+    def test_attach_maps_block(self, shared):
+        store, shared = shared
+        received = pickle.loads(pickle.dumps(shared))
+        attached = received.attach()
+        for channel in store.channels("fit_s"):
+            for name in store.samples("fit_s", [channel]):
+                ours, ref = attached.record("fit_s", channel, name), store.record("fit_s", channel, name)
+                np.testing.assert_array_equal(ours.values, ref.values)
+                np.testing.assert_array_equal(ours.variances, ref.variances)
+                assert not ours.values.flags.writeable and not ours.values.flags.owndata
+        assert attached.chi2.keys() == store.chi2.keys()
+        del attached, ours, ref  # Views first, then the mapping they point into
+
+    def test_spawned_worker(self, shared):
+        store, shared = shared
+        with multiprocessing.get_context("spawn").Pool(1) as pool:
+            total = pool.apply(_total_yield, (shared,))
+        assert total == pytest.approx(store.get_summed_shape("fit_s", CHANNELS, "total").values().sum())
+
+    def test_streaming_store_rejected(self, fitdiag_A):
+        with pytest.raises(ValueError):
+            SharedShapes(ShapeStore.stream(fitdiag_A, max_bytes=1 << 20))
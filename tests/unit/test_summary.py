@@ -0,0 +1,46 @@
+"""Unit tests for the goodness-of-fit summary."""
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from combine_postfits.chi2 import channel_chi2
+from combine_postfits.merge_plan import MergePlan
+from combine_postfits.summary import GofSummary
+
+PASS16 = ["ptbin0pass2016", "ptbin1pass2016", "ptbin2pass2016"]
+
+
+def _task(name, channels, blind=False, blind_range=None):
+    return SimpleNamespace(
+        fittype="fit_s", channels=channels, savename=name, blind=blind, blind_range=blind_range, source="A.root"
+    )
+
+
+class TestGofSummary:
+    """The summary should reproduce the per-plot numbers and skip blinded categories."""
+
+    def test_categories(self, store_A):
+        tasks = [
+            _task("pass16", PASS16),
+            _task("fail0", ["ptbin0fail2016"], blind=True),
+            _task("pass0", ["ptbin0pass2016"], blind_range="0:3"),
+        ]
+        MergePlan.from_tasks(tasks).evaluate(store_A)
+        summary = GofSummary.from_tasks(store_A, tasks)
+        merged, partial = summary.categories
+        assert [c.category for c in summary.categories] == ["pass16", "pass0"]
+        assert merged.chi2 == pytest.approx(sum(t.chi2 for t in channel_chi2(store_A, "fit_s", PASS16)))
+        assert partial.nbins < channel_chi2(store_A, "fit_s", ["ptbin0pass2016"])[0].nbins
+        assert merged.chi2_corr and 0 <= merged.p_chi2 <= 1
+        assert len(summary.pulls) == merged.n_pulls + partial.n_pulls
+        assert np.all(np.isfinite(summary.pulls))
+
+    def test_write(self, store_A, tmp_path):
+        summary = GofSummary.from_tasks(store_A, [_task(ch, [ch]) for ch in PASS16])
+        paths = summary.write(tmp_path, formats=["png"], dpi=30)
+        assert [p.name for p in paths] == ["gof_summary.json", "gof_summary.csv", "gof_summary.png"]
+        totals = summary.totals()
+        assert totals["n_categories"] == 3
+        assert totals["fit_s"]["nbins"] == sum(c.nbins for c in summary.categories)
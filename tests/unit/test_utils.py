@@ -4,6 +4,7 @@
 import hist
 import numpy as np
 import pytest
+from mplhep.error_estimation import poisson_interval as mplhep_poisson_interval
 
 from combine_postfits.utils import (
     adjust_lightness,
@@ -13,6 +14,7 @@ from combine_postfits.utils import (
     fill_colors,
     format_categories,
     merge_hists,
+    poisson_interval,
     prep_yaml,
 )
 
@@ -272,3 +274,28 @@ class TestPrepYaml:
         style = {"sig": {"label": "Signal", "color": "#123456"}}
         result = prep_yaml(style)
         assert result["sig"]["color"] == "#123456"
+
+
+class TestPoissonInterval:
+    """The tabulated interval should match mplhep exactly, including its fallbacks."""
+
+    @pytest.mark.parametrize(
+        "sumw",
+        [
+            np.array([0.0, 1.0, 5.0, 117.0, 0.0, 3.0]),  # empty bins take the unit scale
+            np.array([9999.0, 10000.0, 10001.0, 25000.0]),  # beyond the table
+            np.array([1.5, 2.25, 0.0]),  # non-integer, unweighted
+        ],
+    )
+    @pytest.mark.parametrize("weight", [1.0, 1.3])
+    def test_matches_mplhep(self, sumw, weight):
+        sumw2 = sumw * weight
+        np.testing.assert_array_equal(poisson_interval(sumw, sumw2), mplhep_poisson_interval(sumw, sumw2))
+
+    def test_small_table(self):
+        sumw = np.arange(20.0)
+        np.testing.assert_array_equal(poisson_interval(sumw, sumw, size=5), mplhep_poisson_interval(sumw, sumw))
+
+    def test_blinded_bins(self):
+        sumw = np.array([1.0, np.nan, 3.0])
+        np.testing.assert_array_equal(poisson_interval(sumw, sumw), mplhep_poisson_interval(sumw, sumw))